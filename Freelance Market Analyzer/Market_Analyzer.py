@@ -3,10 +3,16 @@ from tkinter import filedialog, messagebox, ttk
 import threading
 import os
 import requests
-from bs4 import BeautifulSoup
+import requests.adapters
+from extractors import parse_gigs
+from response_cache import ResponseCache
+from checkpoint_store import ScrapeCheckpoint, checkpoint_path
 import pandas as pd
 import time
-from requests.exceptions import RequestException
+from concurrent.futures import Future, ProcessPoolExecutor
+import multiprocessing
+import queue
+import csv
 import re
 from collections import Counter
 import numpy as np
@@ -15,89 +21,345 @@ import seaborn as sns
 from matplotlib.backends.backend_pdf import PdfPages
 
 
+# --- Scraper Settings ---
+
+# Search results page; point this at a local stand-in server (see mock_fiverr_server.py) for testing
+FIVERR_SEARCH_URL = "https://www.fiverr.com/search/gigs"
+
+# Pages fetched at the same time, over one pooled HTTP session
+SCRAPER_CONCURRENCY = 4
+
+# Processes parsing pages while others are still downloading. 0 (the default) parses in the scraping
+# thread, which keeps up with the rate-limited fetchers; spawning workers costs seconds (each one
+# re-imports this module with pandas and matplotlib), so a pool only pays off for large bs4 scrapes.
+# The pool is started once and reused by every later scrape.
+PARSE_WORKERS = 0
+
+# Gig card extractor (see extractors.py): "auto" uses selectolax or lxml when installed, otherwise the
+# streaming extractor; "bs4" is the original BeautifulSoup code. Compare them with benchmark_extractors.py.
+HTML_EXTRACTOR = "auto"
+
+# Pages buffered between pipeline stages (fetch -> parse -> aggregate)
+PIPELINE_QUEUE_SIZE = 8
+
+# Token bucket rate limit shared by all fetches: average requests per second, and the burst allowed
+SCRAPER_RATE_LIMIT = 1.0
+SCRAPER_BURST = 4
+
+# On-disk cache of results pages (see response_cache.py); None disables it. Pages younger than
+# RESPONSE_CACHE_TTL seconds are reused without a request, older ones are revalidated with the server.
+RESPONSE_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "fiverr_market_analyzer")
+RESPONSE_CACHE_TTL = 6 * 3600
+RESPONSE_CACHE_MAX_MB = 200
+
+# Serve results pages only from the cache, never from the network (repeatable offline runs)
+SCRAPER_OFFLINE = False
+
+# Per-keyword scrape checkpoints (see checkpoint_store.py); None disables them. Each page is saved as
+# it completes, so a failed scrape resumes where it stopped; pages completed less than
+# CHECKPOINT_MAX_AGE seconds ago are not fetched again, older ones are refreshed and only new gigs added.
+CHECKPOINT_DIR = os.path.join(os.path.expanduser("~"), ".local", "share", "fiverr_market_analyzer", "checkpoints")
+CHECKPOINT_MAX_AGE = 24 * 3600
+
+# Headers mimic a browser request to avoid blocking
+REQUEST_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Accept-Encoding": "gzip, deflate, br",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8"
+}
+
+
+# --- Fetch Engine ---
+
+class TokenBucket:
+    """Thread-safe token bucket: acquire() blocks until a request may be sent."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def create_session(pool_size):
+    """One requests.Session whose connection pool fits all concurrent fetches (keep-alive, TLS reuse)."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(REQUEST_HEADERS)
+    return session
+
+
+def search_url(keyword, page, base_url=None):
+    return f"{base_url or FIVERR_SEARCH_URL}?query={keyword}&page={page}"
+
+
+def fetch_page(session, url, limiter, stop_event, cache=None, wanted=None):
+    """
+    Fetches one results page once the rate limiter allows it. Returns None if the scrape was stopped,
+    or if wanted() turned False while waiting on the limiter (e.g. the results ended on an earlier page).
+    With a cache, fresh cached pages are returned without a request or waiting on the limiter.
+    """
+    if stop_event.is_set():
+        return None
+
+    def may_request():
+        if limiter is not None:
+            limiter.acquire()
+        return not stop_event.is_set() and (wanted is None or wanted())
+
+    if cache is not None:
+        return cache.get(session, url, may_request)
+    if not may_request():
+        return None
+    r = session.get(url, timeout=10)
+    r.raise_for_status()
+    return r.text
+
+
+parse_pool = None
+parse_pool_lock = threading.Lock()
+
+def get_parse_pool():
+    """
+    The shared parse pool, started on first use (None when PARSE_WORKERS is 0). Workers are spawned,
+    never forked: this process runs Tk and the scraper threads, which a fork would copy mid-operation.
+    """
+    global parse_pool
+    with parse_pool_lock:
+        if parse_pool is None and PARSE_WORKERS > 0:
+            parse_pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return parse_pool
+
+
 # --- Core Logic Functions (Refactored from data_set.py and data_analysis_plotting.py) ---
 
-def run_scraper(keyword, csv_filepath, update_status, NUM_PAGES, SLEEP_TIME=2):
-    """Executes the web scraping logic and saves the raw data to CSV."""
+def run_scraper(keyword, csv_filepath, update_status, NUM_PAGES, CONCURRENCY=SCRAPER_CONCURRENCY,
+                RATE_LIMIT=SCRAPER_RATE_LIMIT, BASE_URL=None, OFFLINE=SCRAPER_OFFLINE):
+    """
+    Scrapes the results pages and returns the de-duplicated gigs as a DataFrame; the CSV is written
+    alongside as each page is aggregated. Runs as three overlapping stages joined by bounded queues:
+      fetch     - CONCURRENCY threads over one pooled session, paced by a token bucket of RATE_LIMIT
+                  requests per second (None disables it)
+      parse     - HTML_EXTRACTOR in its own thread, or on the shared pool of PARSE_WORKERS processes
+      aggregate - this thread, in page order: de-duplication, CSV rows, progress, and the stop
+                  at the first empty page
+    A full queue blocks the stage feeding it, so memory stays bounded however many pages are requested.
+    Once a page parses empty, fetchers stop taking later pages; requests already in flight still complete.
+    Pages go through the response cache in RESPONSE_CACHE_DIR; OFFLINE reads nothing but the cache.
+    With CHECKPOINT_DIR set, every aggregated page is appended to the keyword's checkpoint: pages it
+    already holds (younger than CHECKPOINT_MAX_AGE) are skipped, and gigs are de-duplicated against
+    the whole checkpoint by (Title, Seller) digest, without loading its rows.
+    """
 
     # Define the total allocation for scraping (60% of the progress bar)
     SCRAPING_ALLOCATION = 60
     percent_per_page = SCRAPING_ALLOCATION / NUM_PAGES
 
-    # Headers mimic a browser request to avoid blocking
-    REQUEST_HEADERS = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36",
-        "Accept-Language": "en-US,en;q=0.9",
-        "Accept-Encoding": "gzip, deflate, br",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8"
-    }
-
-    scraped_data = []
-
-    for page in range(1, NUM_PAGES + 1):
-        # Status update: Dynamic scraping progress calculation
-        progress_val = page * percent_per_page
-        update_status(f"Scraping Page {page}/{NUM_PAGES} for '{keyword}'...", progress_val)
+    checkpoint = None
+    pages_todo = list(range(1, NUM_PAGES + 1))
+    if CHECKPOINT_DIR:
+        checkpoint = ScrapeCheckpoint(checkpoint_path(CHECKPOINT_DIR, keyword, BASE_URL or FIVERR_SEARCH_URL))
+        pages_todo = checkpoint.pages_to_fetch(NUM_PAGES, CHECKPOINT_MAX_AGE)
+        if checkpoint.pages:
+            update_status(f"Resuming '{keyword}': {checkpoint.row_count} gigs saved, "
+                          f"{len(pages_todo)} of {NUM_PAGES} pages to fetch.", 0)
+
+    limiter = TokenBucket(RATE_LIMIT, SCRAPER_BURST) if RATE_LIMIT else None
+    stop_event = threading.Event()
+    session = create_session(CONCURRENCY)
+    cache = None
+    if OFFLINE and not RESPONSE_CACHE_DIR:
+        raise ValueError("Offline scraping reads from the response cache; set RESPONSE_CACHE_DIR")
+    if RESPONSE_CACHE_DIR:
+        cache = ResponseCache(RESPONSE_CACHE_DIR, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_MB * 1024 * 1024, OFFLINE)
+    fetched = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)  # (page, html or None, error or None)
+    parsed = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)   # (page, future or (card count, rows), error)
+    pool = get_parse_pool()
+    pages = iter(pages_todo)
+    pages_lock = threading.Lock()
+    end_page = [None] # First empty results page parsed so far; later pages are not fetched
+
+    def note_card_count(page, card_count):
+        if not card_count and page > 1:
+            with pages_lock:
+                if end_page[0] is None or page < end_page[0]:
+                    end_page[0] = page
+
+    def page_wanted(page):
+        end = end_page[0]
+        return end is None or page < end
+
+    def put(q, item):
+        """Blocking put that gives up once the pipeline is stopped, so no stage hangs on a full queue."""
+        while not stop_event.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def fetch_stage():
+        while not stop_event.is_set():
+            with pages_lock:
+                page = next(pages, None)
+            if page is None or not page_wanted(page):
+                return # Pages come in order, so every later one is past the end as well
+            try:
+                html = fetch_page(session, search_url(keyword, page, BASE_URL), limiter, stop_event, cache,
+                                  lambda: page_wanted(page))
+                put(fetched, (page, html, None))
+            except Exception as e:
+                # Reported by the aggregate stage; every page must reach it, or it would wait forever
+                put(fetched, (page, None, e))
+
+    def parse_stage():
+        for _ in range(len(pages_todo)):
+            item = None
+            while item is None and not stop_event.is_set():
+                try:
+                    item = fetched.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            if item is None:
+                return
+            page, html, error = item
+            if error is not None or html is None:
+                put(parsed, (page, None, error))
+            elif pool is not None:
+                future = pool.submit(parse_gigs, html, HTML_EXTRACTOR)
+                future.add_done_callback(
+                    lambda f, page=page: f.cancelled() or f.exception() or note_card_count(page, f.result()[0]))
+                put(parsed, (page, future, None))
+            else:
+                result = parse_gigs(html, HTML_EXTRACTOR)
+                note_card_count(page, result[0])
+                put(parsed, (page, result, None))
 
-        url = f"https://www.fiverr.com/search/gigs?query={keyword}&page={page}"
+    fetchers = [threading.Thread(target=fetch_stage, name=f"fetch-{i}", daemon=True) for i in range(CONCURRENCY)]
+    parser_thread = threading.Thread(target=parse_stage, name="parse", daemon=True)
+    for thread in fetchers + [parser_thread]:
+        thread.start()
 
-        try:
-            r = requests.get(url, headers=REQUEST_HEADERS, timeout=10)
-            r.raise_for_status()
-        except RequestException as e:
-            update_status(f"❌ Error fetching page {page}. Skipping...", progress_val)
-            print(f"Error: {e}")
-            continue
-
-        soup = BeautifulSoup(r.text, "html.parser")
-        gigs = soup.find_all("div", {"class": "basic-gig-card"})
-
-        if not gigs and page > 1:
-            # Assume no more results
-            update_status(f"Completed after {page - 1} pages (End of search results).", SCRAPING_ALLOCATION)
-            break
-
-        for gig in gigs:
-            title_element = gig.find("p", {"class": "f2YMuU6 tbody-5 text-normal"})
-            price_container = gig.find("span", {"class": "text-bold co-grey-1200"})
-            seller_element = gig.find("span", {"data-track-tag": "typography"})
-
-            title = title_element.text.strip() if title_element else None
-            raw_price = price_container.text.strip() if price_container else None
-            seller = seller_element.text.strip() if seller_element else "N/A"
-            price = None
-
-            if raw_price:
-                # Clean price string
-                price_numbers = re.findall(r'[\d,.]+', raw_price)
-                price = "".join(price_numbers).strip()
-
-            if title and price:
-                scraped_data.append({"Title": title, "Price": price, "Seller": seller})
-
-        time.sleep(SLEEP_TIME)
-
-    # Convert to DataFrame, clean, and save
-    df = pd.DataFrame(scraped_data)
-    df_clean = df.drop_duplicates(subset=['Title', 'Seller'], keep='first')
-    df_clean.to_csv(csv_filepath, index=False)
+    # Aggregate stage: results may arrive out of order; they are applied strictly by page number
+    scraped_data = []
+    seen = set()
+    waiting = {}
+    try:
+        with open(csv_filepath, 'w', newline='', encoding='utf-8') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(["Title", "Price", "Seller"])
+            if checkpoint is not None:
+                # Gigs from earlier scrapes, streamed from the checkpoint
+                for title, price, seller in checkpoint.rows():
+                    scraped_data.append({"Title": title, "Price": price, "Seller": seller})
+                    writer.writerow([title, price, seller])
+
+            for page in pages_todo:
+                while page not in waiting:
+                    try:
+                        item = parsed.get(timeout=0.5)
+                    except queue.Empty:
+                        if not parser_thread.is_alive():
+                            raise RuntimeError("Parse stage stopped unexpectedly")
+                        continue
+                    waiting[item[0]] = item[1:]
+                result, error = waiting.pop(page)
+
+                # Status update: Dynamic scraping progress calculation
+                progress_val = page * percent_per_page
+                update_status(f"Scraping Page {page}/{NUM_PAGES} for '{keyword}'...", progress_val)
+
+                if error is not None:
+                    update_status(f"❌ Error fetching page {page}. Skipping...", progress_val)
+                    print(f"Error: {error}")
+                    continue
+
+                card_count, rows = result.result() if isinstance(result, Future) else result
+
+                if not card_count and page > 1:
+                    # Assume no more results
+                    if checkpoint is not None:
+                        checkpoint.add_page(page, card_count, rows, end=True)
+                    update_status(f"Completed after {page - 1} pages (End of search results).", SCRAPING_ALLOCATION)
+                    break
+
+                if checkpoint is not None:
+                    new_rows = checkpoint.add_page(page, card_count, rows)
+                else:
+                    new_rows = []
+                    for row in rows:
+                        key = (row["Title"], row["Seller"])
+                        if key not in seen:
+                            seen.add(key)
+                            new_rows.append(row)
+                for row in new_rows:
+                    scraped_data.append(row)
+                    writer.writerow([row["Title"], row["Price"], row["Seller"]])
+                # Rows reach the CSV with their page, so it is as complete as the checkpoint
+                csv_file.flush()
+    finally:
+        # Stops the fetchers and the parser. Pages past the end of the results are not requested once
+        # the empty page is parsed; only fetches already under way when that happens still go out.
+        stop_event.set()
+        for thread in fetchers + [parser_thread]:
+            thread.join()
+        # The pool outlives this scrape; only drop the pages it has not started on
+        while True:
+            try:
+                item = parsed.get_nowait()
+            except queue.Empty:
+                break
+            waiting[item[0]] = item[1:]
+        for result, _ in waiting.values():
+            if isinstance(result, Future):
+                result.cancel()
+        session.close()
+        if checkpoint is not None:
+            checkpoint.close()
+        if cache is not None:
+            cache.save()
+
+    df_clean = pd.DataFrame(scraped_data, columns=["Title", "Price", "Seller"])
 
     # Final progress update for scraping phase
-    update_status(f"Scraping finished. {len(df_clean)} unique gigs saved.", SCRAPING_ALLOCATION)
+    cache_note = f" Pages: {cache.stats()}." if cache is not None else ""
+    update_status(f"Scraping finished. {len(df_clean)} unique gigs saved.{cache_note}", SCRAPING_ALLOCATION)
     return df_clean
 
 
-def run_analyzer(keyword, csv_filepath, pdf_filepath, update_status):
-    """Executes the data analysis and plotting logic, saving the report to PDF."""
+def run_analyzer(keyword, csv_filepath, pdf_filepath, update_status, df=None):
+    """
+    Executes the data analysis and plotting logic, saving the report to PDF.
+    Analyzes df when given (e.g. straight from run_scraper), otherwise loads csv_filepath.
+    """
 
     update_status("Loading data for analysis...", 65)  # Start analysis phase at 65%
 
-    # Load the CSV file generated by the scraper
-    try:
-        df = pd.read_csv(csv_filepath)
-    except FileNotFoundError:
-        messagebox.showerror("Error", f"CSV file not found at {csv_filepath}")
-        return False
+    if df is not None:
+        df = df.copy()
+    else:
+        # Load the CSV file generated by the scraper
+        try:
+            df = pd.read_csv(csv_filepath)
+        except FileNotFoundError:
+            messagebox.showerror("Error", f"CSV file not found at {csv_filepath}")
+            return False
 
     # --- Data Cleaning ---
     def clean_price(price_str):
@@ -364,9 +626,9 @@ class FiverrAnalyzerApp:
             # Step 1: Run Scraping (Scraping now receives the custom NUM_PAGES)
             df = run_scraper(keyword, csv_file, self.update_status, NUM_PAGES=num_pages)
 
-            # Step 2: Run Analysis and Plotting
+            # Step 2: Run Analysis and Plotting on the scraped frame (the CSV is only a side output)
             if not df.empty:
-                success = run_analyzer(keyword, csv_file, pdf_file, self.update_status)
+                success = run_analyzer(keyword, csv_file, pdf_file, self.update_status, df=df)
             else:
                 self.update_status("Scraping failed or returned no data.", 100)
 
@@ -390,6 +652,8 @@ class FiverrAnalyzerApp:
 
 # --- Run the Application ---
 if __name__ == "__main__":
+    # Parse worker processes re-run this module; needed for PyInstaller builds on Windows
+    multiprocessing.freeze_support()
     # Ensure Tkinter initialization is only run in the main thread
     root = tk.Tk()
     app = FiverrAnalyzerApp(root)
@@ -0,0 +1,74 @@
+import argparse
+import glob
+import os
+import time
+
+from extractors import EXTRACTOR_BACKENDS
+
+# Measures pages/sec of every installed gig card extractor (extractors.py) over saved results
+# pages, and checks that each returns exactly what the BeautifulSoup reference returns.
+#
+#   python benchmark_extractors.py --pages-dir saved_pages/
+#
+# Without --pages-dir, pages are generated with mock_fiverr_server.py (--save-dir keeps them).
+# Save real pages from a browser ("Save page as, HTML only") for numbers that match production.
+
+def load_pages(pages_dir):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(pages_dir, "*.html"))):
+        with open(path, encoding='utf-8', errors='replace') as f:
+            pages.append(f.read())
+    return pages
+
+def generate_pages(count, padding_kb, save_dir=None):
+    import mock_fiverr_server
+    rows = mock_fiverr_server.load_sample_rows()
+    pages = [mock_fiverr_server.render_page(rows, "python", page, count, padding_kb) for page in range(1, count + 1)]
+    if save_dir:
+        os.makedirs(save_dir, exist_ok=True)
+        for number, page in enumerate(pages, 1):
+            with open(os.path.join(save_dir, f"page_{number:03d}.html"), 'w', encoding='utf-8') as f:
+                f.write(page)
+    return pages
+
+def benchmark(extract, pages, min_seconds):
+    """Pages per second, repeating the page set until at least min_seconds have passed."""
+    processed = 0
+    start = time.perf_counter()
+    while True:
+        for page in pages:
+            extract(page)
+        processed += len(pages)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return processed / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the gig card extractor backends.")
+    parser.add_argument("--pages-dir", help="Directory of saved results pages (*.html).")
+    parser.add_argument("--generate", type=int, default=10, help="Pages to generate when no --pages-dir is given.")
+    parser.add_argument("--padding-kb", type=int, default=200, help="Non-gig markup per generated page.")
+    parser.add_argument("--save-dir", help="Also write the generated pages here.")
+    parser.add_argument("--seconds", type=float, default=3.0, help="Minimum run time per backend.")
+    args = parser.parse_args()
+
+    pages = load_pages(args.pages_dir) if args.pages_dir else generate_pages(args.generate, args.padding_kb, args.save_dir)
+    if not pages:
+        print("No pages to benchmark.")
+        return
+    size_kb = sum(len(page) for page in pages) / len(pages) / 1024
+    print(f"{len(pages)} pages, {size_kb:.0f} KB average, backends: {', '.join(EXTRACTOR_BACKENDS)}")
+
+    reference = [EXTRACTOR_BACKENDS["bs4"](page) for page in pages]
+    cards = sum(len(result) for result in reference)
+    print(f"{'backend':<12} {'pages/sec':>10} {'speed-up':>9}  output")
+    baseline = None
+    for name, extract in EXTRACTOR_BACKENDS.items():
+        matches = all(extract(page) == expected for page, expected in zip(pages, reference))
+        rate = benchmark(extract, pages, args.seconds)
+        baseline = baseline or rate # bs4 is always first
+        print(f"{name:<12} {rate:>10.1f} {rate / baseline:>8.1f}x  "
+              f"{f'same {cards} cards as bs4' if matches else 'DIFFERS from bs4'}")
+
+if __name__ == "__main__":
+    main()
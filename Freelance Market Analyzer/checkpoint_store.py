@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import re
+import time
+
+# Per-keyword checkpoints for the scraper, so an interrupted scrape resumes where it stopped and
+# a later scrape of the same keyword only fetches what it does not already have.
+# Each keyword (and search URL) has an append-only JSON Lines log; one line is written and
+# fsynced as each page is aggregated:
+#   {"page": 3, "time": 1700000000.0, "cards": 48, "end": false, "rows": [[title, price, seller], ...]}
+# "rows" holds only gigs not seen on any earlier line, so the rows of all lines together are the
+# de-duplicated history. A page scraped again appends a new line; the latest line per page wins.
+# Opening a log streams it once to rebuild the page list and an 8-byte digest per
+# (Title, Seller) key; the rows themselves are never held in memory.
+
+def gig_key(title, seller):
+    return hashlib.blake2b(f"{title}\0{seller}".encode('utf-8'), digest_size=8).digest()
+
+def checkpoint_path(directory, keyword, base_url):
+    slug = re.sub(r'[^a-z0-9]+', '_', keyword.lower()).strip('_')[:40] or "keyword"
+    digest = hashlib.sha1(f"{base_url}\0{keyword}".encode('utf-8')).hexdigest()[:10]
+    return os.path.join(directory, f"{slug}-{digest}.jsonl")
+
+def read_log(path):
+    """Yields the records of a log in write order; a line torn by a crash mid-write is skipped."""
+    try:
+        f = open(path, encoding='utf-8')
+    except FileNotFoundError:
+        return
+    with f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+def repair_tail(path):
+    """
+    Ends the log on a newline, so the next record starts on a line of its own instead of being
+    glued to (and dropped with) a partial line left by a crash mid-write. A partial line is cut
+    back to the last newline; a complete record that only lacks its newline keeps it.
+    """
+    try:
+        f = open(path, 'r+b')
+    except FileNotFoundError:
+        return
+    with f:
+        end = f.seek(0, os.SEEK_END)
+        position = cut = end
+        while position > 0:
+            start = max(0, position - 4096)
+            f.seek(start)
+            newline = f.read(position - start).rfind(b"\n")
+            if newline >= 0:
+                cut = start + newline + 1
+                break
+            position = cut = start
+        if cut == end:
+            return
+        f.seek(cut)
+        try:
+            json.loads(f.read())
+        except ValueError:
+            f.truncate(cut)
+        else:
+            f.write(b"\n") # Already counted by read_log; keep it
+
+class ScrapeCheckpoint:
+    def __init__(self, path):
+        self.path = path
+        self.pages = {}   # page -> (completed at, end of results)
+        self.seen = set() # gig_key digests of every stored row
+        self.row_count = 0
+        for record in read_log(path):
+            self.pages[record['page']] = (record['time'], record.get('end', False))
+            for title, _, seller in record['rows']:
+                self.seen.add(gig_key(title, seller))
+                self.row_count += 1
+        self.file = None
+
+    def pages_to_fetch(self, num_pages, max_age):
+        """Pages 1..num_pages not completed within max_age seconds, up to a recent end of results."""
+        now = time.time()
+        todo = []
+        for page in range(1, num_pages + 1):
+            completed = self.pages.get(page)
+            if completed is None or now - completed[0] >= max_age:
+                todo.append(page)
+            elif completed[1]:
+                break # Results ended here last time; later pages would be empty as well
+        return todo
+
+    def rows(self):
+        """Streams every stored row as [title, price, seller], oldest first."""
+        for record in read_log(self.path):
+            yield from record['rows']
+
+    def add_page(self, page, card_count, rows, end=False):
+        """
+        Appends one completed page and returns its rows that were not seen before.
+        The line is on disk before this returns, so a crash afterwards loses nothing.
+        """
+        new_rows = []
+        for row in rows:
+            key = gig_key(row["Title"], row["Seller"])
+            if key not in self.seen:
+                self.seen.add(key)
+                new_rows.append(row)
+        now = time.time()
+        record = {'page': page, 'time': now, 'cards': card_count, 'end': end,
+                  'rows': [[row["Title"], row["Price"], row["Seller"]] for row in new_rows]}
+        if self.file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            repair_tail(self.path)
+            self.file = open(self.path, 'a', encoding='utf-8')
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pages[page] = (now, end)
+        self.row_count += len(new_rows)
+        return new_rows
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,213 @@
+import re
+from html import unescape
+
+from bs4 import BeautifulSoup
+
+# Optional faster backends; each is only offered when its package is installed
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+try:
+    from selectolax.parser import HTMLParser as SelectolaxParser
+except ImportError:
+    SelectolaxParser = None
+
+# Gig card extraction backends for the scraper. Every backend returns, for each
+# "basic-gig-card" on a results page, the text of its title, price and seller elements
+# (None where the element is missing), matched exactly like the original BeautifulSoup code:
+#   title  - <p class="f2YMuU6 tbody-5 text-normal">
+#   price  - <span class="text-bold co-grey-1200">
+#   seller - <span data-track-tag="typography">
+
+CARD_CLASS = "basic-gig-card"
+TITLE_CLASS = "f2YMuU6 tbody-5 text-normal"
+PRICE_CLASS = "text-bold co-grey-1200"
+
+
+def extract_bs4(html):
+    """Reference backend: full BeautifulSoup tree with the pure-Python html.parser."""
+    soup = BeautifulSoup(html, "html.parser")
+    cards = []
+    for gig in soup.find_all("div", {"class": CARD_CLASS}):
+        title_element = gig.find("p", {"class": TITLE_CLASS})
+        price_container = gig.find("span", {"class": PRICE_CLASS})
+        seller_element = gig.find("span", {"data-track-tag": "typography"})
+        cards.append((title_element.text if title_element else None,
+                      price_container.text if price_container else None,
+                      seller_element.text if seller_element else None))
+    return cards
+
+
+def extract_lxml(html):
+    """libxml2's C parser through lxml, with XPath for the card fields."""
+    tree = lxml.html.fromstring(html)
+    cards = []
+    for gig in tree.xpath(f'//div[contains(concat(" ", normalize-space(@class), " "), " {CARD_CLASS} ")]'):
+        fields = []
+        for path in (f'.//p[normalize-space(@class)="{TITLE_CLASS}"]',
+                     f'.//span[normalize-space(@class)="{PRICE_CLASS}"]',
+                     './/span[@data-track-tag="typography"]'):
+            found = gig.xpath(path)
+            fields.append(found[0].text_content() if found else None)
+        cards.append(tuple(fields))
+    return cards
+
+
+def extract_selectolax(html):
+    """Lexbor's C parser through selectolax, with CSS selectors for the card fields."""
+    tree = SelectolaxParser(html)
+    cards = []
+    for gig in tree.css(f"div.{CARD_CLASS}"):
+        fields = []
+        for selector in (f'p[class="{TITLE_CLASS}"]', f'span[class="{PRICE_CLASS}"]',
+                         'span[data-track-tag="typography"]'):
+            found = gig.css_first(selector)
+            fields.append(found.text(deep=True) if found else None)
+        cards.append(tuple(fields))
+    return cards
+
+
+# --- Streaming extractor (standard library only) ---
+
+TOKEN_PATTERN = re.compile(r'<!--.*?-->|<(/?)([a-zA-Z][^\s/>]*)([^>]*)>|[^<]+|<', re.S)
+ATTRIBUTE_PATTERN = re.compile(r'([^\s=/>]+)(?:\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+)))?')
+CARD_START_PATTERN = re.compile(r'<div\b[^>]*' + re.escape(CARD_CLASS), re.I)
+# Raw text elements whose content is not part of an element's text
+RAW_TEXT_TAGS = ("script", "style")
+
+
+def parse_attributes(text):
+    attributes = {}
+    for name, double, single, bare in ATTRIBUTE_PATTERN.findall(text):
+        attributes[name.lower()] = unescape(double or single or bare)
+    return attributes
+
+
+def card_field(tag, attributes):
+    """Index of the field (0 title, 1 price, 2 seller) an opening tag starts, or None."""
+    if tag == "p" and " ".join(attributes.get("class", "").split()) == TITLE_CLASS:
+        return 0
+    if tag == "span":
+        if " ".join(attributes.get("class", "").split()) == PRICE_CLASS:
+            return 1
+        if attributes.get("data-track-tag") == "typography":
+            return 2
+    return None
+
+
+def extract_stream(html):
+    """
+    SAX-style extractor: jumps between card start tags with a regex search and tokenizes only the
+    markup inside each card, keeping the text of the three fields and nothing else. Navigation,
+    scripts and page state around the cards are never tokenized or materialized.
+    """
+    cards = []
+    position = 0
+    while True:
+        match = CARD_START_PATTERN.search(html, position)
+        if match is None:
+            return cards
+        start_tag = TOKEN_PATTERN.match(html, match.start())
+        if start_tag is None or CARD_CLASS not in parse_attributes(start_tag.group(3)).get("class", "").split():
+            position = match.end()
+            continue
+
+        fields = [None, None, None]
+        active = {}      # field index -> [tag name, nesting depth, text parts]
+        div_depth = 1
+        raw_text = None  # Inside <script>/<style> until its end tag
+        position = start_tag.end()
+        while div_depth and position < len(html):
+            token = TOKEN_PATTERN.match(html, position)
+            position = token.end()
+            closing, tag, attribute_text = token.group(1), token.group(2), token.group(3)
+            if tag is None:
+                if raw_text is None and not token.group(0).startswith("<!--"):
+                    for capture in active.values():
+                        capture[2].append(token.group(0))
+                continue
+            tag = tag.lower()
+            if raw_text is not None:
+                if closing and tag == raw_text:
+                    raw_text = None
+                continue
+            if closing:
+                if tag == "div":
+                    div_depth -= 1
+                for index, capture in list(active.items()):
+                    if capture[0] == tag:
+                        capture[1] -= 1
+                        if capture[1] == 0:
+                            fields[index] = unescape("".join(capture[2]))
+                            del active[index]
+                continue
+            if tag in RAW_TEXT_TAGS:
+                raw_text = tag
+                continue
+            self_closing = attribute_text.rstrip().endswith("/")
+            if tag == "div" and not self_closing:
+                div_depth += 1
+            for capture in active.values():
+                if capture[0] == tag and not self_closing:
+                    capture[1] += 1
+            index = card_field(tag, parse_attributes(attribute_text))
+            if index is not None and fields[index] is None and index not in active:
+                if self_closing:
+                    fields[index] = ""
+                else:
+                    active[index] = [tag, 1, []]
+
+        # Elements still open when the card ended take the text seen so far, as an HTML parser would
+        for index, capture in active.items():
+            fields[index] = unescape("".join(capture[2]))
+        cards.append(tuple(fields))
+
+
+EXTRACTOR_BACKENDS = {
+    "bs4": extract_bs4,
+    "stream": extract_stream,
+}
+if lxml is not None:
+    EXTRACTOR_BACKENDS["lxml"] = extract_lxml
+if SelectolaxParser is not None:
+    EXTRACTOR_BACKENDS["selectolax"] = extract_selectolax
+
+# Preference order for "auto": fastest first
+AUTO_ORDER = ("selectolax", "lxml", "stream")
+
+
+def get_extractor(name="auto"):
+    """The extraction function for a backend name; "auto" picks the fastest one installed."""
+    if name == "auto":
+        name = next(backend for backend in AUTO_ORDER if backend in EXTRACTOR_BACKENDS)
+    try:
+        return EXTRACTOR_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Extractor backend '{name}' is not available; installed: {', '.join(EXTRACTOR_BACKENDS)}")
+
+
+def parse_gigs(html, backend="auto"):
+    """
+    Extracts {"Title", "Price", "Seller"} rows from one results page and returns (card count, rows).
+    Lives here rather than in Market_Analyzer.py so parse worker processes only import this module.
+    """
+    gigs = get_extractor(backend)(html)
+    rows = []
+
+    for title_text, price_text, seller_text in gigs:
+        title = title_text.strip() if title_text is not None else None
+        raw_price = price_text.strip() if price_text is not None else None
+        seller = seller_text.strip() if seller_text is not None else "N/A"
+        price = None
+
+        if raw_price:
+            # Clean price string
+            price_numbers = re.findall(r'[\d,.]+', raw_price)
+            price = "".join(price_numbers).strip()
+
+        if title and price:
+            rows.append({"Title": title, "Price": price, "Seller": seller})
+
+    return len(gigs), rows
@@ -0,0 +1,120 @@
+import argparse
+import csv
+import hashlib
+import html
+import os
+import random
+import time
+from email.utils import formatdate
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+# Local stand-in for Fiverr's search results, for testing the scraper without the network.
+# Serves /search/gigs?query=<keyword>&page=<n> with gig cards in the same markup the scraper
+# parses, built from the sample CSV, and an empty results page after --pages pages.
+# Responses carry an ETag and Last-Modified, and conditional requests get 304 Not Modified.
+#
+#   python mock_fiverr_server.py --port 8000 --pages 20 --delay 0.3
+#
+# then set FIVERR_SEARCH_URL = "http://127.0.0.1:8000/search/gigs" in Market_Analyzer.py
+# (or pass BASE_URL to run_scraper).
+
+SAMPLE_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "CSV_sample.csv.csv")
+
+GIGS_PER_PAGE = 48
+
+CARD_TEMPLATE = """
+<div class="gig-wrapper-impressions gig-wrapper card">
+  <div class="basic-gig-card">
+    <div class="seller-info text-body-2"><div class="z58z872 flex">
+      <a href="/{slug}" class="seller-link"><span data-track-tag="typography" class="co-grey-1200 text-bold">{seller}</span></a>
+      <span class="level">Level 2</span></div></div>
+    <a href="/{slug}/gig-{page}-{index}" class="relative-link" title="{title}">
+      <p class="f2YMuU6 tbody-5 text-normal" role="heading">{title}</p></a>
+    <div class="rating-wrapper"><strong class="rating-score">4.9</strong><span class="ratings-count">(1k+)</span></div>
+    <a href="/{slug}/gig-{page}-{index}" class="price-wrapper"><span class="co-grey-1200 text-body-2">From </span>
+      <span class="text-bold co-grey-1200"><span>PKR&nbsp;{price}</span></span></a>
+  </div>
+</div>"""
+
+def load_sample_rows():
+    with open(SAMPLE_CSV, newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+def render_page(rows, keyword, page, pages, padding_kb):
+    """One results page. Titles carry the page number so every page yields distinct gigs."""
+    cards = []
+    if page <= pages:
+        rng = random.Random(f"{keyword}:{page}") # Same page, same content on every request
+        for index in range(GIGS_PER_PAGE):
+            row = rng.choice(rows)
+            seller = row['Seller'] or "N/A"
+            cards.append(CARD_TEMPLATE.format(
+                slug=html.escape(seller.replace(' ', '').lower()), page=page, index=index,
+                seller=html.escape(seller), title=html.escape(f"{row['Title']} #{page}-{index}"),
+                price=html.escape(row['Price'])))
+    # Real result pages are mostly navigation, scripts and JSON state around the cards
+    filler = "<div class='nav-item'><a href='/categories'>Category</a></div>\n" * (padding_kb * 16)
+    return (f"<!DOCTYPE html><html><head><title>{html.escape(keyword)} | Fiverr</title></head><body>"
+            f"<header>{filler}</header><main><div class='listing-container'>{''.join(cards)}</div></main>"
+            f"</body></html>")
+
+class MockFiverrHandler(BaseHTTPRequestHandler):
+    rows = []
+    pages = 20
+    delay = 0.0
+    padding_kb = 200
+    last_modified = formatdate(usegmt=True)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path != "/search/gigs":
+            self.send_error(404, "Not Found")
+            return
+        query = parse_qs(url.query)
+        keyword = query.get('query', [''])[0]
+        try:
+            page = int(query.get('page', ['1'])[0])
+        except ValueError:
+            self.send_error(400, "Bad page")
+            return
+        if self.delay:
+            time.sleep(self.delay) # Simulated network and server latency
+        body = render_page(self.rows, keyword, page, self.pages, self.padding_kb).encode('utf-8')
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", self.last_modified)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def create_server(port=8000, pages=20, delay=0.0, padding_kb=200):
+    MockFiverrHandler.rows = load_sample_rows()
+    MockFiverrHandler.pages = pages
+    MockFiverrHandler.delay = delay
+    MockFiverrHandler.padding_kb = padding_kb
+    return ThreadingHTTPServer(("127.0.0.1", port), MockFiverrHandler)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve fake Fiverr search result pages for scraper tests.")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--pages", type=int, default=20, help="Pages with results; later pages are empty.")
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds to wait before each response.")
+    parser.add_argument("--padding-kb", type=int, default=200, help="Approximate non-gig markup per page.")
+    args = parser.parse_args()
+    server = create_server(args.port, args.pages, args.delay, args.padding_kb)
+    print(f"Serving fake results on http://127.0.0.1:{args.port}/search/gigs?query=python&page=1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,194 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from email.utils import formatdate
+
+# On-disk cache of results pages for the scraper.
+# Bodies are stored gzip-compressed under the SHA-256 of their content (objects/ab/abcd....gz), so
+# pages with identical content share one file. index.json maps each URL to its object and to the
+# validators the server sent (ETag, Last-Modified):
+#   - younger than ttl: served from disk, no request at all
+#   - older: revalidated with If-None-Match / If-Modified-Since; a 304 keeps the stored body
+#   - offline: anything cached is served whatever its age, and a miss raises CacheMiss
+# The total size of the objects is kept under max_bytes by evicting the least recently used URLs.
+# The index is written once, by save() at the end of a scrape; objects that a crashed run
+# stored but never indexed are deleted the next time the cache is opened.
+
+INDEX_FILE = "index.json"
+OBJECTS_DIR = "objects"
+
+class CacheMiss(LookupError):
+    """Raised in offline mode for a URL that is not cached."""
+
+class ResponseCache:
+    def __init__(self, directory, ttl, max_bytes, offline=False):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.hits = self.revalidated = self.misses = 0
+        os.makedirs(os.path.join(directory, OBJECTS_DIR), exist_ok=True)
+        # url -> {digest, size, etag, last_modified, stored, used}
+        self.entries = self.load_index()
+        self.remove_orphans()
+        self.evict() # max_bytes may have been lowered since the last run
+
+    def load_index(self):
+        try:
+            with open(os.path.join(self.directory, INDEX_FILE), encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # Entries whose object was deleted by hand are dropped rather than served as misses forever
+        return {url: entry for url, entry in entries.items() if os.path.exists(self.object_path(entry['digest']))}
+
+    def remove_orphans(self):
+        """Deletes objects no index entry refers to, which would otherwise escape max_bytes."""
+        referenced = {entry['digest'] + ".gz" for entry in self.entries.values()}
+        objects_dir = os.path.join(self.directory, OBJECTS_DIR)
+        for prefix in os.listdir(objects_dir):
+            prefix_dir = os.path.join(objects_dir, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for name in os.listdir(prefix_dir):
+                if name not in referenced:
+                    try:
+                        os.remove(os.path.join(prefix_dir, name))
+                    except OSError:
+                        pass
+
+    def object_path(self, digest):
+        return os.path.join(self.directory, OBJECTS_DIR, digest[:2], digest + ".gz")
+
+    def save(self):
+        """
+        Writes the index if it changed. The lock is held from the snapshot to the rename, so an older
+        snapshot can never replace a newer one; the rename is atomic, so a crash never leaves it torn.
+        """
+        with self.lock:
+            if not self.dirty:
+                return
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f)
+            os.replace(temp_path, os.path.join(self.directory, INDEX_FILE))
+            self.dirty = False
+
+    def read_body(self, entry):
+        with gzip.open(self.object_path(entry['digest']), 'rb') as f:
+            return f.read().decode('utf-8')
+
+    def store(self, url, text, etag, last_modified):
+        body = text.encode('utf-8')
+        digest = hashlib.sha256(body).hexdigest()
+        path = self.object_path(digest)
+        compressed = gzip.compress(body, compresslevel=6)
+        now = time.time()
+        # Object file and index entry change together under the lock, so evict() never deletes
+        # an object between its write and the entry that refers to it
+        with self.lock:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(compressed)
+                os.replace(temp_path, path)
+            self.entries[url] = {'digest': digest, 'size': os.path.getsize(path), 'etag': etag,
+                                 'last_modified': last_modified, 'stored': now, 'used': now}
+            self.dirty = True
+        self.evict()
+
+    def evict(self):
+        """Drops least recently used URLs until the objects fit in max_bytes, deleting unshared objects."""
+        with self.lock:
+            sizes = {entry['digest']: entry['size'] for entry in self.entries.values()}
+            total = sum(sizes.values())
+            if total <= self.max_bytes:
+                return
+            users = {}
+            for entry in self.entries.values():
+                users[entry['digest']] = users.get(entry['digest'], 0) + 1
+            doomed = []
+            for url, entry in sorted(self.entries.items(), key=lambda item: item[1]['used']):
+                if total <= self.max_bytes:
+                    break
+                del self.entries[url]
+                users[entry['digest']] -= 1
+                if users[entry['digest']] == 0:
+                    total -= entry['size']
+                    doomed.append(entry['digest'])
+            self.dirty = True
+            for digest in doomed:
+                try:
+                    os.remove(self.object_path(digest))
+                except OSError:
+                    pass
+
+    def get(self, session, url, before_request=None):
+        """
+        The page text for url, from the cache when possible. before_request is called right before a
+        network request (fresh hits and offline reads skip it), e.g. to wait on a rate limiter; if it
+        returns False the request is not sent and None is returned.
+        """
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry is not None:
+                entry = dict(entry)
+        if entry is not None and (self.offline or time.time() - entry['stored'] < self.ttl):
+            try:
+                text = self.read_body(entry)
+            except OSError:
+                entry = None # Object gone since the index was loaded; fetch it again
+            else:
+                self.touch(url, refreshed=False)
+                with self.lock:
+                    self.hits += 1
+                return text
+        if self.offline:
+            raise CacheMiss(f"Not cached (offline mode): {url}")
+
+        headers = {}
+        if entry is not None:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            headers['If-Modified-Since'] = entry['last_modified'] or formatdate(entry['stored'], usegmt=True)
+        if before_request is not None and before_request() is False:
+            return None
+        r = session.get(url, headers=headers, timeout=10)
+        if r.status_code == 304 and entry is not None:
+            try:
+                text = self.read_body(entry)
+            except OSError:
+                text = None
+            if text is not None:
+                self.touch(url, refreshed=True)
+                with self.lock:
+                    self.revalidated += 1
+                return text
+            # Validated an object that has since been evicted; fetch the full page unconditionally
+            r = session.get(url, timeout=10)
+        r.raise_for_status()
+        with self.lock:
+            self.misses += 1
+        self.store(url, r.text, r.headers.get('ETag'), r.headers.get('Last-Modified'))
+        return r.text
+
+    def touch(self, url, refreshed):
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry is None:
+                return
+            entry['used'] = time.time()
+            if refreshed:
+                entry['stored'] = entry['used']
+            self.dirty = True
+
+    def stats(self):
+        with self.lock:
+            return f"{self.hits} cached, {self.revalidated} revalidated, {self.misses} downloaded"
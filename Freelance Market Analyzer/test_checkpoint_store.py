@@ -0,0 +1,38 @@
+import json
+
+from checkpoint_store import ScrapeCheckpoint, read_log
+
+def gig(n):
+    return {"Title": f"Gig {n}", "Price": "100", "Seller": f"seller{n}"}
+
+def test_torn_tail_is_cut_before_the_next_record(tmp_path):
+    path = str(tmp_path / "python.jsonl")
+    checkpoint = ScrapeCheckpoint(path)
+    checkpoint.add_page(1, 2, [gig(1), gig(2)])
+    checkpoint.close()
+    # Crash while page 2 was being written
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"page": 2, "time": 1.0, "cards": 2, "rows": [["Gig 3", "1')
+
+    resumed = ScrapeCheckpoint(path)
+    assert set(resumed.pages) == {1}
+    assert resumed.add_page(2, 2, [gig(3), gig(4)]) == [gig(3), gig(4)]
+    resumed.close()
+
+    assert [record['page'] for record in read_log(path)] == [1, 2]
+    reopened = ScrapeCheckpoint(path)
+    assert set(reopened.pages) == {1, 2}
+    assert reopened.row_count == 4
+    assert [row[0] for row in reopened.rows()] == ["Gig 1", "Gig 2", "Gig 3", "Gig 4"]
+
+def test_complete_record_without_newline_is_kept(tmp_path):
+    path = str(tmp_path / "python.jsonl")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps({"page": 1, "time": 1.0, "cards": 1, "end": False, "rows": [["Gig 1", "100", "seller1"]]}))
+
+    checkpoint = ScrapeCheckpoint(path)
+    assert checkpoint.add_page(2, 2, [gig(1), gig(2)]) == [gig(2)]
+    checkpoint.close()
+
+    assert [record['page'] for record in read_log(path)] == [1, 2]
+    assert ScrapeCheckpoint(path).row_count == 2
@@ -0,0 +1,92 @@
+import json
+import math
+import os
+
+# Adaptive spike detection for spike_detector.py (DETECTION_MODE = "adaptive").
+# Instead of a fixed LOAD_THRESHOLD, the load is normalised per CPU core and compared with an
+# exponentially weighted moving baseline (mean and variance, O(1) per sample). A capture fires
+# when the load enters an anomalous state; hysteresis and a cooldown stop a single sustained
+# spike from producing a new archive on every sample.
+
+class AdaptiveDetector:
+    """EWMA baseline with z-score anomaly detection, hysteresis and a capture cooldown."""
+
+    def __init__(self, alpha=0.05, z_enter=3.0, z_exit=1.5, min_load=0.5, min_stddev=0.05,
+                 warmup=30, cooldown=900):
+        self.alpha = alpha            # Weight of each new sample in the baseline
+        self.z_enter = z_enter        # z-score that starts a spike
+        self.z_exit = z_exit          # z-score below which the spike is over (hysteresis)
+        self.min_load = min_load      # Per-core load below which nothing counts as a spike
+        self.min_stddev = min_stddev  # Floor for the deviation, so a flat idle baseline is not hypersensitive
+        self.warmup = warmup          # Samples needed before the baseline is trusted
+        self.cooldown = cooldown      # Minimum seconds between two captures
+
+        self.mean = 0.0
+        self.variance = 0.0
+        self.count = 0
+        self.in_spike = False
+        self.last_capture = 0.0
+
+    def stddev(self):
+        return max(math.sqrt(self.variance), self.min_stddev)
+
+    def threshold(self):
+        """Per-core load that would currently start a spike."""
+        return max(self.mean + self.z_enter * self.stddev(), self.min_load)
+
+    def update(self, load_per_core, now):
+        """
+        Feeds one sample (load divided by core count, Unix time).
+        Returns (capture, z-score of the sample against the baseline before this update).
+        """
+        z = (load_per_core - self.mean) / self.stddev() if self.count else 0.0
+        capture = False
+
+        if self.in_spike:
+            if z < self.z_exit or load_per_core < self.min_load:
+                self.in_spike = False
+        elif self.count >= self.warmup and z >= self.z_enter and load_per_core >= self.min_load:
+            self.in_spike = True
+            if now - self.last_capture >= self.cooldown:
+                capture = True
+                self.last_capture = now
+
+        # The baseline only learns from normal samples, so a long spike does not become "normal"
+        if not self.in_spike:
+            if self.count == 0:
+                self.mean = load_per_core
+            else:
+                diff = load_per_core - self.mean
+                increment = self.alpha * diff
+                self.mean += increment
+                self.variance = (1 - self.alpha) * (self.variance + diff * increment)
+            self.count += 1
+
+        return capture, z
+
+    def state(self):
+        """The learned state, for persisting between cron runs."""
+        return {'mean': self.mean, 'variance': self.variance, 'count': self.count,
+                'in_spike': self.in_spike, 'last_capture': self.last_capture}
+
+    def load_state(self, state):
+        self.mean = state.get('mean', 0.0)
+        self.variance = state.get('variance', 0.0)
+        self.count = state.get('count', 0)
+        self.in_spike = state.get('in_spike', False)
+        self.last_capture = state.get('last_capture', 0.0)
+
+def load_detector_state(detector, path):
+    """Restores detector state from path if it exists and is readable."""
+    try:
+        with open(path, 'r') as f:
+            detector.load_state(json.load(f))
+    except (OSError, ValueError):
+        pass
+
+def save_detector_state(detector, path):
+    """Writes detector state to path atomically."""
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(detector.state(), f)
+    os.replace(temp_path, path)
@@ -0,0 +1,93 @@
+import gzip
+import os
+import tarfile
+import threading
+from collections import OrderedDict
+
+# Optional: only needed to browse zstd-compressed archives (.tar.zst)
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Read access to single members of the diagnostic archives, for the dashboard.
+# The member list of each archive (names, sizes and data offsets inside the uncompressed tar
+# stream) is read once and cached; a member is then served by opening the archive's
+# decompressed stream, skipping to its offset and reading only its bytes. Nothing is
+# extracted to disk.
+
+# Archives whose member index is kept in memory
+MEMBER_INDEX_CACHE_SIZE = 256
+STREAM_CHUNK_BYTES = 64 * 1024
+
+class ArchiveMember:
+    """Where one regular file lives inside the uncompressed tar stream."""
+    __slots__ = ("name", "size", "mtime", "offset")
+
+    def __init__(self, name, size, mtime, offset):
+        self.name = name
+        self.size = size
+        self.mtime = mtime
+        self.offset = offset
+
+    def to_json(self):
+        return {'name': self.name, 'size': self.size, 'mtime': self.mtime}
+
+def open_tar_stream(path):
+    """The archive's uncompressed tar stream, as a forward-seekable binary file object."""
+    if path.endswith('.tar.zst'):
+        if zstandard is None:
+            raise OSError("zstandard is not installed; cannot read .tar.zst archives")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    if path.endswith('.tar.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+def read_members(path):
+    """Scans an archive once and returns its regular files in archive order."""
+    members = []
+    with open_tar_stream(path) as stream:
+        # Stream mode ("r|") never seeks backwards, which the zstd reader cannot do
+        with tarfile.open(fileobj=stream, mode="r|") as tar:
+            for info in tar:
+                if info.isfile():
+                    members.append(ArchiveMember(info.name, info.size, info.mtime, info.offset_data))
+    return members
+
+class MemberIndexCache:
+    """LRU cache of archive member lists, keyed by path and validated against size and mtime."""
+
+    def __init__(self, capacity=MEMBER_INDEX_CACHE_SIZE):
+        self.capacity = capacity
+        self.entries = OrderedDict() # path -> ((size, mtime_ns), {member name: ArchiveMember})
+        self.lock = threading.Lock()
+
+    def get(self, path):
+        """{member name: ArchiveMember} for an archive. Raises OSError or tarfile.TarError if unreadable."""
+        st = os.stat(path)
+        stamp = (st.st_size, st.st_mtime_ns)
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry[0] == stamp:
+                self.entries.move_to_end(path)
+                return entry[1]
+        # Scanned outside the lock, so one large archive does not hold up requests for others
+        members = {member.name: member for member in read_members(path)}
+        with self.lock:
+            self.entries[path] = (stamp, members)
+            self.entries.move_to_end(path)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+        return members
+
+def iter_member(path, member, chunk_size=STREAM_CHUNK_BYTES):
+    """Yields the bytes of one member in chunks, reading nothing past its end."""
+    with open_tar_stream(path) as stream:
+        stream.seek(member.offset) # Plain tar: a real seek; compressed: decompress and discard
+        remaining = member.size
+        while remaining > 0:
+            chunk = stream.read(min(chunk_size, remaining))
+            if not chunk:
+                raise OSError(f"{os.path.basename(path)} ends inside {member.name}")
+            remaining -= len(chunk)
+            yield chunk
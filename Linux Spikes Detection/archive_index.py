@@ -0,0 +1,164 @@
+import os
+import sqlite3
+import time
+
+# Small SQLite index of the diagnostic archives, updated by spike_detector.py at capture time.
+# Retention and the dashboard query it instead of listing and stat()-ing the whole
+# diagnostics directory on every run.
+
+INDEX_FILENAME = "archive_index.sqlite3"
+
+# Archive extensions written by spike_detector.py (see its ARCHIVE_EXTENSIONS setting)
+ARCHIVE_SUFFIXES = ('.tar.gz', '.tar.zst', '.tar')
+# Suffix of an archive still being written; renamed away when the capture completes
+PARTIAL_SUFFIX = '.part'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS archives (
+    name TEXT PRIMARY KEY,      -- File name inside the diagnostics directory
+    created REAL NOT NULL,      -- Unix time the capture finished
+    size INTEGER NOT NULL,      -- Bytes on disk
+    trigger_load REAL           -- 5-minute load that triggered the capture, if known
+);
+CREATE INDEX IF NOT EXISTS archives_created ON archives (created);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value REAL
+);
+"""
+
+def index_path(diagnostics_dir):
+    """Location of the index for a diagnostics directory."""
+    return os.path.join(diagnostics_dir, INDEX_FILENAME)
+
+class ArchiveIndex:
+    """Read/write access to the archive index of one diagnostics directory."""
+
+    def __init__(self, diagnostics_dir, read_only=False):
+        self.diagnostics_dir = diagnostics_dir
+        path = index_path(diagnostics_dir)
+        if read_only:
+            # Never creates the file; raises sqlite3.OperationalError if the detector has not made one
+            self.db = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=5, check_same_thread=False)
+        else:
+            is_new = not os.path.exists(path)
+            self.db = sqlite3.connect(path, timeout=5)
+            self.db.executescript(SCHEMA)
+            if is_new:
+                self.rebuild()
+
+    def close(self):
+        self.db.close()
+
+    def rebuild(self):
+        """
+        Re-indexes the archives present on disk; used once when the index is created so
+        archives from before the index existed are still subject to retention.
+        """
+        rows = []
+        with os.scandir(self.diagnostics_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(ARCHIVE_SUFFIXES) and entry.is_file():
+                    st = entry.stat()
+                    rows.append((entry.name, st.st_mtime, st.st_size, None))
+        with self.db:
+            self.db.execute("DELETE FROM archives")
+            self.db.executemany("INSERT INTO archives VALUES (?, ?, ?, ?)", rows)
+            self.set_reconciled(time.time())
+
+    def last_reconciled(self):
+        """Unix time of the last rebuild or reconcile, or None if there was none."""
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'reconciled'").fetchone()
+        return row[0] if row else None
+
+    def set_reconciled(self, when):
+        self.db.execute("INSERT OR REPLACE INTO meta VALUES ('reconciled', ?)", (when,))
+
+    def reconcile(self, partial_max_age, now=None):
+        """
+        Brings the index in line with the directory in one scan: forgets archives that were
+        deleted by hand and indexes archives it is missing. Captures keep the index current
+        themselves, so this is only needed now and then (see last_reconciled). Returns (forgotten, added, stale
+        partial files), the last being *.part files of captures that died over partial_max_age
+        seconds ago (a running capture keeps its file's mtime current).
+        """
+        now = time.time() if now is None else now
+        # The index is read before the directory: an archive added by a concurrent capture in
+        # between is then seen on disk and kept, never mistaken for a deleted one
+        indexed = {name for (name,) in self.db.execute("SELECT name FROM archives")}
+        on_disk = set()
+        missing_rows = []
+        stale_partials = []
+        with os.scandir(self.diagnostics_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(PARTIAL_SUFFIX):
+                    try:
+                        if entry.is_file() and now - entry.stat().st_mtime > partial_max_age:
+                            stale_partials.append(entry.name)
+                    except FileNotFoundError:
+                        pass # Renamed by the capture that was writing it
+                elif entry.name.endswith(ARCHIVE_SUFFIXES) and entry.is_file():
+                    on_disk.add(entry.name)
+                    if entry.name not in indexed:
+                        st = entry.stat()
+                        missing_rows.append((entry.name, st.st_mtime, st.st_size, None))
+        forgotten = indexed - on_disk
+        with self.db:
+            self.db.executemany("DELETE FROM archives WHERE name = ?", [(name,) for name in forgotten])
+            # OR IGNORE: a concurrent capture's own entry (with its trigger load) wins
+            self.db.executemany("INSERT OR IGNORE INTO archives VALUES (?, ?, ?, ?)", missing_rows)
+            self.set_reconciled(now)
+        return len(forgotten), len(missing_rows), stale_partials
+
+    def add(self, name, created, size, trigger_load=None):
+        """Records a newly written archive."""
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO archives VALUES (?, ?, ?, ?)",
+                            (name, created, size, trigger_load))
+
+    def remove(self, name):
+        """Forgets an archive (after it was deleted)."""
+        with self.db:
+            self.db.execute("DELETE FROM archives WHERE name = ?", (name,))
+
+    def stats(self):
+        """(archive count, total bytes)."""
+        count, total = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM archives").fetchone()
+        return count, total
+
+    def list(self, limit=None, offset=0):
+        """Archives newest first as (name, created, size, trigger_load) tuples."""
+        return self.db.execute(
+            "SELECT name, created, size, trigger_load FROM archives ORDER BY created DESC LIMIT ? OFFSET ?",
+            (-1 if limit is None else limit, offset)).fetchall()
+
+    def select_expired(self, max_age_seconds=None, max_bytes=None, max_files=None, now=None):
+        """
+        Names of the archives to delete, oldest first, so that what remains is younger than
+        max_age_seconds, totals at most max_bytes and holds at most max_files archives.
+        Any limit may be None to disable it.
+        """
+        now = time.time() if now is None else now
+        expired = []
+        if max_age_seconds is not None:
+            expired = [name for (name,) in self.db.execute(
+                "SELECT name FROM archives WHERE created < ? ORDER BY created", (now - max_age_seconds,))]
+
+        if max_bytes is None and max_files is None:
+            return expired
+
+        # Walk the remaining archives newest first; everything past a limit goes too
+        already = set(expired)
+        kept_files, kept_bytes = 0, 0
+        over_limit = []
+        for name, size in self.db.execute("SELECT name, size FROM archives ORDER BY created DESC"):
+            if name in already:
+                continue
+            if over_limit or (max_files is not None and kept_files + 1 > max_files) \
+                    or (max_bytes is not None and kept_bytes + size > max_bytes):
+                over_limit.append(name)
+                continue
+            kept_files += 1
+            kept_bytes += size
+        over_limit.reverse() # Oldest first, like the age-based list
+        return expired + over_limit
@@ -0,0 +1,81 @@
+from bisect import bisect_left
+
+# Optional: numpy does the bucket reductions in C; without it the same result is computed per bucket
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Time-range chart data for the dashboard, built from a LoadSeriesStore.
+# Each range reads the coarsest source that still covers it and is reduced server-side to at
+# most CHART_POINTS min/max buckets of equal width, so a spike survives downsampling and the
+# browser only ever receives a few hundred points.
+
+# Range name -> (span in seconds, store source: "raw" samples or a tier name from load_store.TIERS)
+CHART_RANGES = {
+    "1h": (3600, "raw"),
+    "24h": (86400, "1m"),
+    "7d": (7 * 86400, "1m"),
+    "30d": (30 * 86400, "1h"),
+}
+
+CHART_POINTS = 300
+
+def source_columns(store, source):
+    """(timestamps, lower values, upper values) of a store source in time order."""
+    if source == "raw":
+        load = store.raw.column('load')
+        return store.raw.column('ts'), load, load
+    # Tiers keep the mean and the peak of each bucket; the mean is the best lower envelope available
+    return store.tier_points(source)
+
+def minmax_downsample(ts, lows, highs, start, end, points=CHART_POINTS):
+    """
+    Reduces samples within [start, end] to at most `points` equal-width time buckets.
+    Returns a list of [bucket start, min, max]; buckets without samples are left out.
+    """
+    first = bisect_left(ts, start)
+    count = len(ts) - first
+    if count <= 0:
+        return []
+    if count <= points:
+        return [[ts[i], lows[i], highs[i]] for i in range(first, len(ts))]
+
+    width = (end - start) / points
+    edges = [start + k * width for k in range(points)]
+
+    if numpy is not None:
+        ts_values = numpy.frombuffer(ts, dtype=numpy.float64)[first:]
+        low_values = numpy.frombuffer(lows, dtype=numpy.float32)[first:]
+        high_values = numpy.frombuffer(highs, dtype=numpy.float32)[first:]
+        starts = numpy.searchsorted(ts_values, edges)
+        ends = numpy.append(starts[1:], len(ts_values))
+        filled = starts < ends
+        # reduceat on non-empty buckets only; an empty bucket would repeat its neighbour's value
+        starts = starts[filled]
+        mins = numpy.minimum.reduceat(low_values, starts)
+        maxes = numpy.maximum.reduceat(high_values, starts)
+        return [[edge, low, high] for edge, low, high in
+                zip(numpy.asarray(edges)[filled].tolist(), mins.tolist(), maxes.tolist())]
+
+    result = []
+    starts = [bisect_left(ts, edge, first) for edge in edges] + [len(ts)]
+    for k in range(points):
+        lo, hi = starts[k], starts[k + 1]
+        if lo < hi:
+            result.append([edges[k], min(lows[lo:hi]), max(highs[lo:hi])])
+    return result
+
+def build_chart(store, range_name, now):
+    """Chart payload for one CHART_RANGES entry, ending at `now`."""
+    span, source = CHART_RANGES[range_name]
+    ts, lows, highs = source_columns(store, source)
+    start = now - span
+    points = minmax_downsample(ts, lows, highs, start, now)
+    return {
+        'range': range_name,
+        'start': start,
+        'end': now,
+        'threshold': store.threshold,
+        'points': [[round(t, 3), round(low, 2), round(high, 2)] for t, low, high in points],
+    }
@@ -0,0 +1,64 @@
+import json
+import os
+
+# Structured event stream written by spike_detector.py next to its human-readable log.
+# One JSON object per line (NDJSON). Every event has "ts" (Unix time) and "type":
+#   check   - load1, load5, load15, threshold, decision ("capture" or "ok"),
+#             plus z/baseline (adaptive mode) or rules/signals (trigger mode)
+#   capture - archive, compression, size, duration, commands {name: {"elapsed", "status"}}
+#   cleanup - deleted
+# Readers decode it line by line with decode_event (the dashboard's EventLogTailParser)
+# instead of running regexes over free text.
+
+# Rotate when the file grows beyond this many bytes
+EVENT_LOG_MAX_BYTES = 10 * 1024 * 1024
+# Rotated files kept as <path>.1 ... <path>.N
+EVENT_LOG_BACKUPS = 5
+
+class EventLogWriter:
+    """Append-only NDJSON writer with size-based rotation."""
+
+    def __init__(self, path, max_bytes=EVENT_LOG_MAX_BYTES, backups=EVENT_LOG_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.fd = None
+
+    def open(self):
+        # O_APPEND makes each os.write land at the end even if another process appends too
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def write(self, event):
+        """Appends one event as a single write() call, rotating first if the file is full."""
+        line = (json.dumps(event, separators=(',', ':')) + "\n").encode('utf-8')
+        if self.fd is None:
+            self.open()
+        if os.fstat(self.fd).st_size + len(line) > self.max_bytes:
+            self.rotate()
+        os.write(self.fd, line)
+
+    def rotate(self):
+        """Shifts <path> -> <path>.1 -> ... -> <path>.N (the oldest is dropped) and reopens."""
+        self.close()
+        for i in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.open()
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+def decode_event(line):
+    """Parses one NDJSON line (str or bytes). Returns None for blank or corrupt lines."""
+    try:
+        event = json.loads(line)
+    except ValueError:
+        return None
+    return event if isinstance(event, dict) and 'ts' in event and 'type' in event else None
@@ -0,0 +1,100 @@
+import gzip
+import json
+import threading
+import urllib.error
+import urllib.request
+from collections import deque
+
+# Pushes spike_detector.py events to a fleet collector (fleet_collector.py).
+# Events are buffered in memory and sent in gzip-compressed JSON batches every few seconds,
+# so a host sampling once per second makes one small HTTP request per push interval.
+# If the collector is unreachable the events stay buffered (up to max_buffer, oldest dropped
+# first) and go out with the next successful push. A batch the collector rejects (4xx) would be
+# rejected again, so it is dropped and counted instead of being retried.
+
+# Events per request; a backlog after an outage is sent in several requests
+MAX_BATCH_EVENTS = 5000
+
+class FleetAgent:
+    """Buffers events of one host and POSTs them to <collector_url>/ingest."""
+
+    def __init__(self, collector_url, host, cores, push_interval=10, max_buffer=100000, token=None,
+                 timeout=5, log=None):
+        self.url = collector_url.rstrip('/') + "/ingest"
+        self.host = host
+        self.cores = cores
+        self.push_interval = push_interval
+        self.token = token
+        self.timeout = timeout
+        self.log = log # Called with a message when a batch is dropped
+        self.buffer = deque(maxlen=max_buffer)
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.pushed = 0   # Events delivered
+        self.failures = 0 # Failed requests
+        self.rejected = 0 # Events dropped because the collector refused their batch
+
+    def add(self, event):
+        """Queues one event (a dict with 'ts' and 'type', as written to the event log)."""
+        with self.lock:
+            self.buffer.append(event)
+
+    def flush(self):
+        """Sends everything buffered. Returns False if a request failed; unsent events stay queued."""
+        while True:
+            with self.lock:
+                batch = [self.buffer.popleft() for _ in range(min(len(self.buffer), MAX_BATCH_EVENTS))]
+            if not batch:
+                return True
+            try:
+                self.post(batch)
+            except urllib.error.HTTPError as e:
+                if e.code >= 500 or e.code in (408, 429): # Collector trouble or throttling, not the batch
+                    self.requeue(batch)
+                    return False
+                self.rejected += len(batch)
+                if self.log is not None:
+                    self.log(f"WARNING: Fleet collector rejected {len(batch)} events ({e.code} {e.reason}); dropped.")
+                continue
+            except (OSError, ValueError):
+                self.requeue(batch)
+                return False
+            self.pushed += len(batch)
+
+    def requeue(self, batch):
+        """Puts a batch that could not be delivered back in front, to go out with the next push."""
+        with self.lock:
+            # Put the batch back in front, unless newer events already filled the buffer
+            room = self.buffer.maxlen - len(self.buffer)
+            self.buffer.extendleft(reversed(batch[-room:] if room else []))
+        self.failures += 1
+
+    def post(self, batch):
+        body = gzip.compress(json.dumps({'host': self.host, 'cores': self.cores, 'events': batch},
+                                        separators=(',', ':')).encode('utf-8'), compresslevel=6)
+        request = urllib.request.Request(self.url, data=body, method="POST", headers={
+            "Content-Type": "application/json",
+            "Content-Encoding": "gzip",
+        })
+        if self.token:
+            request.add_header("X-Fleet-Token", self.token)
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+    def start(self):
+        """Pushes in a background thread every push_interval seconds."""
+        self.thread = threading.Thread(target=self.run, name="fleet-agent", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stop_event.wait(self.push_interval):
+            self.flush()
+
+    def stop(self):
+        """Stops the push thread after one last flush."""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.flush()
@@ -0,0 +1,427 @@
+import json
+import math
+import os
+import socket
+import threading
+import time
+import zlib
+from collections import deque
+from datetime import datetime
+from html import escape
+
+from load_store import LoadSeriesStore
+from http_server import DashboardHandler, RenderedPage, ThreadPoolHTTPServer, format_timestamp
+
+# Fleet collector: agents (fleet_agent.py, enabled by FLEET_COLLECTOR_URL in spike_detector.py)
+# POST gzip-compressed batches of detector events to /ingest. The collector keeps a bounded
+# LoadSeriesStore per host and serves a fleet dashboard with a per-host load heatmap and the
+# spikes that started on several hosts at once.
+
+# --- CONFIGURATION ---
+PORT = 8090
+WORKER_COUNT = 16
+# Shared secret agents must send in X-Fleet-Token; None accepts any agent
+FLEET_TOKEN = None
+# Limits per request: compressed body and decompressed JSON
+MAX_BODY_BYTES = 4 * 1024 * 1024
+MAX_BATCH_BYTES = 32 * 1024 * 1024
+# Per-host history: raw samples (an hour at one sample per second) and per-minute buckets for a day
+HOST_RAW_CAPACITY = 3600
+HOST_TIERS = {"1m": (60, 24 * 60)}
+# Recent archives remembered per host
+HOST_ARCHIVES = 20
+# Heatmap width in one-minute columns
+HEATMAP_MINUTES = 60
+# A host that has not pushed for this many seconds is shown as stale
+STALE_AFTER = 120
+# Spike onsets on at least CORRELATION_MIN_HOSTS hosts within CORRELATION_WINDOW seconds of each other
+# are reported as one correlated spike
+CORRELATION_WINDOW = 60
+CORRELATION_MIN_HOSTS = 3
+MAX_ONSETS = 20000
+# The fleet page is re-rendered at most this often while samples keep arriving
+PAGE_MAX_AGE = 5
+
+# --- BATCH VALIDATION ---
+
+# Optional event fields and the JSON types they must have (None is allowed for every one)
+NUMERIC_FIELDS = ('load1', 'load5', 'load15', 'threshold', 'size', 'duration')
+STRING_FIELDS = ('type', 'decision', 'archive')
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+def validate_batch(payload):
+    """
+    Checks a whole agent batch before any of it is applied.
+    Returns (host name, cores or None, events in time order); raises ValueError on any bad field.
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("batch is not an object")
+    host_name = payload.get('host')
+    if not isinstance(host_name, str) or not host_name:
+        raise ValueError("missing host")
+    cores = payload.get('cores')
+    if cores is not None and not (isinstance(cores, int) and not isinstance(cores, bool) and cores > 0):
+        raise ValueError("cores must be a positive integer")
+    events = payload.get('events')
+    if not isinstance(events, list):
+        raise ValueError("events must be a list")
+    for index, event in enumerate(events):
+        if not isinstance(event, dict) or not is_number(event.get('ts')) or not isinstance(event.get('type'), str):
+            raise ValueError(f"event {index}: needs a numeric ts and a type")
+        for field in NUMERIC_FIELDS:
+            if event.get(field) is not None and not is_number(event[field]):
+                raise ValueError(f"event {index}: {field} must be a number")
+        for field in STRING_FIELDS:
+            if event.get(field) is not None and not isinstance(event[field], str):
+                raise ValueError(f"event {index}: {field} must be a string")
+    return host_name[:255], cores, sorted(events, key=lambda event: event['ts'])
+
+class HostState:
+    """Everything the collector knows about one host."""
+
+    def __init__(self, name, cores):
+        self.name = name
+        self.cores = cores or 1
+        self.threshold = None
+        self.store = LoadSeriesStore(0.0, HOST_RAW_CAPACITY, HOST_TIERS)
+        self.archives = deque(maxlen=HOST_ARCHIVES)
+        self.last_seen = 0.0
+        self.in_spike = False
+
+    def add_event(self, event):
+        """Applies one detector event. Returns the onset time if a new spike started, else None."""
+        if event['type'] == "check":
+            if event.get('threshold') is not None:
+                self.threshold = self.store.threshold = event['threshold']
+            spiking = event.get('decision') == "capture"
+            self.store.add(event['ts'], event.get('load5') or 0.0, captured=spiking)
+            onset = spiking and not self.in_spike
+            self.in_spike = spiking
+            return event['ts'] if onset else None
+        if event['type'] == "capture":
+            self.archives.append({'ts': event['ts'], 'archive': os.path.basename(event.get('archive') or ''),
+                                  'size': event.get('size'), 'duration': event.get('duration')})
+        return None
+
+    def heatmap_row(self, now, minutes=HEATMAP_MINUTES):
+        """Peak load per core for each of the last `minutes` minutes (None where there is no data)."""
+        ts, means, maxes = self.store.tier_points("1m")
+        first_bucket = now - now % 60 - (minutes - 1) * 60
+        row = [None] * minutes
+        for i in range(len(ts) - 1, -1, -1):
+            column = int((ts[i] - first_bucket) // 60)
+            if column < 0:
+                break
+            if column < minutes:
+                row[column] = maxes[i] / self.cores
+        return row
+
+    def summary(self, now):
+        stats = self.store.summary()
+        return {
+            'host': self.name,
+            'cores': self.cores,
+            'last_seen': self.last_seen,
+            'stale': now - self.last_seen > STALE_AFTER,
+            'last_load': None if stats['last_load'] is None else round(stats['last_load'], 2),
+            'avg_load': round(stats['avg_load'], 3),
+            'max_load': round(stats['max_load'], 2),
+            'threshold': self.threshold,
+            'in_spike': self.in_spike,
+            'samples': stats['count'],
+            'captures': len(self.archives),
+        }
+
+class FleetStore:
+    """All hosts, plus the spike onsets used for correlation. Thread-safe."""
+
+    def __init__(self):
+        self.hosts = {}
+        self.onsets = deque(maxlen=MAX_ONSETS) # (ts, host)
+        self.lock = threading.Lock()
+        self.generation = 0 # Bumped on every ingest; cached pages compare against it
+        self.events_ingested = 0
+
+    def ingest(self, payload):
+        """
+        Applies one agent batch, all or nothing. Returns the number of events accepted.
+        Raises ValueError, before anything is applied, if any part of the batch is malformed.
+        """
+        host_name, cores, events = validate_batch(payload)
+        with self.lock:
+            host = self.hosts.get(host_name)
+            if host is None:
+                host = self.hosts[host_name] = HostState(host_name, cores)
+            for event in events:
+                onset = host.add_event(event)
+                if onset is not None:
+                    self.onsets.append((onset, host_name))
+            host.last_seen = time.time()
+            self.generation += 1
+            self.events_ingested += len(events)
+        return len(events)
+
+    def correlated_spikes(self, window=CORRELATION_WINDOW, min_hosts=CORRELATION_MIN_HOSTS):
+        """
+        Groups of spike onsets within `window` seconds of the group's first onset that span at least
+        min_hosts hosts, newest first. Measuring from the first onset keeps a steady trickle of onsets
+        from chaining into one group hours long.
+        """
+        with self.lock:
+            onsets = sorted(self.onsets)
+        groups = []
+        current = []
+        for ts, host in onsets:
+            if current and ts - current[0][0] > window:
+                groups.append(current)
+                current = []
+            current.append((ts, host))
+        if current:
+            groups.append(current)
+
+        spikes = []
+        for group in groups:
+            hosts = sorted({host for ts, host in group})
+            if len(hosts) >= min_hosts:
+                spikes.append({'start': group[0][0], 'end': group[-1][0], 'hosts': hosts})
+        spikes.reverse()
+        return spikes
+
+    def host_summaries(self, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            return [host.summary(now) for host in self.hosts.values()]
+
+    def heatmap(self, now=None, minutes=HEATMAP_MINUTES):
+        """{host: [peak load per core per minute]} for the last `minutes` minutes."""
+        now = time.time() if now is None else now
+        with self.lock:
+            return {name: host.heatmap_row(now, minutes) for name, host in self.hosts.items()}
+
+    def recent_archives(self, limit=20):
+        with self.lock:
+            archives = [dict(archive, host=name) for name, host in self.hosts.items() for archive in host.archives]
+        archives.sort(key=lambda archive: archive['ts'], reverse=True)
+        return archives[:limit]
+
+_fleet = FleetStore()
+
+# --- FLEET DASHBOARD ---
+
+def heat_color(value):
+    """Cell colour for a load per core: green below 0.5, through yellow, to red at 1.5 and above."""
+    if value is None:
+        return "#e5e7eb"
+    hue = 120 - 120 * min(max((value - 0.5) / 1.0, 0.0), 1.0)
+    return f"hsl({hue:.0f}, 70%, 50%)"
+
+def generate_fleet_html(fleet):
+    """Renders the fleet dashboard: heatmap, correlated spikes and recent archives."""
+    now = time.time()
+    summaries = {summary['host']: summary for summary in fleet.host_summaries(now)}
+    heatmap = fleet.heatmap(now)
+    correlated = fleet.correlated_spikes()[:20]
+    archives = fleet.recent_archives()
+
+    # Hottest hosts first
+    def current_heat(name):
+        values = [value for value in heatmap[name][-5:] if value is not None]
+        return max(values) if values else -1.0
+
+    def cell(value):
+        title = "no data" if value is None else f"{value:.2f}/core"
+        return f'<td style="background:{heat_color(value)}" title="{title}"></td>'
+
+    rows = []
+    for name in sorted(heatmap, key=current_heat, reverse=True):
+        summary = summaries[name]
+        cells = "".join(cell(value) for value in heatmap[name])
+        status = "text-gray-400" if summary['stale'] else ("text-red-600 font-bold" if summary['in_spike'] else "")
+        last_load = "N/A" if summary['last_load'] is None else f"{summary['last_load']:.2f}"
+        rows.append(f'<tr><td class="pr-3 font-mono text-xs whitespace-nowrap {status}">{escape(name)}</td>'
+                    f'<td class="pr-3 text-xs text-right">{last_load}</td>{cells}</tr>')
+
+    spike_rows = []
+    for spike in correlated:
+        spike_rows.append(f'<tr class="border-b"><td class="px-4 py-2 font-mono text-sm">{format_timestamp(spike["start"])}</td>'
+                          f'<td class="px-4 py-2 text-center">{spike["end"] - spike["start"]:.0f}s</td>'
+                          f'<td class="px-4 py-2 text-center font-bold">{len(spike["hosts"])}</td>'
+                          f'<td class="px-4 py-2 font-mono text-xs">{escape(", ".join(spike["hosts"][:12]))}'
+                          f'{" ..." if len(spike["hosts"]) > 12 else ""}</td></tr>')
+
+    archive_rows = []
+    for archive in archives:
+        archive_rows.append(f'<tr class="border-b"><td class="px-4 py-2 font-mono text-sm">{format_timestamp(archive["ts"])}</td>'
+                            f'<td class="px-4 py-2 font-mono text-xs">{escape(archive["host"])}</td>'
+                            f'<td class="px-4 py-2 font-mono text-xs">{escape(archive["archive"])}</td></tr>')
+
+    spiking = sum(1 for summary in summaries.values() if summary['in_spike'] and not summary['stale'])
+    stale = sum(1 for summary in summaries.values() if summary['stale'])
+
+    return f"""
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <meta http-equiv="refresh" content="30">
+    <title>Fleet Load Dashboard</title>
+    <script src="https://cdn.tailwindcss.com"></script>
+    <style>
+        body {{ font-family: 'Inter', sans-serif; background-color: #f7f9fc; }}
+        .card {{ background-color: white; border-radius: 1rem; box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1); }}
+        .heatmap td[style] {{ width: 10px; height: 12px; }}
+    </style>
+</head>
+<body class="p-4 sm:p-8">
+    <div class="max-w-7xl mx-auto">
+        <header class="mb-8 p-6 card">
+            <h1 class="text-3xl font-extrabold text-gray-900">Fleet Load Dashboard</h1>
+            <p class="text-gray-500 mt-1">{len(summaries)} hosts, {spiking} spiking, {stale} stale
+               &middot; generated {datetime.fromtimestamp(now).strftime('%Y-%m-%d %H:%M:%S')}</p>
+        </header>
+
+        <div class="card p-6 mb-8 overflow-x-auto">
+            <h2 class="text-xl font-semibold text-gray-800 mb-4">Peak load per core, last {HEATMAP_MINUTES} minutes</h2>
+            <table class="heatmap border-separate" style="border-spacing: 1px">
+                <tbody>{"".join(rows)}</tbody>
+            </table>
+        </div>
+
+        <div class="card p-6 mb-8 overflow-x-auto">
+            <h2 class="text-xl font-semibold text-gray-800 mb-4">Correlated spikes (at least {CORRELATION_MIN_HOSTS} hosts within {CORRELATION_WINDOW}s)</h2>
+            <table class="min-w-full">
+                <thead><tr class="text-left text-xs text-gray-500 uppercase"><th class="px-4 py-2">Start</th>
+                    <th class="px-4 py-2 text-center">Spread</th><th class="px-4 py-2 text-center">Hosts</th><th class="px-4 py-2">Host names</th></tr></thead>
+                <tbody>{"".join(spike_rows) or '<tr><td class="px-4 py-2 text-gray-500" colspan="4">None</td></tr>'}</tbody>
+            </table>
+        </div>
+
+        <div class="card p-6 overflow-x-auto">
+            <h2 class="text-xl font-semibold text-gray-800 mb-4">Recent diagnostic archives</h2>
+            <table class="min-w-full">
+                <tbody>{"".join(archive_rows) or '<tr><td class="px-4 py-2 text-gray-500">None</td></tr>'}</tbody>
+            </table>
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+_page_cache = None
+_page_cache_lock = threading.Lock()
+
+def get_fleet_page():
+    """The cached fleet page; re-rendered when new batches arrived, at most every PAGE_MAX_AGE seconds."""
+    global _page_cache
+    with _page_cache_lock:
+        generation = _fleet.generation
+        if _page_cache is None or (_page_cache.key != generation
+                                   and time.time() - _page_cache.last_modified >= PAGE_MAX_AGE):
+            _page_cache = RenderedPage(generation, generate_fleet_html(_fleet), time.time())
+        return _page_cache
+
+# --- HTTP ---
+
+class FleetHandler(DashboardHandler):
+    """Ingest endpoint for agents plus the fleet dashboard and its JSON API."""
+
+    ROUTES = {
+        '/': 'serve_dashboard',
+        '/index.html': 'serve_dashboard',
+        '/api/hosts': 'serve_api_hosts',
+        '/api/heatmap': 'serve_api_heatmap',
+        '/api/correlated': 'serve_api_correlated',
+    }
+
+    def log_message(self, format, *args):
+        # One line per agent push would flood the console at fleet scale
+        pass
+
+    def do_POST(self):
+        """POST /ingest: one gzip (or plain) JSON batch {"host", "cores", "events": [...]}."""
+        if self.path != "/ingest":
+            self.send_error(404, "Not Found")
+            return
+        if FLEET_TOKEN and self.headers.get('X-Fleet-Token') != FLEET_TOKEN:
+            self.send_error(403, "Forbidden")
+            return
+        try:
+            length = int(self.headers.get('Content-Length', ''))
+        except ValueError:
+            self.send_error(411, "Length Required")
+            return
+        if length < 0:
+            self.send_error(400, "Invalid Content-Length") # read(-1) would wait for the client to close
+            return
+        if length > MAX_BODY_BYTES:
+            self.send_error(413, "Batch too large")
+            return
+        body = self.rfile.read(length)
+
+        try:
+            if self.headers.get('Content-Encoding', '').lower() == "gzip":
+                # Bounded decompression, so a small malicious body cannot expand without limit
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                body = decompressor.decompress(body, MAX_BATCH_BYTES)
+                if decompressor.unconsumed_tail:
+                    self.send_error(413, "Batch too large")
+                    return
+            payload = json.loads(body)
+            accepted = _fleet.ingest(payload)
+        except (zlib.error, ValueError) as e:
+            self.send_json({'status': f'Bad batch: {e}'}, status=400)
+            return
+        self.send_json({'status': 'OK', 'accepted': accepted})
+
+    def serve_api_hosts(self):
+        """GET /api/hosts: per-host summary."""
+        self.send_json({'status': 'OK', 'hosts': _fleet.host_summaries()})
+
+    def serve_api_heatmap(self):
+        """GET /api/heatmap?minutes=<n>: peak load per core per minute and host, oldest minute first."""
+        minutes = int(min(max(self.query_float('minutes', HEATMAP_MINUTES), 1), HOST_TIERS["1m"][1]))
+        self.send_json({'status': 'OK', 'minutes': minutes, 'hosts': _fleet.heatmap(minutes=minutes)})
+
+    def serve_api_correlated(self):
+        """GET /api/correlated?window=<s>&min_hosts=<n>: correlated spikes, newest first."""
+        window = self.query_float('window', CORRELATION_WINDOW)
+        min_hosts = int(self.query_float('min_hosts', CORRELATION_MIN_HOSTS))
+        self.send_json({'status': 'OK', 'spikes': _fleet.correlated_spikes(window, min_hosts)})
+
+    def serve_dashboard(self):
+        page = get_fleet_page()
+        if self.is_not_modified(page):
+            self.send_response(304)
+            self.send_page_validators(page)
+            self.end_headers()
+            return
+        use_gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+        body = page.gzip_body if use_gzip else page.body
+        self.send_response(200)
+        self.send_header("Content-type", "text/html; charset=utf-8")
+        if use_gzip:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_page_validators(page)
+        self.end_headers()
+        self.wfile.write(body)
+
+def create_collector(port=PORT, workers=WORKER_COUNT):
+    return ThreadPoolHTTPServer(("", port), FleetHandler, workers)
+
+# --- MAIN EXECUTION ---
+if __name__ == "__main__":
+    print("------------------------------------------------------------------")
+    print(f"Starting Fleet Collector on port {PORT}...")
+    print(f"Agents push to: http://{socket.gethostname()}:{PORT}/ingest")
+    print(f"Fleet dashboard: http://{socket.gethostname()}:{PORT}/")
+    print("Press Ctrl+C to stop the server.")
+    print("------------------------------------------------------------------")
+    try:
+        with create_collector(PORT, WORKER_COUNT) as httpd:
+            httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\nCollector stopped.")
@@ -0,0 +1,120 @@
+import argparse
+import random
+import threading
+import time
+from datetime import datetime
+
+from fleet_agent import FleetAgent
+
+# Local test bed for fleet mode: runs many simulated hosts, each with its own FleetAgent, pushing
+# synthetic load samples to a collector. Every --incident-every seconds a random share of the
+# hosts spikes together, which should show up on the fleet dashboard as a correlated spike.
+#
+#   python fleet_simulator.py --serve --hosts 300 --interval 1
+#
+# --serve starts fleet_collector.py in this process; without it, point --collector at a running one.
+
+class SimulatedHost:
+    """Synthetic load of one host: a noisy baseline plus incidents pushed from outside."""
+
+    def __init__(self, index, agent_args):
+        self.name = f"sim-host-{index:04d}"
+        self.cores = random.choice((2, 4, 8, 16))
+        self.baseline = random.uniform(0.1, 0.6) * self.cores
+        self.threshold = float(self.cores)
+        self.load5 = self.baseline
+        self.incident_until = 0.0
+        self.spiking = False
+        self.agent = FleetAgent(host=self.name, cores=self.cores, **agent_args)
+
+    def sample(self, now):
+        """One detector check (and a capture event at spike onset), in spike_detector's event format."""
+        target = self.cores * random.uniform(1.5, 2.5) if now < self.incident_until else self.baseline
+        # The 5-minute average moves slowly towards the instantaneous load
+        self.load5 += (target - self.load5) * 0.1 + random.gauss(0, 0.02 * self.cores)
+        self.load5 = max(self.load5, 0.0)
+        exceeded = self.load5 >= self.threshold
+        self.agent.add({'ts': round(now, 3), 'type': "check", 'load1': round(self.load5 * 1.1, 2),
+                        'load5': round(self.load5, 2), 'load15': round(self.load5 * 0.9, 2),
+                        'threshold': self.threshold, 'decision': "capture" if exceeded else "ok"})
+        if exceeded and not self.spiking:
+            stamp = datetime.fromtimestamp(now).strftime("%Y%m%d_%H%M%S")
+            self.agent.add({'ts': round(now, 3), 'type': "capture",
+                            'archive': f"/tmp/system_diagnostics/spike_diag_{stamp}.tar.gz",
+                            'compression': "gz", 'size': random.randint(20000, 200000),
+                            'duration': round(random.uniform(0.05, 0.5), 3)})
+        self.spiking = exceeded
+
+def start_collector(port):
+    """Runs fleet_collector.py's server on a background thread."""
+    import fleet_collector
+    server = fleet_collector.create_collector(port)
+    threading.Thread(target=server.serve_forever, name="collector", daemon=True).start()
+    return server
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Simulate many spike detector hosts pushing to a fleet collector.")
+    parser.add_argument("--collector", default="http://127.0.0.1:8090", help="Collector base URL.")
+    parser.add_argument("--serve", action="store_true", help="Start a collector in this process on the URL's port.")
+    parser.add_argument("--hosts", type=int, default=50, help="Number of simulated hosts.")
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between samples per host.")
+    parser.add_argument("--push-interval", type=float, default=5.0, help="Seconds between batches per host.")
+    parser.add_argument("--duration", type=float, default=120.0, help="Seconds to run; 0 runs until Ctrl+C.")
+    parser.add_argument("--incident-every", type=float, default=60.0, help="Seconds between fleet-wide incidents.")
+    parser.add_argument("--incident-share", type=float, default=0.2, help="Share of hosts hit by an incident.")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    server = None
+    if args.serve:
+        port = int(args.collector.rsplit(':', 1)[1].split('/')[0])
+        server = start_collector(port)
+        print(f"Collector listening on port {port}; dashboard at {args.collector}/")
+
+    agent_args = {'collector_url': args.collector, 'push_interval': args.push_interval}
+    hosts = [SimulatedHost(i, agent_args) for i in range(args.hosts)]
+    # Stagger the push threads so batches do not all arrive in the same instant
+    for host in hosts:
+        host.agent.start()
+        time.sleep(args.push_interval / max(len(hosts), 1))
+
+    start = time.time()
+    next_incident = start + args.incident_every
+    next_sample = time.monotonic()
+    samples = 0
+    try:
+        while not args.duration or time.time() - start < args.duration:
+            now = time.time()
+            if now >= next_incident:
+                hit = random.sample(hosts, max(1, int(len(hosts) * args.incident_share)))
+                for host in hit:
+                    # Hosts cross their threshold at different times as their load ramps up
+                    host.incident_until = now + random.uniform(60, 90)
+                print(f"{datetime.fromtimestamp(now).strftime('%H:%M:%S')} incident on {len(hit)} hosts")
+                next_incident = now + args.incident_every
+            for host in hosts:
+                host.sample(now)
+            samples += len(hosts)
+            next_sample += args.interval
+            time.sleep(max(next_sample - time.monotonic(), 0))
+    except KeyboardInterrupt:
+        pass
+
+    for host in hosts:
+        host.agent.stop()
+    elapsed = time.time() - start
+    pushed = sum(host.agent.pushed for host in hosts)
+    failures = sum(host.agent.failures for host in hosts)
+    print(f"{samples} samples generated in {elapsed:.0f}s ({samples / elapsed:.0f}/s), "
+          f"{pushed} events delivered, {failures} failed pushes.")
+    if server is not None:
+        import fleet_collector
+        print(f"Collector ingested {fleet_collector._fleet.events_ingested} events from "
+              f"{len(fleet_collector._fleet.hosts)} hosts, "
+              f"{len(fleet_collector._fleet.correlated_spikes())} correlated spikes.")
+        server.shutdown()
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import threading
+import time
+from array import array
+from collections import deque
+from datetime import datetime
+
+from proc_collectors import ProcReader, scan_consumers, CLOCK_TICKS, PAGE_SIZE
+
+# Pre-spike flight recorder for spike_detector.py daemon mode.
+# A background thread samples per-process CPU time and RSS plus a few system counters every
+# few seconds into a fixed-size ring of compact frames (typed arrays, no per-process objects).
+# When a capture runs, the whole window is rendered into the archive, so the processes that
+# caused the spike are on record even if they exited before the capture started.
+# The latest full process scan is also kept, so a capture's top consumers ranking can use it as
+# its first scan instead of scanning twice a second apart.
+
+# System counters kept per frame, in this order
+SYSTEM_FIELDS = ("load1", "cpu_busy_ticks", "cpu_total_ticks", "mem_available_kb", "swap_free_kb",
+                 "pswpin", "pswpout")
+
+class Frame:
+    """One sample: system counters and parallel per-process arrays."""
+    __slots__ = ("ts", "system", "pids", "cpu_ticks", "rss_pages")
+
+    def __init__(self, ts, system, pids, cpu_ticks, rss_pages):
+        self.ts = ts
+        self.system = system        # array('d') in SYSTEM_FIELDS order
+        self.pids = pids            # array('i')
+        self.cpu_ticks = cpu_ticks  # array('Q'), utime + stime
+        self.rss_pages = rss_pages  # array('Q')
+
+class FlightRecorder:
+    """Rolling buffer of the last `window` seconds, sampled every `interval` seconds by a daemon thread."""
+
+    def __init__(self, interval=5.0, window=600, top=10):
+        self.interval = interval
+        self.top = top
+        self.frames = deque(maxlen=max(2, int(window / interval) + 1))
+        self.names = {} # pid -> comm, for every pid still in the buffer
+        self.last_scan = None # Latest proc_collectors.scan_consumers() result, kept for captures
+        self.lock = threading.Lock()
+        self.reader = ProcReader()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="flight-recorder", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.reader.close()
+
+    def run(self):
+        next_sample = time.monotonic()
+        while not self.stop_event.is_set():
+            try:
+                self.sample()
+            except OSError:
+                pass # A missing /proc file must not kill the recorder; try again next tick
+            next_sample += self.interval
+            if next_sample <= time.monotonic():
+                next_sample = time.monotonic() + self.interval
+            self.stop_event.wait(next_sample - time.monotonic())
+
+    # --- Sampling ---
+
+    def read_system(self):
+        system = array('d', bytes(8 * len(SYSTEM_FIELDS)))
+        system[0] = float(self.reader.read("/proc/loadavg").split()[0])
+        for line in self.reader.read("/proc/stat").splitlines():
+            if line.startswith("cpu "):
+                ticks = [int(v) for v in line.split()[1:9]]
+                total = sum(ticks)
+                system[1] = total - ticks[3] - ticks[4] # Everything but idle and iowait
+                system[2] = total
+                break
+        for line in self.reader.read("/proc/meminfo").splitlines():
+            if line.startswith("MemAvailable:"):
+                system[3] = int(line.split()[1])
+            elif line.startswith("SwapFree:"):
+                system[4] = int(line.split()[1])
+        for line in self.reader.read("/proc/vmstat").splitlines():
+            if line.startswith("pswpin "):
+                system[5] = int(line.split()[1])
+            elif line.startswith("pswpout "):
+                system[6] = int(line.split()[1])
+        return system
+
+    def sample(self):
+        """Takes one frame and appends it to the ring."""
+        system = self.read_system()
+        scan = scan_consumers()
+        pids, cpu_ticks, rss_pages = array('i'), array('Q'), array('Q')
+        names = {}
+        for pid, (comm, _, ticks, _, rss, _, _) in scan[2].items():
+            pids.append(pid)
+            cpu_ticks.append(ticks)
+            rss_pages.append(rss)
+            names[pid] = comm
+        frame = Frame(time.time(), system, pids, cpu_ticks, rss_pages)
+        with self.lock:
+            self.last_scan = scan
+            evicting = len(self.frames) == self.frames.maxlen
+            self.frames.append(frame)
+            self.names.update(names)
+            if evicting and len(self.names) > 2 * len(pids):
+                # Forget the names of processes no longer referenced by any frame
+                buffered = set()
+                for f in self.frames:
+                    buffered.update(f.pids)
+                self.names = {pid: name for pid, name in self.names.items() if pid in buffered}
+
+    def consumer_baseline(self):
+        """The full process scan of the latest frame, as the first scan of a top consumers capture (or None)."""
+        with self.lock:
+            return self.last_scan
+
+    # --- Dump ---
+
+    def dump(self):
+        """Renders the buffered window as text for the capture archive."""
+        with self.lock:
+            frames = list(self.frames)
+            names = dict(self.names)
+        if len(frames) < 2:
+            return "Flight recorder: not enough samples yet.\n"
+
+        lines = [f"Flight recorder: {len(frames)} samples every {self.interval:g}s, "
+                 f"{datetime.fromtimestamp(frames[0].ts).strftime('%H:%M:%S')} - "
+                 f"{datetime.fromtimestamp(frames[-1].ts).strftime('%H:%M:%S')}\n"]
+
+        # 1. CPU used by each process over the whole window, including processes that have exited
+        first_seen, last_seen = {}, {}
+        for frame in frames:
+            for pid, ticks in zip(frame.pids, frame.cpu_ticks):
+                first_seen.setdefault(pid, ticks)
+                last_seen[pid] = ticks
+        latest_pids = set(frames[-1].pids)
+        window = frames[-1].ts - frames[0].ts
+        totals = sorted(((last_seen[pid] - first_seen[pid], pid) for pid in last_seen), reverse=True)
+        lines.append(f"\nTop CPU consumers over the window ({window:.0f}s):\n")
+        lines.append(f"{'PID':>8} {'CPU s':>9} {'%CPU':>7}  COMMAND\n")
+        for ticks, pid in totals[:self.top]:
+            if ticks <= 0:
+                break
+            seconds = ticks / CLOCK_TICKS
+            state = "" if pid in latest_pids else "  (exited)"
+            lines.append(f"{pid:>8} {seconds:>9.2f} {100.0 * seconds / window:>7.1f}  "
+                         f"{names.get(pid, '?')}{state}\n")
+
+        # 2. Timeline: system counters and the busiest processes of every interval
+        lines.append("\nTimeline:\n")
+        for previous, frame in zip(frames, frames[1:]):
+            elapsed = max(frame.ts - previous.ts, 1e-6)
+            sys_now, sys_then = frame.system, previous.system
+            total_ticks = sys_now[2] - sys_then[2]
+            busy = 100.0 * (sys_now[1] - sys_then[1]) / total_ticks if total_ticks > 0 else 0.0
+            lines.append(f"{datetime.fromtimestamp(frame.ts).strftime('%H:%M:%S')} "
+                         f"load1={sys_now[0]:.2f} cpu={busy:.1f}% "
+                         f"mem_avail={sys_now[3] / 1024:.0f}M swap_free={sys_now[4] / 1024:.0f}M "
+                         f"swapin={(sys_now[5] - sys_then[5]) / elapsed:.0f}/s "
+                         f"swapout={(sys_now[6] - sys_then[6]) / elapsed:.0f}/s\n")
+
+            before = dict(zip(previous.pids, previous.cpu_ticks))
+            deltas = []
+            for pid, ticks, rss in zip(frame.pids, frame.cpu_ticks, frame.rss_pages):
+                delta = ticks - before.get(pid, ticks)
+                if delta > 0:
+                    deltas.append((delta, pid, rss))
+            deltas.sort(reverse=True)
+            for delta, pid, rss in deltas[:self.top]:
+                cpu = 100.0 * delta / CLOCK_TICKS / elapsed
+                lines.append(f"    {pid:>8} {cpu:>6.1f}% {rss * PAGE_SIZE / 1048576:>9.1f}M  "
+                             f"{names.get(pid, '?')}\n")
+        return "".join(lines)
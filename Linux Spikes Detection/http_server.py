@@ -1,88 +1,372 @@
 import http.server
 import socketserver
+import selectors
 import os
 import re
 import json
+import gzip
+import hashlib
+import mmap
+import sqlite3
+import tarfile
+import time
+from urllib.parse import urlsplit, parse_qs
+from email.utils import formatdate, parsedate_to_datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from load_store import LoadSeriesStore, RAW_CAPACITY
+from event_log import decode_event
+from archive_index import ArchiveIndex
+from charts import CHART_RANGES, build_chart
+from archive_browser import MemberIndexCache, iter_member
 
 # --- CONFIGURATION ---
 PORT = 8080
+# Text log of spike_detector.py, or its structured event log (EVENT_LOG_PATH, *.ndjson),
+# which is read with a plain JSON line scan instead of regexes.
 LOG_FILE_PATH = "/home/ec2-user/spike_detector.log"
 DIAGNOSTICS_DIR = "/home/ec2-user/diagnostics"
 LOAD_THRESHOLD = 2.0
+# Archive extensions written by spike_detector.py (see its ARCHIVE_COMPRESSION setting)
+ARCHIVE_EXTENSIONS = ('.tar.gz', '.tar.zst', '.tar')
 # The number of log entries to display on the dashboard
 MAX_LOG_ENTRIES = 20
+# Threads serving requests concurrently. 1 restores the original one-request-at-a-time server.
+WORKER_COUNT = 8
+# Seconds an idle keep-alive connection stays open. Idle connections wait in a selector, not on a
+# worker; one is handed to a worker only when its next request arrives.
+KEEP_ALIVE_TIMEOUT = 15
+# Idle keep-alive connections kept open at most; the longest idle are closed first
+MAX_IDLE_CONNECTIONS = 256
+# Seconds a worker waits on a client that has started sending a request, or is slow to read the response
+REQUEST_TIMEOUT = 10
+# /stream (Server-Sent Events): seconds between checks of the log for new samples
+STREAM_POLL_INTERVAL = 1.0
+# /stream: seconds between keep-alive comments when no samples arrive
+STREAM_HEARTBEAT_INTERVAL = 15
+# /stream: maximum concurrently connected event-stream clients
+MAX_STREAM_CLIENTS = 64
+# /stream: a client with more unsent bytes than this when new samples arrive is disconnected
+STREAM_CLIENT_BUFFER_BYTES = 256 * 1024
+# /api/samples: maximum samples returned by one request
+MAX_API_SAMPLES = 5000
+# Logs larger than this are not parsed from the top when the server starts: only the newest
+# TAIL_SEED_RECORDS checks are loaded (found by scanning backwards from EOF), so start-up and
+# page cost do not depend on log size. Statistics then cover those checks rather than all time.
+FULL_PARSE_MAX_BYTES = 64 * 1024 * 1024
+TAIL_SEED_RECORDS = RAW_CAPACITY
+# Appended data is read in chunks of this size, so a large backlog never sits in memory at once
+READ_CHUNK_BYTES = 4 * 1024 * 1024
+# /metrics histogram bucket upper bounds, in seconds
+CAPTURE_DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COMMAND_DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
 
 # --- DATA PROCESSING LOGIC ---
 
-def parse_log_data(log_path):
-    """Reads the log file, extracts load averages and spike events."""
-    parsed_data = []
-    spike_count = 0
-    load_averages = []
-    
-    # Regex to capture the core log data: Timestamp, 5-min Load Avg, and event
-    # Group 1: Timestamp | Group 2: Load Avg | Group 3: Event message
-    log_pattern = re.compile(
-        r"^\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\] Current 5-minute Load Average: (\d+\.\d+) \(Threshold: \d+\.\d+\)\n"
-        r".*?\n"
-        r".*?(\[.*?\] (?:Threshold exceeded|Load is within acceptable limits))"
-    , re.MULTILINE | re.DOTALL)
+# Line formats written by spike_detector.log_message()
+# Group 1: Timestamp | Group 2: 5-min Load Avg
+LOAD_LINE_PATTERN = re.compile(
+    r"^\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\] Current 5-minute Load Average: (\d+\.\d+) \(Threshold: \d+\.\d+\)")
+# Group 1: Event message that closes the check started by the last load line
+EVENT_LINE_PATTERN = re.compile(r"^\[.*?\] (Threshold exceeded|Load is within acceptable limits)")
+# Capture timings. Group 1: Diagnostic entry name | Group 2: Seconds
+COMMAND_TIMING_PATTERN = re.compile(r"^\[.*?\] Successfully captured (\w+) in (\d+\.\d+)s")
+# Group 1: Seconds for all diagnostic commands of one capture
+CAPTURE_TIMING_PATTERN = re.compile(r"^\[.*?\] Diagnostic commands finished in (\d+\.\d+)s")
+
+class Histogram:
+    """Cumulative histogram in the Prometheus layout: fixed upper bounds, a sum and a count."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, upper_bound in enumerate(self.buckets):
+            if value <= upper_bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+def find_tail_offset(log_path, count, is_record_start):
+    """
+    Byte offset of the count-th last line for which is_record_start(line) is true, found by
+    memory-mapping the log and scanning backwards from EOF, so the cost depends on count, not
+    on file size. Returns 0 if the file holds fewer records. Only complete lines are considered.
+    """
+    with open(log_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return 0
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            end = mm.rfind(b"\n") + 1 # Ignore a trailing line still being written
+            found = 0
+            while end > 0:
+                start = mm.rfind(b"\n", 0, end - 1) + 1
+                if is_record_start(mm[start:end - 1]):
+                    found += 1
+                    if found == count:
+                        return start
+                end = start
+    return 0
+
+class LogTailParser:
+    """
+    Incrementally parses the spike log. Remembers the byte offset and inode of the file,
+    so each refresh() only reads what was appended since the previous request.
+    Log rotation (new inode) or truncation (file shrank) restarts parsing from the top.
+    Parsed samples go into a bounded LoadSeriesStore rather than a list of formatted rows.
+    """
+
+    # Marks the first line of one load check, for the backwards scan in find_tail_offset()
+    RECORD_START_MARKER = b"] Current 5-minute Load Average: "
+
+    def __init__(self, log_path):
+        self.log_path = log_path
+        self.reset()
+
+    def reset(self):
+        """Forgets everything parsed so far."""
+        self.inode = None
+        self.offset = 0
+        self.partial_line = b""     # Trailing bytes of an unfinished line
+        self.pending_sample = None  # (timestamp, load) waiting for its event line
+        self.store = LoadSeriesStore(LOAD_THRESHOLD)
+        self.capture_durations = Histogram(CAPTURE_DURATION_BUCKETS)
+        self.command_durations = {}  # Diagnostic entry name -> Histogram
+
+    def refresh(self):
+        """Parses bytes appended since the last call. Raises FileNotFoundError if the log is missing."""
+        st = os.stat(self.log_path)
+        if st.st_ino != self.inode or st.st_size < self.offset:
+            self.reset()
+            self.inode = st.st_ino
+            if st.st_size > FULL_PARSE_MAX_BYTES:
+                # Start near the end instead of parsing gigabytes of history
+                self.offset = find_tail_offset(self.log_path, TAIL_SEED_RECORDS,
+                                               lambda line: self.RECORD_START_MARKER in line)
+        if st.st_size == self.offset:
+            return
+
+        with open(self.log_path, 'rb') as f:
+            f.seek(self.offset)
+            while True:
+                chunk = f.read(READ_CHUNK_BYTES)
+                if not chunk:
+                    break
+                self.offset += len(chunk)
+                lines = (self.partial_line + chunk).split(b"\n")
+                self.partial_line = lines.pop() # Either b"" or a line the detector is still writing
+                for raw_line in lines:
+                    self.parse_line(raw_line.decode('utf-8', errors='replace'))
+
+    def parse_line(self, line):
+        """Feeds one complete log line into the running state."""
+        match = LOAD_LINE_PATTERN.match(line)
+        if match:
+            self.pending_sample = (match.group(1), float(match.group(2)))
+            return
+        match = EVENT_LINE_PATTERN.match(line)
+        if match and self.pending_sample is not None:
+            timestamp_str, load_avg = self.pending_sample
+            self.pending_sample = None
+            self.store.add(parse_timestamp(timestamp_str), load_avg,
+                           captured=match.group(1) == "Threshold exceeded")
+            return
+        match = COMMAND_TIMING_PATTERN.match(line)
+        if match:
+            histogram = self.command_durations.get(match.group(1))
+            if histogram is None:
+                histogram = self.command_durations[match.group(1)] = Histogram(COMMAND_DURATION_BUCKETS)
+            histogram.observe(float(match.group(2)))
+            return
+        match = CAPTURE_TIMING_PATTERN.match(line)
+        if match:
+            self.capture_durations.observe(float(match.group(1)))
+
+    def recent_entries(self, count=MAX_LOG_ENTRIES):
+        """The newest load checks formatted for display, most recent first."""
+        entries = []
+        for sample in self.store.raw.latest(count):
+            is_spike = sample['load'] > LOAD_THRESHOLD
+            entries.append({
+                'timestamp': format_timestamp(sample['ts']),
+                'load_avg': f"{sample['load']:.2f}",
+                'status': "Threshold exceeded" if sample['flag'] else "Load is within acceptable limits",
+                'class': 'bg-red-200 text-red-800' if is_spike else 'bg-green-200 text-green-800'
+            })
+        return entries
+
+class EventLogTailParser(LogTailParser):
+    """LogTailParser for the detector's NDJSON event log; same offset/rotation handling, no regexes."""
+
+    RECORD_START_MARKER = b'"type":"check"'
+
+    def parse_line(self, line):
+        event = decode_event(line)
+        if event is None:
+            return
+        if event['type'] == 'check':
+            self.store.add(event['ts'], event['load5'], captured=event.get('decision') == 'capture')
+        elif event['type'] == 'capture':
+            self.capture_durations.observe(event.get('duration', 0.0))
+            for name, command in event.get('commands', {}).items():
+                if not command.get('status', '').startswith('OK'):
+                    continue
+                histogram = self.command_durations.get(name)
+                if histogram is None:
+                    histogram = self.command_durations[name] = Histogram(COMMAND_DURATION_BUCKETS)
+                histogram.observe(command['elapsed'])
+
+def parse_timestamp(timestamp_str):
+    """'YYYY-MM-DD HH:MM:SS' (local time, as logged) to a Unix timestamp."""
+    return datetime(int(timestamp_str[0:4]), int(timestamp_str[5:7]), int(timestamp_str[8:10]),
+                    int(timestamp_str[11:13]), int(timestamp_str[14:16]), int(timestamp_str[17:19])).timestamp()
+
+def format_timestamp(ts):
+    """Unix timestamp back to the log's 'YYYY-MM-DD HH:MM:SS' format."""
+    return datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
 
+# Kept for the lifetime of the server so every request only pays for newly appended lines
+_log_parsers = {}
+# Requests are served from several threads; only one may advance a parser at a time
+_log_parsers_lock = threading.Lock()
+
+def get_log_parser(log_path):
+    """Returns the long-lived parser for log_path. Callers must hold _log_parsers_lock."""
+    parser = _log_parsers.get(log_path)
+    if parser is None:
+        parser_class = EventLogTailParser if log_path.endswith('.ndjson') else LogTailParser
+        parser = _log_parsers[log_path] = parser_class(log_path)
+    return parser
+
+def sample_to_json(sample):
+    """A raw store sample as a JSON-friendly dict."""
+    return {
+        'ts': sample['ts'],
+        'time': format_timestamp(sample['ts']),
+        'load': round(sample['load'], 2),
+        'captured': bool(sample['flag']),
+    }
+
+def get_samples_since(log_path, since, limit=MAX_API_SAMPLES):
+    """Samples newer than the Unix timestamp `since`, oldest first, as JSON-friendly dicts."""
+    with _log_parsers_lock:
+        parser = get_log_parser(log_path)
+        parser.refresh()
+        samples = parser.store.samples_since(since, limit)
+    return [sample_to_json(sample) for sample in samples]
+
+def scan_archives(diagnostics_dir):
+    """(archive count, total bytes) of the diagnostic archives."""
+    count, total_bytes = 0, 0
+    with os.scandir(diagnostics_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith(ARCHIVE_EXTENSIONS) and entry.is_file():
+                count += 1
+                total_bytes += entry.stat().st_size
+    return count, total_bytes
+
+def archive_stats(diagnostics_dir):
+    """(archive count, total bytes) from the detector's archive index, or a directory scan if it has none."""
     try:
-        with open(log_path, 'r') as f:
-            # Read all content and reverse it to process recent events first
-            content = f.read()
-            
-            # Find all matches in the content
-            matches = log_pattern.findall(content)
-            
-            # Process in reverse order to get the most recent logs first
-            for timestamp_str, load_avg_str, event_str in reversed(matches):
-                load_avg = float(load_avg_str)
-                is_spike = load_avg > LOAD_THRESHOLD
-                
-                if is_spike:
-                    spike_count += 1
-                
-                # Clean up the event string
-                status = event_str.split('] ')[1].split('.')[0]
-                
-                parsed_data.append({
-                    'timestamp': timestamp_str,
-                    'load_avg': f"{load_avg:.2f}",
-                    'status': status,
-                    'class': 'bg-red-200 text-red-800' if is_spike else 'bg-green-200 text-green-800'
-                })
-                
-                # Keep a list of all load averages for summary display
-                load_averages.append(load_avg)
-                
-    except FileNotFoundError:
-        return {'status': 'Error: Log file not found.', 'entries': [], 'summary': {'last_load': 'N/A', 'spike_count': 0, 'avg_load': 'N/A'}}
-    except Exception as e:
-        return {'status': f'Error reading log: {e}', 'entries': [], 'summary': {'last_load': 'N/A', 'spike_count': 0, 'avg_load': 'N/A'}}
+        index = ArchiveIndex(diagnostics_dir, read_only=True)
+        try:
+            return index.stats()
+        finally:
+            index.close()
+    except sqlite3.Error:
+        pass
+    try:
+        return scan_archives(diagnostics_dir)
+    except OSError:
+        return 0, 0
+
+def list_archives(diagnostics_dir, limit=None, offset=0):
+    """Archives newest first as (name, created, size, trigger_load), from the index or a directory scan."""
+    try:
+        index = ArchiveIndex(diagnostics_dir, read_only=True)
+        try:
+            return index.list(limit, offset)
+        finally:
+            index.close()
+    except sqlite3.Error:
+        pass
+    archives = []
+    with os.scandir(diagnostics_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith(ARCHIVE_EXTENSIONS) and entry.is_file():
+                st = entry.stat()
+                archives.append((entry.name, st.st_mtime, st.st_size, None))
+    archives.sort(key=lambda archive: archive[1], reverse=True)
+    return archives[offset:None if limit is None else offset + limit]
+
+def archive_path(name):
+    """Full path of an archive in DIAGNOSTICS_DIR, or None if name is not a plain archive file name."""
+    if not name or os.path.basename(name) != name or not name.endswith(ARCHIVE_EXTENSIONS):
+        return None
+    return os.path.join(DIAGNOSTICS_DIR, name)
+
+# Member lists of recently browsed archives
+_member_indexes = MemberIndexCache()
+
+def parse_log_data(log_path):
+    """Brings the log state up to date and returns the recent entries and summary statistics."""
+    with _log_parsers_lock:
+        parser = get_log_parser(log_path)
+
+        try:
+            parser.refresh()
+        except FileNotFoundError:
+            parser.reset()
+            return {'status': 'Error: Log file not found.', 'entries': [], 'summary': {'last_load': 'N/A', 'spike_count': 0, 'avg_load': 'N/A', 'threshold': LOAD_THRESHOLD, 'last_run': 'N/A'}}
+        except Exception as e:
+            return {'status': f'Error reading log: {e}', 'entries': [], 'summary': {'last_load': 'N/A', 'spike_count': 0, 'avg_load': 'N/A', 'threshold': LOAD_THRESHOLD, 'last_run': 'N/A'}}
+
+        # Most recent logs first
+        parsed_data = parser.recent_entries()
+
+        # Summary statistics are running aggregates in the store
+        stats = parser.store.summary()
 
-    # Calculate Summary Statistics
-    if load_averages:
-        avg_load = sum(load_averages) / len(load_averages)
-        last_load = parsed_data[0]['load_avg']
-    else:
-        avg_load = 0
-        last_load = 'N/A'
+    avg_load = stats['avg_load']
+    last_load = parsed_data[0]['load_avg'] if parsed_data else 'N/A'
 
     # Count diagnostic archives
-    archive_files = [f for f in os.listdir(DIAGNOSTICS_DIR) if f.endswith('.tar.gz')]
-    
+    archive_count, _ = archive_stats(DIAGNOSTICS_DIR)
+
     summary = {
         'last_load': last_load,
-        'spike_count': len(archive_files),
+        'spike_count': archive_count,
         'avg_load': f"{avg_load:.2f}",
         'threshold': LOAD_THRESHOLD,
         'last_run': parsed_data[0]['timestamp'] if parsed_data else 'N/A'
     }
 
-    return {'status': 'OK', 'entries': parsed_data[:MAX_LOG_ENTRIES], 'summary': summary}
+    return {'status': 'OK', 'entries': parsed_data, 'summary': summary, 'stats': stats}
+
+def build_api_summary(log_path):
+    """Numeric summary for /api/summary."""
+    data = parse_log_data(log_path)
+    if data['status'] != 'OK':
+        return {'status': data['status']}
+    stats = data['stats']
+    return {
+        'status': 'OK',
+        'last_load': round(stats['last_load'], 2) if stats['last_load'] is not None else None,
+        'last_ts': stats['last_ts'],
+        'last_run': data['summary']['last_run'],
+        'avg_load': round(stats['avg_load'], 4),
+        'max_load': round(stats['max_load'], 2),
+        'sample_count': stats['count'],
+        'spike_count': stats['spike_count'],
+        'capture_count': stats['capture_count'],
+        'archive_count': data['summary']['spike_count'],
+        'threshold': LOAD_THRESHOLD,
+    }
 
 # --- HTML TEMPLATE GENERATION ---
 
@@ -90,14 +374,14 @@ def generate_html(data):
     """Generates the full HTML content using Tailwind CSS."""
     
     summary = data['summary']
-    entries_html = ""
+    rows = []
     
     # Generate HTML rows for the log entries
     for entry in data['entries']:
         # Determine the status pill color based on the class
         status_pill_class = 'bg-red-100 text-red-700' if 'red' in entry['class'] else 'bg-green-100 text-green-700'
         
-        entries_html += f"""
+        rows.append(f"""
         <tr class="bg-white border-b hover:bg-gray-50">
             <td class="px-6 py-4 font-mono text-sm text-gray-900">{entry['timestamp']}</td>
             <td class="px-6 py-4 text-center font-bold">{entry['load_avg']}</td>
@@ -107,7 +391,8 @@ def generate_html(data):
                 </span>
             </td>
         </tr>
-        """
+        """)
+    entries_html = "".join(rows)
     
     # Determine overall status indicator based on last run
     last_load_float = float(summary['last_load']) if summary['last_load'] != 'N/A' else 0
@@ -144,7 +429,7 @@ def generate_html(data):
             <!-- Metric Card: Current Load -->
             <div class="card p-5 border-l-4 border-l-orange-500">
                 <p class="text-sm font-medium text-gray-500">Last Recorded 5-min Load</p>
-                <p class="mt-1 text-3xl font-bold {main_status_class.replace('bg-', 'text-')}">{summary['last_load']}</p>
+                <p id="last-load" class="mt-1 text-3xl font-bold {main_status_class.replace('bg-', 'text-')}">{summary['last_load']}</p>
             </div>
             <!-- Metric Card: Threshold -->
             <div class="card p-5 border-l-4 border-l-blue-500">
@@ -159,10 +444,22 @@ def generate_html(data):
             <!-- Metric Card: Last Run Time -->
             <div class="card p-5 border-l-4 border-l-gray-500">
                 <p class="text-sm font-medium text-gray-500">Last Check Time</p>
-                <p class="mt-1 text-xl font-bold text-gray-600">{summary['last_run'].split(' ')[1] if summary['last_run'] != 'N/A' else 'N/A'}</p>
+                <p id="last-run" class="mt-1 text-xl font-bold text-gray-600">{summary['last_run'].split(' ')[1] if summary['last_run'] != 'N/A' else 'N/A'}</p>
             </div>
         </section>
 
+        <!-- Load History Chart -->
+        <section class="card p-6 mb-8">
+            <div class="flex items-center justify-between mb-4">
+                <h2 class="text-2xl font-semibold text-gray-800">Load History</h2>
+                <div id="chart-ranges" class="flex gap-2">
+                    {"".join(f'<button data-range="{name}" class="px-3 py-1 rounded text-sm bg-gray-100 hover:bg-gray-200">{name}</button>' for name in CHART_RANGES)}
+                </div>
+            </div>
+            <svg id="load-chart" viewBox="0 0 1000 240" preserveAspectRatio="none" class="w-full h-60 bg-gray-50 rounded"></svg>
+            <p id="chart-caption" class="mt-2 text-xs text-gray-500">Shaded band: lowest to highest 5-minute load per interval. Red line: threshold.</p>
+        </section>
+
         <!-- Log History Section -->
         <section class="card p-6">
             <h2 class="text-2xl font-semibold text-gray-800 mb-4">
@@ -177,7 +474,7 @@ def generate_html(data):
                             <th scope="col" class="py-3 px-6 text-center">Status</th>
                         </tr>
                     </thead>
-                    <tbody>
+                    <tbody id="log-rows">
                         {entries_html}
                     </tbody>
                 </table>
@@ -187,6 +484,25 @@ def generate_html(data):
             </p>
         </section>
 
+        <!-- Archive Browser -->
+        <section class="card p-6 mt-8">
+            <h2 class="text-2xl font-semibold text-gray-800 mb-4">Diagnostic Archives</h2>
+            <div class="overflow-x-auto relative rounded-lg">
+                <table class="w-full text-sm text-left text-gray-500">
+                    <thead class="text-xs text-gray-700 uppercase bg-gray-50">
+                        <tr>
+                            <th scope="col" class="py-3 px-6">Captured</th>
+                            <th scope="col" class="py-3 px-6">Archive</th>
+                            <th scope="col" class="py-3 px-6 text-right">Size</th>
+                            <th scope="col" class="py-3 px-6 text-center">Trigger Load</th>
+                        </tr>
+                    </thead>
+                    <tbody id="archive-rows"></tbody>
+                </table>
+            </div>
+            <p class="mt-4 text-xs text-gray-500">Click an archive to list its files; each file opens straight from the archive.</p>
+        </section>
+
         <!-- Instructions Section -->
         <section class="mt-8 p-6 card bg-yellow-50 border-t-4 border-yellow-300">
             <h3 class="text-lg font-bold text-yellow-800">Deployment and Access Instructions:</h3>
@@ -197,32 +513,795 @@ def generate_html(data):
             </ul>
         </section>
     </div>
+    <script>
+        // Load history chart: the server sends at most a few hundred min/max points per range
+        let chartRange = '24h';
+        let chartRefresh = null;
+        async function drawChart(range) {{
+            chartRange = range;
+            document.querySelectorAll('#chart-ranges button').forEach((button) => {{
+                button.classList.toggle('bg-blue-600', button.dataset.range === range);
+                button.classList.toggle('text-white', button.dataset.range === range);
+            }});
+            const response = await fetch('/api/chart?range=' + range);
+            if (!response.ok) return;
+            const chart = await response.json();
+            const svg = document.getElementById('load-chart');
+            const points = chart.points;
+            const top = Math.max(chart.threshold * 1.25, ...points.map((p) => p[2]), 0.1);
+            const x = (t) => (1000 * (t - chart.start) / (chart.end - chart.start)).toFixed(1);
+            const y = (v) => (240 - 230 * v / top).toFixed(1);
+            const upper = points.map((p) => `${{x(p[0])}},${{y(p[2])}}`);
+            const lower = points.slice().reverse().map((p) => `${{x(p[0])}},${{y(p[1])}}`);
+            svg.innerHTML = `
+                <polygon points="${{upper.concat(lower).join(' ')}}" fill="#bfdbfe" stroke="#2563eb" stroke-width="1"/>
+                <line x1="0" x2="1000" y1="${{y(chart.threshold)}}" y2="${{y(chart.threshold)}}" stroke="#dc2626" stroke-dasharray="6 4"/>
+                <text x="4" y="14" font-size="12" fill="#6b7280">${{top.toFixed(2)}}</text>`;
+            document.getElementById('chart-caption').textContent =
+                `${{points.length}} points over ${{range}}. Shaded band: lowest to highest 5-minute load per interval. Red line: threshold.`;
+        }}
+        document.querySelectorAll('#chart-ranges button').forEach((button) => {{
+            button.addEventListener('click', () => drawChart(button.dataset.range));
+        }});
+        drawChart(chartRange);
+
+        // Archive browser: members are listed on demand and streamed out of the archive by the server
+        async function toggleMembers(row, name) {{
+            const next = row.nextElementSibling;
+            if (next && next.dataset.members === name) {{
+                next.remove();
+                return;
+            }}
+            const response = await fetch('/api/archive?name=' + encodeURIComponent(name));
+            const result = await response.json();
+            const detail = document.createElement('tr');
+            detail.dataset.members = name;
+            const links = (result.members || []).map((member) =>
+                `<a class="text-blue-600 hover:underline mr-4" target="_blank"
+                    href="/archive/member?name=${{encodeURIComponent(name)}}&member=${{encodeURIComponent(member.name)}}"
+                 >${{member.name.split('/').pop()}}</a><span class="text-xs mr-6">(${{member.size}} B)</span>`).join('');
+            detail.innerHTML = `<td colspan="4" class="px-6 py-3 bg-gray-50">${{links || result.status}}</td>`;
+            row.after(detail);
+        }}
+        fetch('/api/archives?limit=20').then((response) => response.json()).then((result) => {{
+            const rows = document.getElementById('archive-rows');
+            for (const archive of result.archives || []) {{
+                const row = document.createElement('tr');
+                row.className = 'bg-white border-b hover:bg-gray-50 cursor-pointer';
+                const load = archive.trigger_load === null ? '-' : archive.trigger_load.toFixed(2);
+                row.innerHTML = `
+                    <td class="px-6 py-3 font-mono text-sm text-gray-900">${{archive.time}}</td>
+                    <td class="px-6 py-3 font-mono text-xs"></td>
+                    <td class="px-6 py-3 text-right">${{(archive.size / 1024).toFixed(1)}} KiB</td>
+                    <td class="px-6 py-3 text-center">${{load}}</td>`;
+                row.children[1].textContent = archive.name;
+                row.addEventListener('click', () => toggleMembers(row, archive.name));
+                rows.append(row);
+            }}
+        }});
+
+        // Live updates: new samples are pushed by /stream, so the page never needs a full reload
+        const source = new EventSource('/stream');
+        source.addEventListener('sample', (event) => {{
+            const sample = JSON.parse(event.data);
+            const spike = sample.load > {LOAD_THRESHOLD};
+            document.getElementById('last-load').textContent = sample.load.toFixed(2);
+            document.getElementById('last-run').textContent = sample.time.split(' ')[1];
+            const pill = spike ? 'bg-red-100 text-red-700' : 'bg-green-100 text-green-700';
+            const status = sample.captured ? 'Threshold exceeded' : 'Load is within acceptable limits';
+            const row = document.createElement('tr');
+            row.className = 'bg-white border-b hover:bg-gray-50';
+            row.innerHTML = `
+                <td class="px-6 py-4 font-mono text-sm text-gray-900">${{sample.time}}</td>
+                <td class="px-6 py-4 text-center font-bold">${{sample.load.toFixed(2)}}</td>
+                <td class="px-6 py-4 text-center">
+                    <span class="inline-flex items-center px-3 py-0.5 rounded-full text-xs font-medium ${{pill}}">${{status}}</span>
+                </td>`;
+            const rows = document.getElementById('log-rows');
+            rows.prepend(row);
+            while (rows.children.length > {MAX_LOG_ENTRIES}) {{
+                rows.lastElementChild.remove();
+            }}
+            // Redraw the chart at most every 10 seconds while samples stream in
+            if (chartRefresh === null) {{
+                chartRefresh = setTimeout(() => {{ chartRefresh = null; drawChart(chartRange); }}, 10000);
+            }}
+        }});
+    </script>
 </body>
 </html>
     """
     return html_content
 
+# --- RENDERED PAGE CACHE ---
+
+class RenderedPage:
+    """A rendered dashboard page with its pre-compressed body and validators."""
+
+    def __init__(self, key, html, last_modified):
+        self.key = key
+        self.body = html.encode('utf-8')
+        self.gzip_body = gzip.compress(self.body, compresslevel=6)
+        self.etag = '"' + hashlib.sha1(repr(key).encode()).hexdigest()[:20] + '"'
+        self.last_modified = int(last_modified)
+        self.last_modified_header = formatdate(self.last_modified, usegmt=True)
+
+def source_state(log_path, diagnostics_dir):
+    """
+    Cheap fingerprint of everything the page is built from: (inode, size, mtime) of the log
+    and the mtime of the diagnostics directory, which changes when archives are added or removed.
+    Returns (key, newest mtime in seconds).
+    """
+    try:
+        log_st = os.stat(log_path)
+        log_key = (log_st.st_ino, log_st.st_size, log_st.st_mtime_ns)
+        log_mtime = log_st.st_mtime
+    except OSError:
+        log_key, log_mtime = None, 0
+    try:
+        dir_st = os.stat(diagnostics_dir)
+        dir_key, dir_mtime = dir_st.st_mtime_ns, dir_st.st_mtime
+    except OSError:
+        dir_key, dir_mtime = None, 0
+    return (log_key, dir_key), max(log_mtime, dir_mtime)
+
+_page_cache = None
+_page_cache_lock = threading.Lock()
+
+def get_dashboard_page():
+    """Returns the cached page, re-rendering only when the log or the diagnostics directory changed."""
+    global _page_cache
+    key, last_modified = source_state(LOG_FILE_PATH, DIAGNOSTICS_DIR)
+    with _page_cache_lock:
+        if _page_cache is None or _page_cache.key != key:
+            html_output = generate_html(parse_log_data(LOG_FILE_PATH))
+            _page_cache = RenderedPage(key, html_output, last_modified)
+        return _page_cache
+
+# --- CHART DATA ---
+
+# Range name -> RenderedPage holding its JSON; keyed by the store and its sample count, so a
+# range is only recomputed after new samples arrived
+_chart_cache = {}
+_chart_cache_lock = threading.Lock()
+
+def get_chart(range_name):
+    """The cached chart payload of one CHART_RANGES entry, as a RenderedPage of JSON."""
+    with _log_parsers_lock:
+        parser = get_log_parser(LOG_FILE_PATH)
+        parser.refresh()
+        store = parser.store
+        key = (range_name, id(store), store.count)
+        with _chart_cache_lock:
+            cached = _chart_cache.get(range_name)
+            if cached is not None and cached.key == key:
+                return cached
+        last = store.last()
+        payload = build_chart(store, range_name, last['ts'] if last else time.time())
+    page = RenderedPage(key, json.dumps(payload), payload['end'])
+    with _chart_cache_lock:
+        _chart_cache[range_name] = page
+    return page
+
+# --- LIVE SAMPLE STREAM (Server-Sent Events) ---
+
+def format_sample_event(sample):
+    """One SSE message for a sample; the id lets browsers resume with Last-Event-ID."""
+    return f"id: {sample['ts']}\nevent: sample\ndata: {json.dumps(sample)}\n\n".encode('utf-8')
+
+class StreamClient:
+    """A detached /stream connection and the events not yet written to it."""
+    __slots__ = ("sock", "since", "pending")
+
+    def __init__(self, sock, since):
+        self.sock = sock
+        self.since = since          # Timestamp of the last sample queued for this client
+        self.pending = bytearray()  # Queued bytes the socket has not accepted yet
+
+class SampleStream:
+    """
+    Pushes new samples to every connected /stream client from a single background thread.
+    Clients are detached from the request workers, so open streams never occupy the pool.
+    Sockets are non-blocking: each client has its own buffer, flushed as the socket accepts data,
+    so a stalled client only falls behind itself and is dropped once its buffer overflows.
+    """
+
+    def __init__(self):
+        self.clients = []
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def add_client(self, sock, since):
+        """Registers a connected socket that has already received the SSE headers. False if full."""
+        with self.lock:
+            if len(self.clients) >= MAX_STREAM_CLIENTS:
+                return False
+            sock.setblocking(False)
+            self.clients.append(StreamClient(sock, since))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="sample-stream", daemon=True)
+                self.thread.start()
+        return True
+
+    def drop_client(self, client):
+        """Closes and forgets a client whose connection failed or fell too far behind."""
+        with self.lock:
+            if client in self.clients:
+                self.clients.remove(client)
+        try:
+            client.sock.close()
+        except OSError:
+            pass
+
+    def flush(self, client):
+        """Writes as much of the client's buffer as the socket takes without blocking."""
+        try:
+            while client.pending:
+                sent = client.sock.send(client.pending)
+                del client.pending[:sent]
+        except BlockingIOError:
+            pass
+        except OSError:
+            self.drop_client(client)
+
+    def wait_writable(self, clients, timeout):
+        """Until timeout, flushes clients with buffered data whenever their sockets become writable."""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            backlogged = [client for client in clients if client.pending and client in self.clients]
+            if remaining <= 0:
+                return
+            if not backlogged:
+                time.sleep(remaining)
+                return
+            with selectors.DefaultSelector() as selector:
+                for client in backlogged:
+                    selector.register(client.sock, selectors.EVENT_WRITE, client)
+                for key, _ in selector.select(remaining):
+                    self.flush(key.data)
+
+    def run(self):
+        """Polls the log once per interval and fans any new samples out to all clients."""
+        last_heartbeat = time.monotonic()
+        clients = []
+        while True:
+            self.wait_writable(clients, STREAM_POLL_INTERVAL)
+            with self.lock:
+                if not self.clients:
+                    self.thread = None # The next client starts a new thread
+                    return
+                clients = list(self.clients)
+
+            try:
+                samples = get_samples_since(LOG_FILE_PATH, min(client.since for client in clients))
+            except OSError:
+                samples = []
+            events = [(sample['ts'], format_sample_event(sample)) for sample in samples]
+
+            heartbeat = time.monotonic() - last_heartbeat >= STREAM_HEARTBEAT_INTERVAL
+            if heartbeat:
+                last_heartbeat = time.monotonic()
+
+            for client in clients:
+                payload = b"".join(event for ts, event in events if ts > client.since)
+                if not payload and heartbeat and not client.pending:
+                    payload = b": keep-alive\n\n" # Comment line; keeps proxies from closing the stream
+                if events:
+                    client.since = events[-1][0]
+                if not payload:
+                    continue
+                if len(client.pending) > STREAM_CLIENT_BUFFER_BYTES:
+                    # Still has more than a buffer of older events unsent: not reading. It can
+                    # reconnect with Last-Event-ID. (A burst alone never drops a client that keeps up.)
+                    self.drop_client(client)
+                    continue
+                client.pending += payload
+                self.flush(client)
+
+_sample_stream = SampleStream()
+
+# --- PROMETHEUS METRICS ---
+
+def format_histogram(lines, name, histogram, labels=""):
+    """Appends one histogram's bucket/sum/count samples in exposition format."""
+    separator = "," if labels else ""
+    for upper_bound, bucket_count in zip(histogram.buckets, histogram.counts):
+        lines.append(f'{name}_bucket{{{labels}{separator}le="{upper_bound}"}} {bucket_count}')
+    lines.append(f'{name}_bucket{{{labels}{separator}le="+Inf"}} {histogram.count}')
+    label_block = f"{{{labels}}}" if labels else ""
+    lines.append(f"{name}_sum{label_block} {histogram.sum:.6f}")
+    lines.append(f"{name}_count{label_block} {histogram.count}")
+
+def render_detector_metrics(log_path, diagnostics_dir):
+    """Metrics derived from the detector's log and archives (cached by get_metrics_text)."""
+    with _log_parsers_lock:
+        parser = get_log_parser(log_path)
+        try:
+            parser.refresh()
+        except OSError:
+            pass # Export whatever was parsed before the log went missing
+        stats = parser.store.summary()
+        capture_durations = parser.capture_durations
+        command_durations = sorted(parser.command_durations.items())
+        lines = []
+
+        lines.append("# HELP spike_detector_load5 5-minute load average of the detector's last check.")
+        lines.append("# TYPE spike_detector_load5 gauge")
+        if stats['last_load'] is not None:
+            lines.append(f"spike_detector_load5 {stats['last_load']:.2f}")
+        lines.append("# HELP spike_detector_last_check_timestamp_seconds Time of the detector's last check.")
+        lines.append("# TYPE spike_detector_last_check_timestamp_seconds gauge")
+        if stats['last_ts'] is not None:
+            lines.append(f"spike_detector_last_check_timestamp_seconds {stats['last_ts']:.0f}")
+        lines.append("# HELP spike_detector_threshold Load threshold that triggers a capture.")
+        lines.append("# TYPE spike_detector_threshold gauge")
+        lines.append(f"spike_detector_threshold {LOAD_THRESHOLD}")
+        lines.append("# HELP spike_detector_checks_total Load checks found in the log.")
+        lines.append("# TYPE spike_detector_checks_total counter")
+        lines.append(f"spike_detector_checks_total {stats['count']}")
+        lines.append("# HELP spike_detector_spikes_total Load checks above the threshold.")
+        lines.append("# TYPE spike_detector_spikes_total counter")
+        lines.append(f"spike_detector_spikes_total {stats['spike_count']}")
+        lines.append("# HELP spike_detector_captures_total Diagnostic captures started.")
+        lines.append("# TYPE spike_detector_captures_total counter")
+        lines.append(f"spike_detector_captures_total {stats['capture_count']}")
+
+        lines.append("# HELP spike_detector_capture_duration_seconds Time to run all diagnostic commands of a capture.")
+        lines.append("# TYPE spike_detector_capture_duration_seconds histogram")
+        format_histogram(lines, "spike_detector_capture_duration_seconds", capture_durations)
+        lines.append("# HELP spike_detector_command_duration_seconds Time to capture one diagnostic entry.")
+        lines.append("# TYPE spike_detector_command_duration_seconds histogram")
+        for command, histogram in command_durations:
+            format_histogram(lines, "spike_detector_command_duration_seconds", histogram, f'command="{command}"')
+
+    archive_count, archive_bytes = archive_stats(diagnostics_dir)
+    lines.append("# HELP spike_detector_archives Diagnostic archives on disk.")
+    lines.append("# TYPE spike_detector_archives gauge")
+    lines.append(f"spike_detector_archives {archive_count}")
+    lines.append("# HELP spike_detector_archive_bytes Total size of the diagnostic archives on disk.")
+    lines.append("# TYPE spike_detector_archive_bytes gauge")
+    lines.append(f"spike_detector_archive_bytes {archive_bytes}")
+    return "\n".join(lines) + "\n"
+
+_metrics_cache = (None, "")
+_metrics_cache_lock = threading.Lock()
+
+def get_metrics_text():
+    """
+    Full /metrics body. Detector metrics are cached on the same (log, diagnostics dir) fingerprint
+    as the dashboard page, so frequent scrapes do not touch the log unless it changed.
+    """
+    global _metrics_cache
+    key, _ = source_state(LOG_FILE_PATH, DIAGNOSTICS_DIR)
+    with _metrics_cache_lock:
+        if _metrics_cache[0] != key:
+            _metrics_cache = (key, render_detector_metrics(LOG_FILE_PATH, DIAGNOSTICS_DIR))
+        detector_metrics = _metrics_cache[1]
+
+    # The live host load is one read of /proc/loadavg; the detector only logs the 5-minute value
+    load1, load5, load15 = os.getloadavg()
+    return (
+        "# HELP spike_host_load_average Current load average of the dashboard host.\n"
+        "# TYPE spike_host_load_average gauge\n"
+        f'spike_host_load_average{{period="1m"}} {load1:.2f}\n'
+        f'spike_host_load_average{{period="5m"}} {load5:.2f}\n'
+        f'spike_host_load_average{{period="15m"}} {load15:.2f}\n'
+        + detector_metrics
+    )
+
 # --- WEB SERVER ---
 
 class DashboardHandler(http.server.SimpleHTTPRequestHandler):
     """Custom handler to serve the dynamic HTML dashboard."""
+
+    # HTTP/1.1 keeps connections open between auto-refreshes; every response sets Content-Length
+    protocol_version = "HTTP/1.1"
+    # Socket timeout while a request is read or a response written; idle waits happen in the server's selector
+    timeout = REQUEST_TIMEOUT
+    # Headers and body go out in separate writes; without TCP_NODELAY each keep-alive response waits on a delayed ACK
+    disable_nagle_algorithm = True
+
+    # Path -> handler method name
+    ROUTES = {
+        '/': 'serve_dashboard',
+        '/index.html': 'serve_dashboard',
+        '/api/summary': 'serve_api_summary',
+        '/api/samples': 'serve_api_samples',
+        '/api/chart': 'serve_api_chart',
+        '/api/archives': 'serve_api_archives',
+        '/api/archive': 'serve_api_archive',
+        '/archive/member': 'serve_archive_member',
+        '/stream': 'serve_stream',
+        '/metrics': 'serve_metrics',
+    }
+
     def do_GET(self):
-        """Handles GET requests by generating and serving the dashboard."""
+        """Dispatches GET requests to the dashboard page, the JSON API or the event stream."""
+        url = urlsplit(self.path)
+        self.query = parse_qs(url.query)
+        route = self.ROUTES.get(url.path)
+        if route is None:
+            self.send_error(404, "Not Found")
+            return
+        getattr(self, route)()
+
+    def query_float(self, name, default):
+        """A numeric query parameter, or default if absent or malformed."""
+        try:
+            return float(self.query[name][0])
+        except (KeyError, IndexError, ValueError):
+            return default
+
+    def send_json(self, payload, status=200):
+        """Sends payload as an uncached JSON response."""
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def serve_api_summary(self):
+        """GET /api/summary: current load and aggregate statistics."""
+        self.send_json(build_api_summary(LOG_FILE_PATH))
+
+    def serve_api_samples(self):
+        """GET /api/samples?since=<unix ts>&limit=<n>: samples newer than `since`, oldest first."""
+        since = self.query_float('since', 0.0)
+        limit = int(min(max(self.query_float('limit', MAX_API_SAMPLES), 1), MAX_API_SAMPLES))
+        try:
+            samples = get_samples_since(LOG_FILE_PATH, since, limit)
+        except OSError as e:
+            self.send_json({'status': f'Error reading log: {e}', 'samples': []}, status=503)
+            return
+        self.send_json({'status': 'OK', 'since': since, 'samples': samples})
+
+    def serve_api_chart(self):
+        """GET /api/chart?range=1h|24h|7d|30d: downsampled [time, min, max] points for the load chart."""
+        range_name = self.query.get('range', ['24h'])[0]
+        if range_name not in CHART_RANGES:
+            self.send_json({'status': f'Unknown range; use one of {", ".join(CHART_RANGES)}'}, status=400)
+            return
+        try:
+            page = get_chart(range_name)
+        except OSError as e:
+            self.send_json({'status': f'Error reading log: {e}'}, status=503)
+            return
+        if self.is_not_modified(page):
+            self.send_response(304)
+            self.send_page_validators(page)
+            self.end_headers()
+            return
+        use_gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+        body = page.gzip_body if use_gzip else page.body
+        self.send_response(200)
+        self.send_header("Content-type", "application/json")
+        if use_gzip:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_page_validators(page)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def serve_api_archives(self):
+        """GET /api/archives?limit=<n>&offset=<n>: archives newest first."""
+        limit = int(min(max(self.query_float('limit', 50), 1), 1000))
+        offset = int(max(self.query_float('offset', 0), 0))
+        try:
+            archives = list_archives(DIAGNOSTICS_DIR, limit, offset)
+        except OSError as e:
+            self.send_json({'status': f'Error listing archives: {e}', 'archives': []}, status=503)
+            return
+        self.send_json({'status': 'OK', 'archives': [
+            {'name': name, 'created': created, 'time': format_timestamp(created), 'size': size,
+             'trigger_load': trigger_load}
+            for name, created, size, trigger_load in archives]})
+
+    def get_archive_members(self):
+        """(archive path, member dict) for the ?name= archive, or None after sending an error."""
+        path = archive_path(self.query.get('name', [''])[0])
+        if path is None:
+            self.send_json({'status': 'Invalid archive name'}, status=400)
+            return None
+        try:
+            return path, _member_indexes.get(path)
+        except FileNotFoundError:
+            self.send_json({'status': 'Archive not found'}, status=404)
+        except (OSError, EOFError, tarfile.TarError) as e:
+            self.send_json({'status': f'Cannot read archive: {e}'}, status=500)
+        return None
+
+    def serve_api_archive(self):
+        """GET /api/archive?name=<archive>: the files inside one archive."""
+        result = self.get_archive_members()
+        if result is not None:
+            path, members = result
+            self.send_json({'status': 'OK', 'name': os.path.basename(path),
+                            'members': [member.to_json() for member in members.values()]})
+
+    def serve_archive_member(self):
+        """GET /archive/member?name=<archive>&member=<path>: one file streamed out of an archive."""
+        result = self.get_archive_members()
+        if result is None:
+            return
+        path, members = result
+        member = members.get(self.query.get('member', [''])[0])
+        if member is None:
+            self.send_json({'status': 'No such member in archive'}, status=404)
+            return
+        self.send_response(200)
+        if member.name.endswith('.txt'):
+            self.send_header("Content-type", "text/plain; charset=utf-8")
+        else:
+            self.send_header("Content-type", "application/octet-stream")
+        self.send_header("Content-Length", str(member.size))
+        self.send_header("Content-Disposition", f'inline; filename="{os.path.basename(member.name)}"')
+        # Archives never change once written
+        self.send_header("Cache-Control", "private, max-age=86400")
+        self.end_headers()
+        try:
+            for chunk in iter_member(path, member):
+                self.wfile.write(chunk)
+        except (OSError, EOFError) as e:
+            # Headers are gone already; cut the response short so the client sees it is incomplete
+            self.log_error("Streaming %s from %s failed: %s", member.name, path, e)
+            self.close_connection = True
+
+    def serve_metrics(self):
+        """GET /metrics: Prometheus text exposition format."""
+        body = get_metrics_text().encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def serve_stream(self):
+        """
+        GET /stream: Server-Sent Events, one 'sample' event per new load check.
+        Resumes after Last-Event-ID or ?since=; otherwise starts with the next new sample.
+        """
+        since = self.query_float('since', None)
+        if since is None:
+            try:
+                since = float(self.headers.get('Last-Event-ID', ''))
+            except ValueError:
+                since = None
+        try:
+            if since is None:
+                newest = get_samples_since(LOG_FILE_PATH, 0.0, limit=1)
+                since = newest[-1]['ts'] if newest else 0.0
+            backlog = get_samples_since(LOG_FILE_PATH, since)
+        except OSError:
+            backlog = []
+
+        self.send_response(200)
+        self.send_header("Content-type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(b"retry: 5000\n\n" + b"".join(format_sample_event(sample) for sample in backlog))
+        self.wfile.flush()
+        if backlog:
+            since = backlog[-1]['ts']
+
+        # No Content-Length: the stream ends when the connection closes
+        self.close_connection = True
+        self.server.detach_request(self.request)
+        if not _sample_stream.add_client(self.request, since):
+            self.server.reattach_request(self.request) # Too many streams: just close this one
+
+    def serve_dashboard(self):
+        """Serves the (cached) dashboard page."""
         
-        # 1. Process the log file
-        log_data = parse_log_data(LOG_FILE_PATH)
+        # 1. Get the rendered page; only re-parsed and re-rendered if the sources changed
+        page = get_dashboard_page()
         
-        # 2. Generate HTML
-        html_output = generate_html(log_data)
+        # 2. Answer conditional requests from auto-refreshing browsers with 304
+        if self.is_not_modified(page):
+            self.send_response(304)
+            self.send_page_validators(page)
+            self.end_headers()
+            return
         
-        # 3. Send response
+        # 3. Send response, pre-compressed when the client accepts gzip
+        use_gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+        body = page.gzip_body if use_gzip else page.body
         self.send_response(200)
-        self.send_header("Content-type", "text/html")
-        self.send_header("Content-Length", str(len(html_output.encode('utf-8'))))
+        self.send_header("Content-type", "text/html; charset=utf-8")
+        if use_gzip:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_page_validators(page)
         self.end_headers()
         
         # 4. Write the HTML content to the socket
-        self.wfile.write(html_output.encode('utf-8'))
+        self.wfile.write(body)
+
+    def send_page_validators(self, page):
+        """Headers that let browsers revalidate instead of re-downloading."""
+        self.send_header("ETag", page.etag)
+        self.send_header("Last-Modified", page.last_modified_header)
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Vary", "Accept-Encoding")
+
+    def is_not_modified(self, page):
+        """True if the request's If-None-Match / If-Modified-Since still match the page."""
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return page.etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                return parsedate_to_datetime(if_modified_since).timestamp() >= page.last_modified
+            except (TypeError, ValueError):
+                return False
+        return False
+
+class SingleThreadDashboardHandler(DashboardHandler):
+    """Handler for WORKER_COUNT = 1: closes after each response, since one idle keep-alive client would block everyone."""
+    protocol_version = "HTTP/1.0"
+
+class DetachableTCPServer(socketserver.TCPServer):
+    """
+    TCPServer whose handlers may keep their connection open after returning
+    (used to hand /stream sockets over to the SampleStream thread).
+    """
+    allow_reuse_address = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.detached_requests = set()
+        self.detached_lock = threading.Lock()
+
+    def detach_request(self, request):
+        """Marks a request so the server does not close it after the handler returns."""
+        with self.detached_lock:
+            self.detached_requests.add(request)
+
+    def reattach_request(self, request):
+        """Undoes detach_request; the server closes the connection as usual."""
+        with self.detached_lock:
+            self.detached_requests.discard(request)
+
+    def shutdown_request(self, request):
+        with self.detached_lock:
+            if request in self.detached_requests:
+                self.detached_requests.discard(request)
+                return
+        super().shutdown_request(request)
+
+class ThreadPoolHTTPServer(DetachableTCPServer):
+    """
+    TCPServer that serves requests on a fixed pool of worker threads, one request per task.
+    Between requests, keep-alive connections wait in a selector on a single thread and go back to
+    the pool only when readable, so idle browser connections never hold a worker.
+    """
+    request_queue_size = 128
+
+    def __init__(self, server_address, handler_class, workers=WORKER_COUNT):
+        super().__init__(server_address, handler_class)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dashboard")
+        self.selector = selectors.DefaultSelector()
+        self.idle = {}  # handler -> monotonic deadline, in parking order
+        self.parking = []
+        self.parking_lock = threading.Lock()
+        self.wakeup_read, self.wakeup_write = os.pipe()
+        os.set_blocking(self.wakeup_read, False)
+        self.selector.register(self.wakeup_read, selectors.EVENT_READ)
+        self.closing = False
+        self.idle_thread = threading.Thread(target=self.run_idle_loop, name="dashboard-idle", daemon=True)
+        self.idle_thread.start()
+
+    def process_request(self, request, client_address):
+        """Sets up the handler for a new connection and queues its first request."""
+        handler = self.RequestHandlerClass.__new__(self.RequestHandlerClass)
+        handler.request, handler.client_address, handler.server = request, client_address, self
+        try:
+            handler.setup()
+        except Exception:
+            self.handle_error(request, client_address)
+            self.shutdown_request(request)
+            return
+        self.pool.submit(self.serve_requests, handler)
+
+    def serve_requests(self, handler):
+        """Serves requests on one connection while they are already waiting, then parks or closes it."""
+        try:
+            while True:
+                handler.close_connection = True
+                handler.handle_one_request()
+                if handler.close_connection:
+                    break
+                if not self.has_buffered_request(handler):
+                    self.park(handler)
+                    return
+        except Exception:
+            self.handle_error(handler.request, handler.client_address)
+        self.close_connection(handler)
+
+    def has_buffered_request(self, handler):
+        """True if the next request is already readable (pipelined), without blocking."""
+        handler.request.setblocking(False)
+        try:
+            return bool(handler.rfile.peek(1)) # b"" when nothing has arrived yet (or at EOF)
+        except OSError:
+            return False
+        finally:
+            handler.request.settimeout(handler.timeout)
+
+    def close_connection(self, handler):
+        try:
+            handler.finish()
+        except OSError:
+            pass
+        self.shutdown_request(handler.request)
+
+    def park(self, handler):
+        """Hands an idle keep-alive connection to the selector thread."""
+        with self.parking_lock:
+            self.parking.append(handler)
+        self.wake()
+
+    def wake(self):
+        """Interrupts the idle loop's select()."""
+        try:
+            os.write(self.wakeup_write, b"\0")
+        except OSError:
+            pass
+
+    def run_idle_loop(self):
+        """Waits for idle connections to become readable, closing them after KEEP_ALIVE_TIMEOUT."""
+        while not self.closing:
+            timeout = None
+            if self.idle:
+                timeout = max(0.0, next(iter(self.idle.values())) - time.monotonic())
+            for key, _ in self.selector.select(timeout):
+                if key.fileobj == self.wakeup_read:
+                    try:
+                        while os.read(self.wakeup_read, 4096):
+                            pass
+                    except OSError:
+                        pass
+                    continue
+                handler = key.data
+                self.selector.unregister(handler.request)
+                del self.idle[handler]
+                self.pool.submit(self.serve_requests, handler)
+
+            with self.parking_lock:
+                parked, self.parking = self.parking, []
+            for handler in parked:
+                self.idle[handler] = time.monotonic() + KEEP_ALIVE_TIMEOUT
+                self.selector.register(handler.request, selectors.EVENT_READ, handler)
+
+            now = time.monotonic()
+            for handler, deadline in list(self.idle.items()):
+                if deadline > now and len(self.idle) <= MAX_IDLE_CONNECTIONS:
+                    break # Deadlines grow in parking order, so the rest are newer
+                self.selector.unregister(handler.request)
+                del self.idle[handler]
+                self.close_connection(handler)
+
+    def server_close(self):
+        super().server_close()
+        self.closing = True
+        self.wake()
+        self.idle_thread.join(timeout=2)
+        for handler in list(self.idle) + self.parking:
+            self.close_connection(handler)
+        self.idle.clear()
+        self.selector.close()
+        os.close(self.wakeup_read)
+        os.close(self.wakeup_write)
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+def create_server(port=PORT, workers=WORKER_COUNT):
+    """Builds the dashboard server: pooled when workers > 1, otherwise the original single-threaded one."""
+    if workers > 1:
+        return ThreadPoolHTTPServer(("", port), DashboardHandler, workers)
+    return DetachableTCPServer(("", port), SingleThreadDashboardHandler)
 
 
 # --- MAIN EXECUTION ---
@@ -247,12 +1326,13 @@ if __name__ == "__main__":
     print(f"Starting Load Spike Dashboard Server on port {PORT}...")
     print(f"Access the dashboard at: http://<Your-EC2-Public-IP>:{PORT}")
     print(f"Monitoring log file: {LOG_FILE_PATH}")
+    print(f"Serving with {WORKER_COUNT} worker thread(s).")
     print("Press Ctrl+C to stop the server.")
     print("------------------------------------------------------------------")
     
     # Start the server
     try:
-        with socketserver.TCPServer(("", PORT), DashboardHandler) as httpd:
+        with create_server(PORT, WORKER_COUNT) as httpd:
             httpd.serve_forever()
     except PermissionError:
         print(f"\nERROR: Permission denied. You might need to use 'sudo' to run on port {PORT} if it's reserved.")
@@ -0,0 +1,159 @@
+from array import array
+
+# Compact, bounded time-series storage for load samples.
+# Used by spike_detector.py (daemon mode) and http_server.py (dashboard) so memory stays
+# the same no matter how long either has been running.
+
+# Capacity of the raw sample ring. One sample per minute keeps a week.
+RAW_CAPACITY = 10080
+
+# Downsampled tiers: name -> (bucket width in seconds, number of buckets kept).
+TIERS = {
+    "1m": (60, 7 * 24 * 60),   # 7 days of per-minute buckets
+    "1h": (3600, 90 * 24),     # 90 days of hourly buckets
+    "1d": (86400, 5 * 365),    # 5 years of daily buckets
+}
+
+class RingSeries:
+    """
+    Fixed-capacity ring buffer of samples held in parallel typed arrays (one per column).
+    Appending overwrites the oldest sample once the ring is full.
+    """
+
+    def __init__(self, capacity, columns):
+        # columns: {name: array typecode}, e.g. {'ts': 'd', 'load': 'f'}
+        self.capacity = capacity
+        self.columns = {name: array(code, [0]) * capacity for name, code in columns.items()}
+        self.head = 0   # Next slot to write
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, **values):
+        """Writes one sample; every column must be given."""
+        for name, column in self.columns.items():
+            column[self.head] = values[name]
+        self.head = (self.head + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+
+    def index(self, i):
+        """Slot of the i-th sample, oldest first. Negative i counts from the newest."""
+        if i < 0:
+            i += self.size
+        return (self.head - self.size + i) % self.capacity
+
+    def get(self, i):
+        """The i-th sample as a dict, oldest first (negative indexes count from the newest)."""
+        slot = self.index(i)
+        return {name: column[slot] for name, column in self.columns.items()}
+
+    def column(self, name):
+        """A copy of one column in chronological order, as an array of the column's type."""
+        column = self.columns[name]
+        start = self.index(0)
+        if start + self.size <= self.capacity:
+            return column[start:start + self.size]
+        return column[start:] + column[:self.head]
+
+    def latest(self, n):
+        """Up to n newest samples as dicts, newest first."""
+        return [self.get(-1 - i) for i in range(min(n, self.size))]
+
+class LoadSeriesStore:
+    """
+    Load samples at full resolution plus downsampled tiers (see TIERS), with running
+    aggregates so summary statistics are O(1) regardless of history length.
+    """
+
+    def __init__(self, threshold, raw_capacity=RAW_CAPACITY, tiers=TIERS):
+        self.threshold = threshold
+        # flag: 1 when the detector captured diagnostics for this sample
+        self.raw = RingSeries(raw_capacity, {'ts': 'd', 'load': 'f', 'flag': 'b'})
+        self.tiers = {
+            name: RingSeries(capacity, {'ts': 'd', 'mean': 'f', 'max': 'f', 'count': 'I'})
+            for name, (width, capacity) in tiers.items()
+        }
+        self.tier_widths = {name: width for name, (width, capacity) in tiers.items()}
+        # Open (not yet flushed) bucket per tier: [bucket start, sum, max, count]
+        self.open_buckets = {name: None for name in tiers}
+
+        # Running aggregates over every sample ever added
+        self.count = 0
+        self.load_sum = 0.0
+        self.load_max = 0.0
+        self.spike_count = 0
+        self.capture_count = 0
+
+    def add(self, ts, load, captured=False):
+        """Records one sample. ts is a Unix timestamp; samples are expected in time order."""
+        self.raw.append(ts=ts, load=load, flag=1 if captured else 0)
+
+        self.count += 1
+        self.load_sum += load
+        if load > self.load_max:
+            self.load_max = load
+        if load > self.threshold:
+            self.spike_count += 1
+        if captured:
+            self.capture_count += 1
+
+        for name, width in self.tier_widths.items():
+            bucket_start = ts - ts % width
+            bucket = self.open_buckets[name]
+            if bucket is not None and bucket[0] != bucket_start:
+                self.flush_bucket(name)
+                bucket = None
+            if bucket is None:
+                self.open_buckets[name] = [bucket_start, load, load, 1]
+            else:
+                bucket[1] += load
+                bucket[2] = max(bucket[2], load)
+                bucket[3] += 1
+
+    def flush_bucket(self, name):
+        """Moves the open bucket of a tier into its ring."""
+        start, total, peak, count = self.open_buckets[name]
+        self.tiers[name].append(ts=start, mean=total / count, max=peak, count=count)
+        self.open_buckets[name] = None
+
+    def tier_points(self, name):
+        """(timestamps, means, maxes) of a tier in time order, including the open bucket."""
+        ring = self.tiers[name]
+        ts, means, maxes = ring.column('ts'), ring.column('mean'), ring.column('max')
+        bucket = self.open_buckets[name]
+        if bucket is not None:
+            ts.append(bucket[0])
+            means.append(bucket[1] / bucket[3])
+            maxes.append(bucket[2])
+        return ts, means, maxes
+
+    def samples_since(self, since, limit=None):
+        """Raw samples with ts > since, oldest first. With limit, only the newest `limit` of them."""
+        samples = []
+        for i in range(len(self.raw)):
+            sample = self.raw.get(-1 - i)
+            if sample['ts'] <= since or (limit is not None and len(samples) >= limit):
+                break
+            samples.append(sample)
+        samples.reverse()
+        return samples
+
+    def last(self):
+        """Newest raw sample as a dict, or None when empty."""
+        return self.raw.get(-1) if len(self.raw) else None
+
+    def summary(self):
+        """O(1) statistics over all samples seen."""
+        last = self.last()
+        return {
+            'count': self.count,
+            'avg_load': self.load_sum / self.count if self.count else 0.0,
+            'max_load': self.load_max,
+            'last_load': last['load'] if last else None,
+            'last_ts': last['ts'] if last else None,
+            'spike_count': self.spike_count,
+            'capture_count': self.capture_count,
+            'threshold': self.threshold,
+        }
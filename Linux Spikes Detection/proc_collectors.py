@@ -0,0 +1,428 @@
+import os
+import socket
+import struct
+import time
+from datetime import datetime
+
+# In-process replacements for the shell commands in spike_detector.DIAGNOSTIC_COMMANDS.
+# Everything here reads /proc and statvfs directly, so a capture costs no fork/exec
+# on a machine that is already overloaded. Linux only.
+
+# Clock ticks per second, used to convert /proc/[pid]/stat CPU times to seconds.
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+# Number of processes listed in the top snapshot.
+TOP_PROCESS_LIMIT = 40
+
+# Top consumer attribution: seconds between the two /proc scans, and rows per ranked table.
+TOP_CONSUMER_INTERVAL = 1.0
+TOP_CONSUMER_LIMIT = 15
+# A first scan handed in by the daemon (the flight recorder's latest) is only used up to this age.
+TOP_CONSUMER_MAX_BASELINE_AGE = 30.0
+
+# TCP states from include/net/tcp_states.h, as shown by netstat.
+TCP_STATES = {
+    "01": "ESTABLISHED", "02": "SYN_SENT", "03": "SYN_RECV", "04": "FIN_WAIT1",
+    "05": "FIN_WAIT2", "06": "TIME_WAIT", "07": "CLOSE", "08": "CLOSE_WAIT",
+    "09": "LAST_ACK", "0A": "LISTEN", "0B": "CLOSING",
+}
+
+# Pseudo filesystems skipped by the disk usage collector, like df does by default.
+PSEUDO_FILESYSTEMS = {
+    "proc", "sysfs", "devpts", "cgroup", "cgroup2", "securityfs", "debugfs", "tracefs",
+    "pstore", "bpf", "mqueue", "hugetlbfs", "configfs", "fusectl", "autofs", "binfmt_misc",
+    "rpc_pipefs", "nsfs", "efivarfs", "selinuxfs",
+}
+
+# --- /proc Readers ---
+
+def read_file(path):
+    """Reads a small /proc file in one syscall-friendly call."""
+    with open(path, 'r') as f:
+        return f.read()
+
+class ProcReader:
+    """
+    Re-reads /proc files through descriptors that stay open, using pread at offset 0.
+    For samplers that read the same files many times a second, this saves an open/close per read.
+    """
+
+    def __init__(self):
+        self.fds = {}
+
+    def read(self, path):
+        """Current contents of path as text. Raises OSError if it cannot be opened."""
+        fd = self.fds.get(path)
+        if fd is None:
+            fd = self.fds[path] = os.open(path, os.O_RDONLY)
+        chunks = []
+        offset = 0
+        while True:
+            chunk = os.pread(fd, 65536, offset)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            offset += len(chunk)
+        return b"".join(chunks).decode('utf-8', errors='replace')
+
+    def forget(self, path):
+        """Closes the descriptor of a file that went away (e.g. an exited process)."""
+        fd = self.fds.pop(path, None)
+        if fd is not None:
+            os.close(fd)
+
+    def close(self):
+        for fd in self.fds.values():
+            os.close(fd)
+        self.fds.clear()
+
+def read_pid_stat(pid):
+    """
+    Parses /proc/[pid]/stat. Returns (comm, state, ppid, utime, stime, num_threads, rss_pages)
+    or None if the process exited while we were looking at it.
+    """
+    try:
+        data = read_file(f"/proc/{pid}/stat")
+    except (FileNotFoundError, ProcessLookupError, PermissionError):
+        return None
+    # comm may contain spaces and parentheses, so split around the last ')'
+    open_paren = data.index('(')
+    close_paren = data.rindex(')')
+    comm = data[open_paren + 1:close_paren]
+    fields = data[close_paren + 2:].split()
+    # fields[0] is field 3 (state) in proc(5) numbering
+    return (comm, fields[0], int(fields[1]), int(fields[11]), int(fields[12]),
+            int(fields[17]), int(fields[21]))
+
+def list_pids():
+    """Returns the numeric entries of /proc."""
+    return [int(name) for name in os.listdir("/proc") if name.isdigit()]
+
+def read_meminfo():
+    """Parses /proc/meminfo into {key: value in kB}."""
+    meminfo = {}
+    for line in read_file("/proc/meminfo").splitlines():
+        key, _, rest = line.partition(':')
+        parts = rest.split()
+        if parts:
+            meminfo[key] = int(parts[0])
+    return meminfo
+
+def read_cpu_times():
+    """Returns the aggregate 'cpu' line of /proc/stat as a list of tick counters."""
+    with open("/proc/stat", 'r') as f:
+        for line in f:
+            if line.startswith("cpu "):
+                return [int(v) for v in line.split()[1:]]
+    return []
+
+def read_pid_counters(pid):
+    """
+    Cumulative counters of one process. Returns (comm, start_time, cpu_ticks, major_faults, rss_pages,
+    read_bytes, write_bytes) or None if the process is gone. The I/O byte counts are None when
+    /proc/[pid]/io is not readable. Files are opened and closed per call, so a scan of every
+    process never holds more than one descriptor.
+    """
+    try:
+        data = read_file(f"/proc/{pid}/stat")
+    except OSError:
+        return None
+    if not data:
+        return None
+    close_paren = data.rindex(')')
+    fields = data[close_paren + 2:].split()
+    read_bytes = write_bytes = None
+    try:
+        for line in read_file(f"/proc/{pid}/io").splitlines():
+            key, _, value = line.partition(': ')
+            if key == "read_bytes":
+                read_bytes = int(value)
+            elif key == "write_bytes":
+                write_bytes = int(value)
+    except OSError:
+        pass # Usually EACCES for other users' processes when not running as root
+    return (data[data.index('(') + 1:close_paren], int(fields[19]), int(fields[11]) + int(fields[12]),
+            int(fields[9]), max(int(fields[21]), 0), read_bytes, write_bytes)
+
+def read_pid_cgroup(pid):
+    """The cgroup of a process: the v2 path, or the cpu controller's path on v1. None if it exited."""
+    try:
+        text = read_file(f"/proc/{pid}/cgroup")
+    except OSError:
+        return None
+    paths = {}
+    for line in text.splitlines():
+        _, controllers, path = line.split(':', 2)
+        for controller in controllers.split(','):
+            paths[controller] = path
+    return paths.get('cpu') or paths.get('cpuacct') or paths.get('') or '/'
+
+def format_size(num_bytes):
+    """Formats a byte count the way df -h does (1K = 1024)."""
+    for unit in ("B", "K", "M", "G", "T"):
+        if abs(num_bytes) < 1024 or unit == "T":
+            return f"{num_bytes:.0f}{unit}" if unit == "B" else f"{num_bytes:.1f}{unit}"
+        num_bytes /= 1024.0
+
+# --- Collectors (one per DIAGNOSTIC_COMMANDS entry) ---
+
+def collect_top_snapshot():
+    """Load, CPU, memory and a per-process table, similar to `top -b -n 1`."""
+    lines = []
+    load1, load5, load15, running, last_pid = read_file("/proc/loadavg").split()
+    uptime = float(read_file("/proc/uptime").split()[0])
+    lines.append(f"top - {datetime.now().strftime('%H:%M:%S')} up {uptime / 86400:.2f} days, "
+                 f"load average: {load1}, {load5}, {load15}")
+    lines.append(f"Tasks: {running} running/total, last pid {last_pid}")
+
+    cpu = read_cpu_times()
+    total = sum(cpu) or 1
+    labels = ("us", "ni", "sy", "id", "wa", "hi", "si", "st")
+    lines.append("%Cpu(s) since boot: " + ", ".join(
+        f"{100.0 * value / total:.1f} {label}" for label, value in zip(labels, cpu)))
+
+    mem = read_meminfo()
+    lines.append(f"KiB Mem : {mem.get('MemTotal', 0)} total, {mem.get('MemFree', 0)} free, "
+                 f"{mem.get('MemAvailable', 0)} avail, {mem.get('Buffers', 0) + mem.get('Cached', 0)} buff/cache")
+    lines.append(f"KiB Swap: {mem.get('SwapTotal', 0)} total, {mem.get('SwapFree', 0)} free")
+    lines.append("")
+
+    processes = []
+    for pid in list_pids():
+        stat = read_pid_stat(pid)
+        if stat is None:
+            continue
+        comm, state, ppid, utime, stime, threads, rss_pages = stat
+        processes.append((utime + stime, pid, comm, state, threads, rss_pages))
+
+    # Sort by accumulated CPU time; a single read cannot give an instantaneous percentage
+    processes.sort(reverse=True)
+    lines.append(f"{'PID':>8} {'S':>1} {'THR':>4} {'RES(KiB)':>10} {'TIME(s)':>10}  COMMAND")
+    for cpu_ticks, pid, comm, state, threads, rss_pages in processes[:TOP_PROCESS_LIMIT]:
+        lines.append(f"{pid:>8} {state:>1} {threads:>4} {rss_pages * PAGE_SIZE // 1024:>10} "
+                     f"{cpu_ticks / CLOCK_TICKS:>10.2f}  {comm}")
+    return "\n".join(lines) + "\n"
+
+def scan_consumers():
+    """
+    One /proc scan for collect_top_consumers: (monotonic time, aggregate CPU ticks, {pid: counters
+    from read_pid_counters}). Only the numbers are kept; the start time tells a reused pid from the original.
+    """
+    cpu_times = read_cpu_times()
+    processes = {}
+    for pid in list_pids():
+        counters = read_pid_counters(pid)
+        if counters is not None:
+            processes[pid] = counters
+    return time.monotonic(), cpu_times, processes
+
+def collect_top_consumers(interval=None, baseline=None):
+    """
+    Ranks processes and cgroups by what they used between two /proc scans at least `interval` seconds
+    apart: CPU, disk I/O, major faults and RSS growth. Unlike a single `top` snapshot these are exact
+    deltas. `baseline` is an earlier scan_consumers() result to use as the first scan, e.g. the one the
+    daemon's flight recorder took last; it is usually older than `interval`, so there is no wait at all.
+    """
+    interval = TOP_CONSUMER_INTERVAL if interval is None else interval
+    if baseline is None or time.monotonic() - baseline[0] > TOP_CONSUMER_MAX_BASELINE_AGE:
+        baseline = scan_consumers()
+    start, cpu_before, before = baseline
+    time.sleep(max(0.0, interval - (time.monotonic() - start)))
+
+    # Second scan: only processes seen in the first one
+    elapsed = time.monotonic() - start
+    cpu_after = read_cpu_times()
+    rows = []
+    for pid, (comm, start_time, ticks, faults, rss, read_bytes, write_bytes) in before.items():
+        counters = read_pid_counters(pid)
+        if counters is None or counters[1] != start_time: # Exited, or the pid was reused
+            continue
+        io_known = read_bytes is not None and counters[5] is not None
+        rows.append({
+            'pid': pid, 'comm': counters[0],
+            'cpu': 100.0 * (counters[2] - ticks) / CLOCK_TICKS / elapsed,
+            'read': (counters[5] - read_bytes) / elapsed if io_known else None,
+            'write': (counters[6] - write_bytes) / elapsed if io_known else None,
+            'faults': counters[3] - faults,
+            'rss': counters[4] * PAGE_SIZE,
+            'rss_delta': (counters[4] - rss) * PAGE_SIZE,
+        })
+
+    def activity(row):
+        return (row['cpu'], (row['read'] or 0) + (row['write'] or 0), row['faults'], row['rss_delta'])
+
+    rows.sort(key=activity, reverse=True)
+    # Only active processes need their cgroup looked up
+    active = [row for row in rows if any(activity(row))]
+    for row in active:
+        row['cgroup'] = read_pid_cgroup(row['pid']) or '?'
+
+    total_ticks = sum(cpu_after) - sum(cpu_before)
+    idle_ticks = sum(cpu_after[3:5]) - sum(cpu_before[3:5])
+    system_cpu = 100.0 * (total_ticks - idle_ticks) / total_ticks if total_ticks > 0 else 0.0
+
+    def rate(value):
+        return "-" if value is None else format_size(value) + "/s"
+
+    lines = [f"Top consumers over {elapsed:.2f}s ({len(before)} processes scanned, "
+             f"system CPU {system_cpu:.1f}%; process %CPU is per core)", ""]
+    lines.append(f"{'PID':>8} {'%CPU':>7} {'READ':>9} {'WRITE':>9} {'MAJFLT':>7} {'RES':>8} {'dRES':>8}  "
+                 f"COMMAND / CGROUP")
+    for row in active[:TOP_CONSUMER_LIMIT]:
+        rss_delta = ("+" if row['rss_delta'] >= 0 else "-") + format_size(abs(row['rss_delta']))
+        lines.append(f"{row['pid']:>8} {row['cpu']:>7.1f} {rate(row['read']):>9} {rate(row['write']):>9} "
+                     f"{row['faults']:>7} {format_size(row['rss']):>8} {rss_delta:>8}  "
+                     f"{row['comm']} {row['cgroup']}")
+
+    cgroups = {}
+    for row in active:
+        group = cgroups.setdefault(row['cgroup'], {'cpu': 0.0, 'io': 0.0, 'faults': 0, 'rss_delta': 0, 'count': 0})
+        group['cpu'] += row['cpu']
+        group['io'] += (row['read'] or 0) + (row['write'] or 0)
+        group['faults'] += row['faults']
+        group['rss_delta'] += row['rss_delta']
+        group['count'] += 1
+    lines.append("")
+    lines.append(f"{'%CPU':>8} {'IO':>9} {'MAJFLT':>7} {'dRES':>8} {'PROCS':>6}  CGROUP")
+    for path, group in sorted(cgroups.items(), key=lambda item: (item[1]['cpu'], item[1]['io']),
+                              reverse=True)[:TOP_CONSUMER_LIMIT]:
+        rss_delta = ("+" if group['rss_delta'] >= 0 else "-") + format_size(abs(group['rss_delta']))
+        lines.append(f"{group['cpu']:>8.1f} {rate(group['io']):>9} {group['faults']:>7} {rss_delta:>8} "
+                     f"{group['count']:>6}  {path}")
+    return "\n".join(lines) + "\n"
+
+def collect_vmstat_snapshot():
+    """Memory and CPU counters in the `vmstat -s` layout."""
+    mem = read_meminfo()
+    used = mem.get('MemTotal', 0) - mem.get('MemFree', 0) - mem.get('Buffers', 0) - mem.get('Cached', 0)
+    rows = [
+        (mem.get('MemTotal', 0), "K total memory"),
+        (used, "K used memory"),
+        (mem.get('Active', 0), "K active memory"),
+        (mem.get('Inactive', 0), "K inactive memory"),
+        (mem.get('MemFree', 0), "K free memory"),
+        (mem.get('Buffers', 0), "K buffer memory"),
+        (mem.get('Cached', 0), "K swap cache"),
+        (mem.get('SwapTotal', 0), "K total swap"),
+        (mem.get('SwapTotal', 0) - mem.get('SwapFree', 0), "K used swap"),
+        (mem.get('SwapFree', 0), "K free swap"),
+    ]
+
+    cpu = read_cpu_times()
+    cpu_labels = ("non-nice user cpu ticks", "nice user cpu ticks", "system cpu ticks",
+                  "idle cpu ticks", "IO-wait cpu ticks", "IRQ cpu ticks", "softirq cpu ticks",
+                  "stolen cpu ticks")
+    rows.extend(zip(cpu, cpu_labels))
+
+    vmstat = {}
+    for line in read_file("/proc/vmstat").splitlines():
+        key, _, value = line.partition(' ')
+        vmstat[key] = int(value)
+    rows.extend([
+        (vmstat.get('pgpgin', 0), "pages paged in"),
+        (vmstat.get('pgpgout', 0), "pages paged out"),
+        (vmstat.get('pswpin', 0), "pages swapped in"),
+        (vmstat.get('pswpout', 0), "pages swapped out"),
+    ])
+
+    with open("/proc/stat", 'r') as f:
+        for line in f:
+            key, _, value = line.partition(' ')
+            if key == "intr":
+                rows.append((int(value.split()[0]), "interrupts"))
+            elif key == "ctxt":
+                rows.append((int(value), "CPU context switches"))
+            elif key == "btime":
+                rows.append((int(value), "boot time"))
+            elif key == "processes":
+                rows.append((int(value), "forks"))
+
+    return "".join(f"{value:>13} {label}\n" for value, label in rows)
+
+def decode_address(hex_address):
+    """Converts a /proc/net/tcp 'ADDR:PORT' hex pair into a printable 'ip:port'."""
+    address, port = hex_address.split(':')
+    raw = bytes.fromhex(address)
+    if len(raw) == 4:
+        ip = socket.inet_ntop(socket.AF_INET, raw[::-1])
+    else:
+        # IPv6 is stored as four little-endian 32-bit words
+        ip = socket.inet_ntop(socket.AF_INET6, b"".join(
+            struct.pack(">I", word) for word in struct.unpack("<4I", raw)))
+    return f"{ip}:{int(port, 16)}"
+
+def map_socket_inodes():
+    """Maps socket inode -> 'pid/comm' by scanning /proc/[pid]/fd, like netstat -p."""
+    owners = {}
+    for pid in list_pids():
+        fd_dir = f"/proc/{pid}/fd"
+        try:
+            fds = os.listdir(fd_dir)
+        except OSError:
+            continue
+        comm = None
+        for fd in fds:
+            try:
+                target = os.readlink(os.path.join(fd_dir, fd))
+            except OSError:
+                continue
+            if target.startswith("socket:["):
+                if comm is None:
+                    stat = read_pid_stat(pid)
+                    comm = stat[0] if stat else "?"
+                owners[target[8:-1]] = f"{pid}/{comm}"
+    return owners
+
+def collect_netstat_connections():
+    """Listening TCP and all UDP sockets with owning process, like `netstat -tulnp`."""
+    owners = map_socket_inodes()
+    lines = [f"{'Proto':<6} {'Local Address':<45} {'Foreign Address':<45} {'State':<12} PID/Program name"]
+    for proto in ("tcp", "tcp6", "udp", "udp6"):
+        try:
+            table = read_file(f"/proc/net/{proto}").splitlines()[1:]
+        except OSError:
+            continue
+        for row in table:
+            fields = row.split()
+            state = fields[3]
+            if proto.startswith("tcp") and state != "0A":
+                continue # -l: listening TCP sockets only
+            lines.append(f"{proto:<6} {decode_address(fields[1]):<45} {decode_address(fields[2]):<45} "
+                         f"{TCP_STATES.get(state, '') if proto.startswith('tcp') else '':<12} "
+                         f"{owners.get(fields[9], '-')}")
+    return "\n".join(lines) + "\n"
+
+def collect_disk_usage():
+    """Per-mount usage from /proc/mounts and statvfs, like `df -h`."""
+    lines = [f"{'Filesystem':<30} {'Size':>7} {'Used':>7} {'Avail':>7} {'Use%':>5} Mounted on"]
+    seen = set()
+    for line in read_file("/proc/mounts").splitlines():
+        device, mount_point, fs_type = line.split()[:3]
+        if fs_type in PSEUDO_FILESYSTEMS or mount_point in seen:
+            continue
+        seen.add(mount_point)
+        # /proc/mounts escapes spaces as \040
+        mount_point = mount_point.replace("\\040", " ")
+        try:
+            st = os.statvfs(mount_point)
+        except OSError:
+            continue
+        if st.f_blocks == 0:
+            continue
+        size = st.f_blocks * st.f_frsize
+        avail = st.f_bavail * st.f_frsize
+        used = (st.f_blocks - st.f_bfree) * st.f_frsize
+        use_pct = 100.0 * used / (used + avail) if used + avail else 0.0
+        lines.append(f"{device:<30} {format_size(size):>7} {format_size(used):>7} "
+                     f"{format_size(avail):>7} {use_pct:>4.0f}% {mount_point}")
+    return "\n".join(lines) + "\n"
+
+# Native collector for each DIAGNOSTIC_COMMANDS key, with the /proc sources it reads for the output header.
+NATIVE_COLLECTORS = {
+    "top_snapshot": (collect_top_snapshot, "/proc/loadavg /proc/stat /proc/meminfo /proc/[pid]/stat"),
+    "top_consumers": (collect_top_consumers, "/proc/[pid]/stat /proc/[pid]/io /proc/[pid]/cgroup, two scans"),
+    "vmstat_snapshot": (collect_vmstat_snapshot, "/proc/meminfo /proc/stat /proc/vmstat"),
+    "netstat_connections": (collect_netstat_connections, "/proc/net/tcp* /proc/net/udp* /proc/[pid]/fd"),
+    "disk_usage": (collect_disk_usage, "/proc/mounts statvfs"),
+}
@@ -1,9 +1,29 @@
 import psutil
 import subprocess
 import os
+import sys
 import time
+import signal
+import argparse
 import tarfile
+import threading
+import io
+import socket
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
 from datetime import datetime, timedelta
+from proc_collectors import NATIVE_COLLECTORS
+from load_store import LoadSeriesStore
+from archive_index import ArchiveIndex
+from adaptive_detector import AdaptiveDetector, load_detector_state, save_detector_state
+from triggers import TriggerEngine, build_rules, load_engine_state, save_engine_state
+from flight_recorder import FlightRecorder
+from fleet_agent import FleetAgent
+from event_log import EventLogWriter, EVENT_LOG_MAX_BYTES, EVENT_LOG_BACKUPS
+
+try:
+    import zstandard # Optional: only needed for ARCHIVE_COMPRESSION = "zst"
+except ImportError:
+    zstandard = None
 
 # --- Configuration Variables ---
 # Define the threshold for the 5-minute load average.
@@ -14,117 +34,565 @@ LOAD_THRESHOLD = 2.0
 # Directory to store the diagnostic archives. MUST exist on the target system.
 DIAGNOSTICS_DIR = "/tmp/system_diagnostics" # Use /var/log/diagnostics in a real setup (requires root)
 
+# How a spike is detected:
+#   "threshold" - 5-minute load >= LOAD_THRESHOLD (captures on every sample above it).
+#   "adaptive"  - per-core load is a statistical outlier against its own moving baseline
+#                 (see adaptive_detector.py); captures once per spike, at most every CAPTURE_COOLDOWN.
+#   "triggers"  - any of TRIGGER_RULES fires (see triggers.py for the available signals);
+#                 each rule captures once per episode, at most every CAPTURE_COOLDOWN.
+DETECTION_MODE = "threshold"
+
+# Adaptive mode tuning. Loads are divided by os.cpu_count(), so these work on any core count.
+ADAPTIVE_ALPHA = 0.05              # Weight of each new sample in the moving baseline
+ADAPTIVE_Z_ENTER = 3.0             # Standard deviations above the baseline that start a spike
+ADAPTIVE_Z_EXIT = 1.5              # ...and below which it is over (hysteresis)
+ADAPTIVE_MIN_LOAD_PER_CORE = 0.5   # Never flag a spike below this per-core load
+ADAPTIVE_WARMUP_SAMPLES = 30       # Samples before the baseline is trusted
+CAPTURE_COOLDOWN = 900             # Minimum seconds between two adaptive/trigger captures
+
+# Trigger mode rules: (name, "all" or "any", [(signal, operator, limit), ...], consecutive samples).
+# A rule fires when its conditions hold for that many samples in a row (cron runs count too: rule
+# state is kept in trigger_state.json). Conditions on signals the kernel does not provide are never true.
+TRIGGER_RULES = [
+    ("cpu_saturation", "all", [("psi_cpu_some_avg10", ">=", 40.0), ("cpu_busy_pct", ">=", 90.0)], 2),
+    ("memory_thrashing", "any", [("psi_memory_full_avg10", ">=", 10.0),
+                                 ("swapin_pages_per_sec", ">=", 1000)], 1),
+    ("io_stall", "all", [("psi_io_full_avg10", ">=", 20.0), ("disk_queue_depth", ">=", 8)], 2),
+    ("load_threshold", "all", [("load5", ">=", LOAD_THRESHOLD)], 1),
+]
+# Rate signals (CPU utilisation, swap-in, PSI rates) need two reads. A cron run takes the first from
+# the counters saved by the previous run (rates then cover the whole cron interval); only without
+# recent saved counters does it take a priming read and wait this long.
+TRIGGER_PRIME_INTERVAL = 1.0
+# Saved rule streaks only continue if the previous sample is at most this many seconds old
+# (a little over the cron interval); the cooldown always carries over.
+TRIGGER_STATE_MAX_GAP = 150
+
 # Retention policy: remove archives older than this many days.
 RETENTION_DAYS = 7
 
+# Further retention limits; the oldest archives are removed first. None disables a limit.
+RETENTION_MAX_BYTES = 1024 * 1024 * 1024 # Total size of all archives
+RETENTION_MAX_FILES = 1000 # Number of archives
+
+# Partial archives (*.part) untouched for this many seconds are left over from a crashed capture and removed
+PARTIAL_ARCHIVE_MAX_AGE = 3600
+
+# Seconds between scans of the diagnostics directory that pick up archives deleted or copied in
+# by hand and remove stale partial archives. Captures update the archive index themselves, so
+# cleanups in between only query the index. In daemon mode SIGHUP also triggers a scan.
+ARCHIVE_RECONCILE_INTERVAL = 6 * 3600
+
+# Daemon mode (--daemon): seconds between load samples. Fractions are allowed for sub-second sampling.
+SAMPLE_INTERVAL = 60.0
+
+# Daemon mode: seconds between archive cleanups. Cron mode cleans up on every run.
+CLEANUP_INTERVAL = 3600
+
+# Daemon mode flight recorder (flight_recorder.py): per-process CPU/RSS and system counters are
+# sampled every FLIGHT_RECORDER_INTERVAL seconds, the last FLIGHT_RECORDER_WINDOW seconds are kept
+# in memory and written into every archive as flight_recorder.txt. Set the interval to 0 to disable.
+FLIGHT_RECORDER_INTERVAL = 5.0
+FLIGHT_RECORDER_WINDOW = 600
+FLIGHT_RECORDER_TOP = 10 # Processes listed per interval and for the whole window
+
+# Fleet mode: push every event (load checks, captures, cleanups) to a central collector
+# (fleet_collector.py), e.g. "http://collector.internal:8090". None disables it.
+FLEET_COLLECTOR_URL = None
+FLEET_HOST_NAME = socket.gethostname() # How this host appears on the fleet dashboard
+FLEET_PUSH_INTERVAL = 10 # Daemon mode: seconds between batches. Cron mode pushes once per run.
+FLEET_TOKEN = None # Must match FLEET_TOKEN of the collector if it sets one
+
 # List of critical Linux commands to execute during a spike.
 # The output will be saved to separate files inside the archive.
 DIAGNOSTIC_COMMANDS = {
     "top_snapshot": "top -b -n 1", # Non-interactive, single snapshot of processes
+    "top_consumers": "top -b -n 2 -d 1", # Second iteration shows CPU usage over one second
     "vmstat_snapshot": "vmstat -s", # Memory statistics
     "netstat_connections": "netstat -tulnp", # Network listening ports and PIDs
     "disk_usage": "df -h", # Disk space usage
 }
 
+# How each DIAGNOSTIC_COMMANDS entry is captured:
+#   "native" - read /proc and statvfs in-process (proc_collectors.py), no fork/exec.
+#              Falls back to the shell command if a native collector fails.
+#   "shell"  - always run the shell commands above.
+COLLECTOR_MODE = "native"
+
+# Diagnostic commands run concurrently so every snapshot describes the same moment.
+# Upper bound on commands running at once during a capture.
+MAX_CAPTURE_WORKERS = 4
+
+# Overall time budget in seconds for all diagnostic commands of one capture.
+CAPTURE_DEADLINE = 10
+
+# Archive compression: "gz" (.tar.gz), "zst" (.tar.zst, needs the zstandard package) or "none" (.tar).
+# Output is streamed into the archive from memory, so the archive is the only thing written to disk.
+ARCHIVE_COMPRESSION = "gz"
+
+# Compression level for "gz" (1-9) and "zst" (1-22). Lower is faster; captures happen under load.
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+# File extension of the archive for each ARCHIVE_COMPRESSION value.
+ARCHIVE_EXTENSIONS = {"gz": ".tar.gz", "zst": ".tar.zst", "none": ".tar"}
+
+# Structured NDJSON event stream (see event_log.py), written alongside the text log.
+# Keep it outside DIAGNOSTICS_DIR so archive cleanup does not delete rotated files. None disables it.
+EVENT_LOG_PATH = "/tmp/spike_detector_events.ndjson"
+
 # --- Utility Functions ---
 
 def log_message(message):
     """Prints a timestamped message to the console for cron logging."""
     print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {message}")
 
-def check_load_threshold():
+_event_log = None
+_archive_index = None
+_adaptive_detector = None
+_trigger_engine = None
+_flight_recorder = None
+_fleet_agent = None
+
+def adaptive_state_path():
+    """Where the adaptive baseline is kept between cron runs."""
+    return os.path.join(DIAGNOSTICS_DIR, "adaptive_state.json")
+
+def get_adaptive_detector():
+    """The adaptive detector of this process, restored from its state file on first use."""
+    global _adaptive_detector
+    if _adaptive_detector is None:
+        _adaptive_detector = AdaptiveDetector(
+            alpha=ADAPTIVE_ALPHA, z_enter=ADAPTIVE_Z_ENTER, z_exit=ADAPTIVE_Z_EXIT,
+            min_load=ADAPTIVE_MIN_LOAD_PER_CORE, warmup=ADAPTIVE_WARMUP_SAMPLES,
+            cooldown=CAPTURE_COOLDOWN)
+        load_detector_state(_adaptive_detector, adaptive_state_path())
+    return _adaptive_detector
+
+def save_adaptive_state():
+    """Persists the adaptive baseline and trigger rule state, if either was used in this process."""
+    if _adaptive_detector is not None:
+        try:
+            save_detector_state(_adaptive_detector, adaptive_state_path())
+        except OSError as e:
+            log_message(f"WARNING: Could not save adaptive detector state: {e}")
+    if _trigger_engine is not None:
+        try:
+            save_engine_state(_trigger_engine, trigger_state_path())
+        except OSError as e:
+            log_message(f"WARNING: Could not save trigger state: {e}")
+
+def trigger_state_path():
+    """Where trigger rule state is kept between cron runs."""
+    return os.path.join(DIAGNOSTICS_DIR, "trigger_state.json")
+
+def get_trigger_engine():
+    """
+    The trigger engine of this process, with rule state and the previous sample restored from its
+    state file. Without a recent saved sample, the first call takes a priming sample for the rate signals.
+    """
+    global _trigger_engine
+    if _trigger_engine is None:
+        _trigger_engine = TriggerEngine(build_rules(TRIGGER_RULES, cooldown=CAPTURE_COOLDOWN))
+        load_engine_state(_trigger_engine, trigger_state_path(), TRIGGER_STATE_MAX_GAP)
+        if _trigger_engine.sampler.previous is None:
+            _trigger_engine.sampler.sample()
+            time.sleep(TRIGGER_PRIME_INTERVAL)
+    return _trigger_engine
+
+def get_archive_index():
+    """The archive index of DIAGNOSTICS_DIR, opened once per process (built from the directory if new)."""
+    global _archive_index
+    if _archive_index is None or _archive_index.diagnostics_dir != DIAGNOSTICS_DIR:
+        _archive_index = ArchiveIndex(DIAGNOSTICS_DIR)
+    return _archive_index
+
+def get_fleet_agent():
+    """The fleet agent of this process, or None when FLEET_COLLECTOR_URL is not set."""
+    global _fleet_agent
+    if _fleet_agent is None and FLEET_COLLECTOR_URL:
+        _fleet_agent = FleetAgent(FLEET_COLLECTOR_URL, FLEET_HOST_NAME, os.cpu_count() or 1,
+                                  FLEET_PUSH_INTERVAL, token=FLEET_TOKEN, log=log_message)
+    return _fleet_agent
+
+def push_fleet_events():
+    """Sends buffered events to the fleet collector now (cron mode; the daemon pushes in the background)."""
+    agent = get_fleet_agent()
+    if agent is not None and not agent.flush():
+        log_message(f"WARNING: Could not reach fleet collector {FLEET_COLLECTOR_URL}; events from this run were not delivered.")
+
+def record_event(event_type, **fields):
+    """
+    Appends a structured event to EVENT_LOG_PATH and queues it for the fleet collector.
+    Never lets a logging failure stop the detector.
+    """
+    global _event_log
+    event = {'ts': round(time.time(), 3), 'type': event_type, **fields}
+    agent = get_fleet_agent()
+    if agent is not None:
+        agent.add(event)
+    if not EVENT_LOG_PATH:
+        return
+    try:
+        if _event_log is None or _event_log.path != EVENT_LOG_PATH:
+            _event_log = EventLogWriter(EVENT_LOG_PATH, EVENT_LOG_MAX_BYTES, EVENT_LOG_BACKUPS)
+        _event_log.write(event)
+    except OSError as e:
+        log_message(f"WARNING: Could not write event log {EVENT_LOG_PATH}: {e}")
+
+def check_load_threshold(history=None):
     """
     Checks the current 5-minute load average using psutil.
-    Returns True if the load exceeds the defined threshold.
+    Returns True if a capture should run: the load exceeds LOAD_THRESHOLD, in adaptive
+    mode a new anomaly started outside the cooldown, or in trigger mode a rule fired.
+    If a LoadSeriesStore is given as history, the sample is recorded in it.
     """
     try:
         # psutil returns (1-min, 5-min, 15-min) load averages
-        load_avg_5min = psutil.getloadavg()[1]
-        log_message(f"Current 5-minute Load Average: {load_avg_5min:.2f} (Threshold: {LOAD_THRESHOLD:.2f})")
-        return load_avg_5min >= LOAD_THRESHOLD
+        load_avg_1min, load_avg_5min, load_avg_15min = psutil.getloadavg()
+        extra = {}
+        if DETECTION_MODE == "adaptive":
+            detector = get_adaptive_detector()
+            cores = os.cpu_count() or 1
+            # Threshold in load units as it stood before this sample, for the log line
+            threshold = detector.threshold() * cores
+            exceeded, z = detector.update(load_avg_5min / cores, time.time())
+            extra = {'z': round(z, 2), 'baseline': round(detector.mean * cores, 2)}
+        elif DETECTION_MODE == "triggers":
+            threshold = LOAD_THRESHOLD
+            fired, signals = get_trigger_engine().evaluate()
+            exceeded = bool(fired)
+            extra = {'rules': fired,
+                     'signals': {name: round(value, 2) for name, value in signals.items() if value is not None}}
+        else:
+            threshold = LOAD_THRESHOLD
+            exceeded = load_avg_5min >= LOAD_THRESHOLD
+        log_message(f"Current 5-minute Load Average: {load_avg_5min:.2f} (Threshold: {threshold:.2f})")
+        if DETECTION_MODE == "adaptive" and detector.in_spike and not exceeded:
+            log_message(f"Spike ongoing (z={z:.1f}); capture suppressed by hysteresis/cooldown.")
+        if DETECTION_MODE == "triggers" and fired:
+            log_message(f"Trigger rules fired: {', '.join(fired)}")
+        record_event("check", load1=round(load_avg_1min, 2), load5=round(load_avg_5min, 2),
+                     load15=round(load_avg_15min, 2), threshold=round(threshold, 2),
+                     decision="capture" if exceeded else "ok", **extra)
+        if history is not None:
+            history.add(time.time(), load_avg_5min, captured=exceeded)
+        return exceeded
     except Exception as e:
         log_message(f"ERROR: Failed to retrieve load average: {e}")
         return False
 
+def run_native_collector(filename):
+    """Returns the in-process equivalent of a diagnostic command's output. Raises if the collector fails."""
+    collector, sources = NATIVE_COLLECTORS[filename]
+    if filename == "top_consumers" and _flight_recorder is not None:
+        # The recorder's latest scan is the first of the two, so the capture does not wait a second for it
+        return f"--- Collector: native ({sources}) ---\n" + collector(baseline=_flight_recorder.consumer_baseline())
+    return f"--- Collector: native ({sources}) ---\n" + collector()
+
+def run_diagnostic_command(filename, command, deadline):
+    """
+    Captures a single diagnostic entry, natively or through the shell command.
+    Called from the capture thread pool; returns (output text or None, status message, elapsed seconds).
+    """
+    start = time.monotonic()
+    native_error = None
+    if COLLECTOR_MODE == "native" and filename in NATIVE_COLLECTORS:
+        try:
+            return run_native_collector(filename), "OK", time.monotonic() - start
+        except Exception as e:
+            native_error = e # Fall back to the shell command below
+
+    output = None
+    try:
+        # Use shell=True for complex commands (like netstat) or pipes, but handle security risks
+        result = subprocess.run(
+            command,
+            shell=True,
+            capture_output=True,
+            text=True,
+            check=True, # Raise error if command fails
+            timeout=max(deadline - time.monotonic(), 0.1) # Whatever is left of the shared capture deadline
+        )
+        output = f"--- Command: {command} ---\n" + result.stdout
+        status = "OK" if native_error is None else f"OK (shell fallback after native error: {native_error})"
+    except subprocess.CalledProcessError as e:
+        status = f"WARNING: Command '{command}' failed (Exit Code {e.returncode}). Stderr: {e.stderr.strip()}"
+    except subprocess.TimeoutExpired:
+        status = f"WARNING: Command '{command}' timed out."
+    except Exception as e:
+        status = f"ERROR executing command: {e}"
+    return output, status, time.monotonic() - start
+
+def open_archive(fileobj, compression):
+    """
+    Opens a tarfile writer on fileobj for one of the ARCHIVE_EXTENSIONS compression keys.
+    Returns (tar, compressor stream or None); the stream must be closed after the tar.
+    """
+    if compression == "zst":
+        stream = zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(fileobj, closefd=False)
+        return tarfile.open(fileobj=stream, mode="w|"), stream
+    if compression == "none":
+        return tarfile.open(fileobj=fileobj, mode="w"), None
+    return tarfile.open(fileobj=fileobj, mode="w:gz", compresslevel=GZIP_LEVEL), None
+
+def add_archive_member(tar, arcname, text, mtime):
+    """Adds text to the open archive as a regular file, straight from memory."""
+    data = text.encode('utf-8')
+    info = tarfile.TarInfo(arcname)
+    info.size = len(data)
+    info.mtime = mtime
+    info.mode = 0o644
+    tar.addfile(info, io.BytesIO(data))
+
 def capture_diagnostics():
-    """Executes defined Linux commands and saves output to temporary files."""
+    """Captures every diagnostic entry concurrently and streams the output into a compressed archive."""
     log_message("Threshold exceeded. Starting diagnostic data capture...")
 
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    temp_capture_dir = os.path.join(DIAGNOSTICS_DIR, f"capture_{timestamp}")
+    compression = ARCHIVE_COMPRESSION
+    if compression == "zst" and zstandard is None:
+        log_message("WARNING: zstandard is not installed. Falling back to gzip archives.")
+        compression = "gz"
 
-    # 1. Ensure the temporary directory is created
-    os.makedirs(temp_capture_dir, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    member_dir = f"capture_{timestamp}" # Top-level folder inside the archive
+    archive_name = f"spike_diag_{timestamp}{ARCHIVE_EXTENSIONS[compression]}"
+    archive_path = os.path.join(DIAGNOSTICS_DIR, archive_name)
+    partial_path = archive_path + ".part" # Renamed once complete so readers never see half an archive
+    mtime = time.time()
+    trigger_load = psutil.getloadavg()[1]
 
-    # 2. Execute each diagnostic command
-    for filename, command in DIAGNOSTIC_COMMANDS.items():
-        output_filepath = os.path.join(temp_capture_dir, f"{filename}.txt")
-        try:
-            # Use shell=True for complex commands (like netstat) or pipes, but handle security risks
-            result = subprocess.run(
-                command,
-                shell=True,
-                capture_output=True,
-                text=True,
-                check=True, # Raise error if command fails
-                timeout=10 # Timeout in case command hangs
-            )
-            with open(output_filepath, 'w') as f:
-                f.write(f"--- Command: {command} ---\n")
-                f.write(result.stdout)
-            log_message(f"Successfully captured {filename}")
-        except subprocess.CalledProcessError as e:
-            log_message(f"WARNING: Command '{command}' failed (Exit Code {e.returncode}). Stderr: {e.stderr.strip()}")
-        except subprocess.TimeoutExpired:
-            log_message(f"WARNING: Command '{command}' timed out.")
-        except Exception as e:
-            log_message(f"ERROR executing command: {e}")
+    # 1. Launch all diagnostic commands at once, bounded by the pool size and one shared deadline
+    capture_start = time.monotonic()
+    deadline = capture_start + CAPTURE_DEADLINE
+    timings = {}
 
-    # 3. Create the archive and clean up the temporary folder
-    archive_name = f"spike_diag_{timestamp}.tar.gz"
-    archive_path = os.path.join(DIAGNOSTICS_DIR, archive_name)
+    pool = ThreadPoolExecutor(max_workers=MAX_CAPTURE_WORKERS, thread_name_prefix="capture")
+    futures = {
+        pool.submit(run_diagnostic_command, filename, command, deadline): filename
+        for filename, command in DIAGNOSTIC_COMMANDS.items()
+    }
 
     try:
-        with tarfile.open(archive_path, "w:gz") as tar:
-            tar.add(temp_capture_dir, arcname=os.path.basename(temp_capture_dir))
+        with open(partial_path, 'wb') as archive_file:
+            tar, stream = open_archive(archive_file, compression)
+            try:
+                # 2. Stream each output into the archive as soon as its command finishes
+                try:
+                    for future in as_completed(futures, timeout=max(deadline - time.monotonic(), 0) + 1):
+                        filename = futures[future]
+                        output, status, elapsed = future.result()
+                        timings[filename] = (status, elapsed)
+                        if output is not None:
+                            add_archive_member(tar, f"{member_dir}/{filename}.txt", output, mtime)
+                        if status.startswith("OK"):
+                            log_message(f"Successfully captured {filename} in {elapsed:.3f}s")
+                        else:
+                            log_message(status)
+                except FuturesTimeoutError:
+                    # Only reached if a command outlives its own subprocess timeout; don't wait for it
+                    for future, filename in futures.items():
+                        if not future.done():
+                            timings[filename] = ("WARNING: still running at capture deadline",
+                                                 time.monotonic() - capture_start)
+                            log_message(f"WARNING: {filename} missed the {CAPTURE_DEADLINE}s capture deadline.")
+
+                capture_elapsed = time.monotonic() - capture_start
+                log_message(f"Diagnostic commands finished in {capture_elapsed:.3f}s")
+
+                # 3. Record per-command timings alongside the snapshots
+                timing_lines = []
+                for filename in DIAGNOSTIC_COMMANDS:
+                    status, elapsed = timings.get(filename, ("not run", 0.0))
+                    timing_lines.append(f"{filename}\t{elapsed:.3f}s\t{status}\n")
+                timing_lines.append(f"total\t{capture_elapsed:.3f}s\n")
+                add_archive_member(tar, f"{member_dir}/capture_timings.txt", "".join(timing_lines), mtime)
+
+                # 4. The pre-spike window from the flight recorder (daemon mode only)
+                if _flight_recorder is not None:
+                    add_archive_member(tar, f"{member_dir}/flight_recorder.txt", _flight_recorder.dump(), mtime)
+            finally:
+                tar.close()
+                if stream is not None:
+                    stream.close()
+        os.replace(partial_path, archive_path)
         log_message(f"Successfully created archive: {archive_name}")
+        try:
+            get_archive_index().add(archive_name, time.time(), os.path.getsize(archive_path),
+                                    round(trigger_load, 2))
+        except Exception as e:
+            log_message(f"WARNING: Could not index archive {archive_name}: {e}")
+        record_event("capture", archive=archive_path, compression=compression,
+                     size=os.path.getsize(archive_path), duration=round(capture_elapsed, 3),
+                     commands={name: {'elapsed': round(elapsed, 3), 'status': status}
+                               for name, (status, elapsed) in timings.items()})
     except Exception as e:
         log_message(f"ERROR: Failed to create archive: {e}")
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
     finally:
-        # Clean up the temporary directory containing unarchived files
-        subprocess.run(['rm', '-rf', temp_capture_dir], check=False)
+        pool.shutdown(wait=False, cancel_futures=True)
 
     return archive_path
 
+def reconcile_archive_index(force=False):
+    """
+    Reconciles the archive index with the diagnostics directory if ARCHIVE_RECONCILE_INTERVAL has
+    passed since the last scan (or force is set), and removes the *.part files of crashed captures.
+    Returns the number of files deleted.
+    """
+    index = get_archive_index()
+    last = index.last_reconciled()
+    if not force and last is not None and time.time() - last < ARCHIVE_RECONCILE_INTERVAL:
+        return 0
+    forgotten, added, stale_partials = index.reconcile(PARTIAL_ARCHIVE_MAX_AGE)
+    if forgotten or added:
+        log_message(f"Archive index reconciled: {forgotten} missing archives dropped, {added} added.")
+
+    files_deleted = 0
+    for filename in stale_partials:
+        try:
+            os.remove(os.path.join(DIAGNOSTICS_DIR, filename))
+            log_message(f"Removed partial archive of an interrupted capture: {filename}")
+            files_deleted += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            log_message(f"ERROR: Could not delete {filename}: {e}")
+    return files_deleted
+
 def cleanup_old_archives():
-    """Removes archived files older than the defined retention period."""
+    """
+    Removes archives older than the retention period, then the oldest ones beyond
+    RETENTION_MAX_BYTES / RETENTION_MAX_FILES, as selected from the archive index. Every
+    ARCHIVE_RECONCILE_INTERVAL the index is first reconciled with the directory.
+    """
     log_message("Starting archive cleanup...")
 
     if not os.path.exists(DIAGNOSTICS_DIR):
         log_message("Diagnostics directory does not exist. Skipping cleanup.")
         return
 
-    # Calculate the cutoff date
-    cutoff_date = datetime.now() - timedelta(days=RETENTION_DAYS)
+    try:
+        files_deleted = reconcile_archive_index()
+        index = get_archive_index()
+        expired = index.select_expired(max_age_seconds=timedelta(days=RETENTION_DAYS).total_seconds(),
+                                       max_bytes=RETENTION_MAX_BYTES, max_files=RETENTION_MAX_FILES)
+    except Exception as e:
+        log_message(f"ERROR: Could not read archive index: {e}")
+        return
 
-    files_deleted = 0
-    for filename in os.listdir(DIAGNOSTICS_DIR):
-        filepath = os.path.join(DIAGNOSTICS_DIR, filename)
+    for filename in expired:
+        try:
+            os.remove(os.path.join(DIAGNOSTICS_DIR, filename))
+            log_message(f"Cleaned up old archive: {filename}")
+            files_deleted += 1
+        except FileNotFoundError:
+            pass # Already gone; just drop it from the index
+        except OSError as e:
+            log_message(f"ERROR: Could not delete {filename}: {e}")
+            continue
+        index.remove(filename)
 
-        # Only process files (not sub-directories)
-        if os.path.isfile(filepath):
-            # Get file modification time and convert to datetime object
-            file_mod_time = datetime.fromtimestamp(os.path.getmtime(filepath))
+    log_message(f"Cleanup complete. Total files deleted: {files_deleted}")
+    record_event("cleanup", deleted=files_deleted)
 
-            if file_mod_time < cutoff_date:
+# --- Daemon Mode ---
+
+# Set by the signal handlers; the sampling loop waits on these instead of sleeping.
+_stop_event = threading.Event()
+_reopen_log_event = threading.Event()
+
+def _handle_stop_signal(signum, frame):
+    """SIGTERM/SIGINT handler: ask the sampling loop to exit after the current sample."""
+    _stop_event.set()
+
+def _handle_hup_signal(signum, frame):
+    """SIGHUP handler: ask the sampling loop to reopen its log file (e.g. after logrotate) and rescan the archives."""
+    _reopen_log_event.set()
+
+def open_log_file(log_path):
+    """Redirects stdout (and therefore log_message) to log_path in append mode."""
+    if sys.stdout is not sys.__stdout__:
+        sys.stdout.close()
+    sys.stdout = open(log_path, 'a', buffering=1) # Line buffered so the dashboard sees every entry
+
+def log_history_summary(history):
+    """Logs the running load statistics kept by the daemon."""
+    stats = history.summary()
+    if stats['count']:
+        log_message(f"Load history: {stats['count']} samples, average {stats['avg_load']:.2f}, "
+                    f"peak {stats['max_load']:.2f}, {stats['capture_count']} captures.")
+
+def run_daemon(interval=SAMPLE_INTERVAL, log_path=None):
+    """
+    Resident sampling loop: checks the load every `interval` seconds in a single process.
+    Replaces the per-minute cron job, so no interpreter start-up or fork happens per sample.
+    """
+    global _flight_recorder
+    if log_path:
+        open_log_file(log_path)
+
+    signal.signal(signal.SIGTERM, _handle_stop_signal)
+    signal.signal(signal.SIGINT, _handle_stop_signal)
+    signal.signal(signal.SIGHUP, _handle_hup_signal)
+
+    os.makedirs(DIAGNOSTICS_DIR, exist_ok=True)
+    log_message(f"Daemon started (PID {os.getpid()}, sample interval {interval:g}s).")
+
+    # Bounded in-memory history of every sample taken by this process
+    history = LoadSeriesStore(LOAD_THRESHOLD)
+
+    if FLIGHT_RECORDER_INTERVAL > 0:
+        _flight_recorder = FlightRecorder(FLIGHT_RECORDER_INTERVAL, FLIGHT_RECORDER_WINDOW, FLIGHT_RECORDER_TOP)
+        _flight_recorder.start()
+
+    if get_fleet_agent() is not None:
+        _fleet_agent.start()
+        log_message(f"Pushing events to fleet collector {FLEET_COLLECTOR_URL} every {FLEET_PUSH_INTERVAL}s.")
+
+    next_sample = time.monotonic()
+    next_cleanup = next_sample
+
+    while not _stop_event.is_set():
+        if check_load_threshold(history):
+            capture_diagnostics()
+        else:
+            log_message("Load is within acceptable limits. No action taken.")
+
+        now = time.monotonic()
+        if now >= next_cleanup:
+            cleanup_old_archives()
+            log_history_summary(history)
+            next_cleanup = now + CLEANUP_INTERVAL
+
+        # Keep a fixed cadence; if a capture overran one or more ticks, skip them instead of bursting.
+        next_sample += interval
+        now = time.monotonic()
+        if next_sample <= now:
+            next_sample = now + interval - ((now - next_sample) % interval)
+
+        # Wait for the next tick; the wait returns early on SIGTERM/SIGINT.
+        while not _stop_event.wait(max(0.0, min(next_sample - time.monotonic(), 1.0))):
+            if _reopen_log_event.is_set():
+                _reopen_log_event.clear()
+                if log_path:
+                    open_log_file(log_path)
+                    log_message("Log file reopened on SIGHUP.")
                 try:
-                    os.remove(filepath)
-                    log_message(f"Cleaned up old archive: {filename}")
-                    files_deleted += 1
-                except OSError as e:
-                    log_message(f"ERROR: Could not delete {filename}: {e}")
+                    reconcile_archive_index(force=True)
+                except Exception as e:
+                    log_message(f"ERROR: Could not reconcile archive index: {e}")
+            if time.monotonic() >= next_sample:
+                break
 
-    log_message(f"Cleanup complete. Total files deleted: {files_deleted}")
+    if _flight_recorder is not None:
+        _flight_recorder.stop()
+        _flight_recorder = None
+    if _fleet_agent is not None:
+        _fleet_agent.stop() # Final push of whatever is still buffered
+    save_adaptive_state()
+    log_message("Daemon stopping on signal.")
 
 # --- Main Execution Logic ---
 
@@ -145,5 +613,29 @@ def main():
     # 4. Always run the cleanup to prevent disk filling
     cleanup_old_archives()
 
+    # 5. Keep the adaptive baseline and trigger rule state for the next cron run
+    save_adaptive_state()
+
+    # 6. Report this run to the fleet collector, if one is configured
+    push_fleet_events()
+
+def parse_args():
+    """Command line options. Without --daemon the script does a single check, as used from cron."""
+    parser = argparse.ArgumentParser(description="Load spike detector and diagnostics capture.")
+    parser.add_argument("--daemon", action="store_true",
+                        help="Run as a resident sampling loop instead of a single check.")
+    parser.add_argument("--interval", type=float, default=SAMPLE_INTERVAL,
+                        help=f"Seconds between samples in daemon mode (default: {SAMPLE_INTERVAL:g}).")
+    parser.add_argument("--log-file",
+                        help="Append log output to this file instead of stdout; reopened on SIGHUP.")
+    args = parser.parse_args()
+    if args.interval <= 0:
+        parser.error("--interval must be greater than 0")
+    return args
+
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    if args.daemon:
+        run_daemon(args.interval, args.log_file)
+    else:
+        main()
@@ -0,0 +1,19 @@
+from fleet_collector import FleetStore
+
+def store_with_onsets(onsets):
+    store = FleetStore()
+    store.onsets.extend(onsets)
+    return store
+
+def test_steady_onsets_do_not_chain_into_one_group():
+    # One host starts a spike every 40 s for an hour, always within the window of the previous one
+    store = store_with_onsets((1000 + i * 40, f"host{i % 5}") for i in range(90))
+    spikes = store.correlated_spikes(window=60, min_hosts=2)
+    assert spikes
+    assert all(spike['end'] - spike['start'] <= 60 for spike in spikes)
+
+def test_onsets_within_the_window_are_grouped():
+    store = store_with_onsets([(1000, "a"), (1020, "b"), (1050, "c"), (5000, "a"), (5030, "b"), (9000, "c")])
+    spikes = store.correlated_spikes(window=60, min_hosts=2)
+    assert spikes == [{'start': 5000, 'end': 5030, 'hosts': ["a", "b"]},
+                      {'start': 1000, 'end': 1050, 'hosts': ["a", "b", "c"]}]
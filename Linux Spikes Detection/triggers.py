@@ -0,0 +1,226 @@
+import json
+import os
+import time
+
+from proc_collectors import ProcReader
+
+# Multi-signal trigger engine for spike_detector.py (DETECTION_MODE = "triggers").
+# SignalSampler turns a handful of cheap /proc reads into named signals; TriggerEngine
+# evaluates configurable rules over them and reports which rules fired.
+#
+# Signals (None when the kernel does not provide them, e.g. no PSI before Linux 4.20):
+#   load1, load5, load15                    - /proc/loadavg
+#   psi_{cpu,memory,io}_{some,full}_avg10   - % of time stalled over the last 10 s (/proc/pressure/*)
+#   psi_{cpu,memory,io}_{some,full}_rate    - % of time stalled since the previous sample
+#   cpu_busy_pct, cpu_busiest_pct           - average and busiest core utilisation since the previous sample
+#   cpu_iowait_pct                          - iowait share of all CPU time since the previous sample
+#   swapin_pages_per_sec                    - /proc/vmstat pswpin rate
+#   disk_queue_depth                        - highest number of in-flight I/Os on any disk (/proc/diskstats)
+
+PSI_RESOURCES = ("cpu", "memory", "io")
+
+# Block devices ignored for queue depth
+IGNORED_DISK_PREFIXES = ("loop", "ram", "zram", "dm-")
+
+class SignalSampler:
+    """Reads all signals in one pass. Rate signals need a previous sample and are None on the first call."""
+
+    def __init__(self):
+        self.reader = ProcReader()
+        self.previous = None # (Unix time, counters) of the last sample; persisted between cron runs
+
+    def sample(self):
+        """Returns {signal name: value or None}."""
+        now = time.time()
+        signals = {}
+        counters = {}
+
+        load1, load5, load15 = self.reader.read("/proc/loadavg").split()[:3]
+        signals.update(load1=float(load1), load5=float(load5), load15=float(load15))
+
+        for resource in PSI_RESOURCES:
+            try:
+                text = self.reader.read(f"/proc/pressure/{resource}")
+            except OSError:
+                text = ""
+            for line in text.splitlines():
+                kind, *fields = line.split()
+                values = dict(field.split('=') for field in fields)
+                signals[f"psi_{resource}_{kind}_avg10"] = float(values['avg10'])
+                counters[f"psi_{resource}_{kind}_rate"] = int(values['total']) # Microseconds stalled
+
+        cpu_lines = [line.split() for line in self.reader.read("/proc/stat").splitlines()
+                     if line.startswith("cpu")]
+        for fields in cpu_lines:
+            ticks = [int(v) for v in fields[1:9]]
+            counters[fields[0]] = (sum(ticks), ticks[3] + ticks[4], ticks[4]) # total, idle+iowait, iowait
+
+        for line in self.reader.read("/proc/vmstat").splitlines():
+            if line.startswith("pswpin "):
+                counters['swapin_pages_per_sec'] = int(line.split()[1])
+                break
+
+        queue_depth = 0
+        for line in self.reader.read("/proc/diskstats").splitlines():
+            fields = line.split()
+            if len(fields) >= 12 and not fields[2].startswith(IGNORED_DISK_PREFIXES):
+                queue_depth = max(queue_depth, int(fields[11])) # I/Os currently in progress
+        signals['disk_queue_depth'] = queue_depth
+
+        signals.update(self.rates(now, counters))
+        self.previous = (now, counters)
+        return signals
+
+    def rates(self, now, counters):
+        """Signals computed from the difference to the previous sample."""
+        rates = {name: None for name in ('cpu_busy_pct', 'cpu_busiest_pct', 'cpu_iowait_pct',
+                                         'swapin_pages_per_sec')}
+        if self.previous is None:
+            return rates
+        then, old = self.previous
+        elapsed = now - then
+        if elapsed <= 0:
+            return rates # Clock stepped back
+
+        # A counter that went down was reset (a reboot since a persisted sample); its rate is unknown
+        for name, value in counters.items():
+            if name.startswith("psi_") and name in old and value >= old[name]:
+                # Stall microseconds per elapsed microsecond, as a percentage
+                rates[name] = 100.0 * (value - old[name]) / (elapsed * 1e6)
+        if 'swapin_pages_per_sec' in counters and 'swapin_pages_per_sec' in old \
+                and counters['swapin_pages_per_sec'] >= old['swapin_pages_per_sec']:
+            rates['swapin_pages_per_sec'] = (counters['swapin_pages_per_sec'] - old['swapin_pages_per_sec']) / elapsed
+
+        busiest = 0.0
+        for name, value in counters.items():
+            if not name.startswith("cpu") or name not in old:
+                continue
+            total, idle, iowait = value
+            d_total = total - old[name][0]
+            if d_total <= 0:
+                continue
+            busy = 100.0 * (d_total - (idle - old[name][1])) / d_total
+            if name == "cpu":
+                rates['cpu_busy_pct'] = busy
+                rates['cpu_iowait_pct'] = 100.0 * (iowait - old[name][2]) / d_total
+            else:
+                busiest = max(busiest, busy)
+        if rates['cpu_busy_pct'] is not None:
+            rates['cpu_busiest_pct'] = busiest
+        return rates
+
+    def close(self):
+        self.reader.close()
+
+OPERATORS = {
+    ">=": lambda value, limit: value >= limit,
+    ">": lambda value, limit: value > limit,
+    "<=": lambda value, limit: value <= limit,
+    "<": lambda value, limit: value < limit,
+}
+
+class TriggerRule:
+    """
+    Fires when its conditions hold ("all" of them, or "any") for `consecutive` samples in a row.
+    It fires once per episode: it re-arms after the conditions stop holding, and never fires
+    again within `cooldown` seconds. Times are Unix time, so the state can be persisted between cron runs.
+    """
+
+    def __init__(self, name, mode, conditions, consecutive=1, cooldown=0):
+        self.name = name
+        self.mode = mode              # "all" or "any"
+        self.conditions = conditions  # [(signal, operator, limit), ...]
+        self.consecutive = consecutive
+        self.cooldown = cooldown
+        self.streak = 0
+        self.armed = True
+        self.last_fired = 0.0
+
+    def matches(self, signals):
+        results = []
+        for signal, operator, limit in self.conditions:
+            value = signals.get(signal)
+            results.append(value is not None and OPERATORS[operator](value, limit))
+        return all(results) if self.mode == "all" else any(results)
+
+    def evaluate(self, signals, now):
+        """Updates the rule with one sample; True if it fires now."""
+        if not self.matches(signals):
+            self.streak = 0
+            self.armed = True
+            return False
+        self.streak += 1
+        if self.armed and self.streak >= self.consecutive and now - self.last_fired >= self.cooldown:
+            self.armed = False
+            self.last_fired = now
+            return True
+        return False
+
+    def state(self):
+        return {'streak': self.streak, 'armed': self.armed, 'last_fired': self.last_fired}
+
+    def load_state(self, state, continuous=True):
+        """Restores the rule. Without `continuous` (samples were missed) only the cooldown carries over."""
+        self.last_fired = state.get('last_fired', 0.0)
+        if continuous:
+            self.streak = state.get('streak', 0)
+            self.armed = state.get('armed', True)
+
+class TriggerEngine:
+    """Samples the signals and evaluates every rule against them."""
+
+    def __init__(self, rules, sampler=None):
+        self.rules = rules
+        self.sampler = sampler or SignalSampler()
+        self.last_evaluated = 0.0
+
+    def evaluate(self):
+        """Returns (names of the rules that fired, signals)."""
+        signals = self.sampler.sample()
+        now = time.time()
+        fired = [rule.name for rule in self.rules if rule.evaluate(signals, now)]
+        self.last_evaluated = now
+        return fired, signals
+
+    def state(self):
+        """Rule streaks, episodes, cooldowns and the last counters, for persisting between cron runs."""
+        state = {'last_evaluated': self.last_evaluated, 'rules': {rule.name: rule.state() for rule in self.rules}}
+        if self.sampler.previous is not None:
+            state['sample_time'], state['counters'] = self.sampler.previous
+        return state
+
+    def load_state(self, state, max_gap):
+        """
+        Restores rule state by name. Streaks and episodes only carry over if the previous sample
+        was taken at most `max_gap` seconds ago; after a longer pause they start over. The counters
+        of a recent enough sample become the sampler's previous sample, so the next one has rates.
+        """
+        self.last_evaluated = state.get('last_evaluated', 0.0)
+        continuous = time.time() - self.last_evaluated <= max_gap
+        saved = state.get('rules', {})
+        for rule in self.rules:
+            if rule.name in saved:
+                rule.load_state(saved[rule.name], continuous)
+        sample_time = state.get('sample_time')
+        if sample_time is not None and 0 <= time.time() - sample_time <= max_gap:
+            self.sampler.previous = (sample_time, state.get('counters', {}))
+
+def load_engine_state(engine, path, max_gap):
+    """Restores engine state from path if it exists and is readable."""
+    try:
+        with open(path, 'r') as f:
+            engine.load_state(json.load(f), max_gap)
+    except (OSError, ValueError):
+        pass
+
+def save_engine_state(engine, path):
+    """Writes engine state to path atomically."""
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(engine.state(), f)
+    os.replace(temp_path, path)
+
+def build_rules(rule_specs, cooldown=0):
+    """TriggerRule objects from (name, mode, conditions, consecutive) tuples as used in the config."""
+    return [TriggerRule(name, mode, conditions, consecutive, cooldown)
+            for name, mode, conditions, consecutive in rule_specs]